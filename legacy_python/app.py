@@ -1,30 +1,60 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
 import os
 import random
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import combinations
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import plotly.express as px
+import requests
 import streamlit as st
-from tavily import TavilyClient
+from tavily import TavilyClient, UsageLimitExceededError
 
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 
+import sim_pool
+
 # Optional (번역/모델리스트용) - 설치되어 있으면 사용, 없어도 앱은 돌아가게 처리
 try:
     from google import genai  # google-genai
 except Exception:  # pragma: no cover
     genai = None
 
+# 워커 스레드에 세션 컨텍스트를 붙일 때 사용 (Streamlit 내부 API라 버전에 따라 없을 수 있음)
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except Exception:  # pragma: no cover
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
 
 # =========================
 # (맨 위) 환경변수 "하드코딩 슬롯"
 # =========================
 # ✅ 여기만 채우면, 앱 실행 시 자동으로 환경변수로 주입됩니다.
-HARDCODE_GEMINI_API_KEY =   
-HARDCODE_TAVILY_API_KEY =  
+HARDCODE_GEMINI_API_KEY = ""
+HARDCODE_TAVILY_API_KEY = ""
 
 if (HARDCODE_GEMINI_API_KEY or "").strip():
     os.environ["GEMINI_API_KEY"] = HARDCODE_GEMINI_API_KEY.strip()
@@ -36,6 +66,7 @@ if (HARDCODE_TAVILY_API_KEY or "").strip():
 # 0) 상수/설정
 # =========================
 STAGES = ["Seed", "MVP", "PMF", "Scale-up", "Unicorn"]
+STAT_KEYS = ["product", "team", "strategy", "marketing", "consumer_needs"]
 # ✅ 이미지 링크 교체(velog)
 MEME_URL = "https://velog.velcdn.com/images/jaylaydown/post/46234814-6325-4982-b676-e89b851697f4/image.jpeg"
 HERO_BG = "https://images.unsplash.com/photo-1526481280695-3c687fd643ed?auto=format&fit=crop&w=1600&q=80"
@@ -403,378 +434,3237 @@ def resolve_api_keys(google_input: str, tavily_input: str) -> Tuple[str, str]:
 
 
 # =========================
-# 3) Tavily 검색 + 결과 필터링
+# 2-1) 외부 클라이언트 공유 (프로세스 단위)
 # =========================
-def _looks_like_binary_or_garbage(text: str) -> bool:
-    if not text:
-        return True
-    # XLS/바이너리/깨짐 흔한 패턴
-    if "[XLS]" in text or "\x00" in text:
-        return True
-    # 깨진 문자( ) 비율이 높으면 드롭
-    bad = text.count(" ")
-    if bad >= 8:
-        return True
-    # 너무 비문자(제어문자) 많으면 드롭
-    controls = sum(1 for ch in text if ord(ch) < 9)
-    if controls > 0:
-        return True
-    # 알파뉴메릭/한글 비율이 너무 낮으면 드롭
-    clean = re.sub(r"[A-Za-z0-9가-힣\s\.\,\-\(\)\[\]\!\?\:\/]", "", text)
-    if len(clean) / max(1, len(text)) > 0.35:
-        return True
-    return False
-
-
-@st.cache_data(show_spinner=False, ttl=60 * 20)
-def get_market_data(query: str, tavily_key: str) -> str:
-    if not tavily_key:
-        return "Market data unavailable (No API Key)."
-    try:
-        client = TavilyClient(api_key=tavily_key)
-        response = client.search(query=query, max_results=5, search_depth="advanced")
-        results = response.get("results", []) or []
-        lines = []
-        for r in results:
-            title = (r.get("title") or "Untitled").strip()
-            content = (r.get("content") or "").strip()
-            if _looks_like_binary_or_garbage(content):
-                continue
-            content = re.sub(r"\s+", " ", content)
-            lines.append(f"- {title}: {content[:240]}")
-        return "\n".join(lines) if lines else "No market data found."
-    except Exception as exc:
-        return f"Error fetching market data: {exc}"
+# 동시 사용자/병렬 단계가 같은 호스트로 붙을 때 keep-alive 연결을 버리지 않도록 여유 있게
+HTTP_POOL_SIZE = 32
+# API 엔드포인트 교체용 (벤치마크의 가짜 서버, 프록시 등). 비워 두면 SDK 기본값
+TAVILY_API_BASE_URL = os.environ.get("TAVILY_API_BASE_URL", "").strip()
+GEMINI_API_BASE_URL = os.environ.get("GEMINI_API_BASE_URL", "").strip()
 
 
-@st.cache_data(show_spinner=False, ttl=60 * 30)
-def get_market_autopsy(product: str, desc: str, tavily_key: str, max_results: int = 10) -> List[dict]:
-    if not tavily_key:
-        return []
-    try:
-        client = TavilyClient(api_key=tavily_key)
-        q = f"{product} {desc} 실패 사례 망한 이유 경쟁사 리뷰 불만 후기"
-        response = client.search(query=q, max_results=max_results, search_depth="advanced")
-        raw = response.get("results", []) or []
+@st.cache_resource(show_spinner=False)
+def get_tavily_client(api_key: str) -> TavilyClient:
+    """
+    API 키별 TavilyClient를 프로세스 전체(모든 세션/리런)에서 1개만 만들어 재사용.
+    내부 requests.Session의 keep-alive 연결이 유지되어 TLS 핸드셰이크를 매번 하지 않음.
+    """
+    client = TavilyClient(api_key=api_key, api_base_url=TAVILY_API_BASE_URL or None)
+    session = getattr(client, "session", None)
+    if session is not None:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return client
 
-        cleaned = []
-        for r in raw:
-            title = (r.get("title") or "").strip()
-            url = (r.get("url") or "").strip()
-            content = (r.get("content") or "").strip()
-            if not title or not url or _looks_like_binary_or_garbage(content):
-                continue
-            content = re.sub(r"\s+", " ", content)
-            cleaned.append({"title": title, "url": url, "content": content})
 
-        # 중복 URL 제거
-        seen = set()
-        uniq = []
-        for x in cleaned:
-            if x["url"] in seen:
-                continue
-            seen.add(x["url"])
-            uniq.append(x)
-        return uniq
-    except Exception:
-        return []
+@st.cache_resource(show_spinner=False)
+def get_genai_client(api_key: str) -> object:
+    """API 키별 google-genai Client 공유 (번역/모델 리스트용)."""
+    if GEMINI_API_BASE_URL:
+        return genai.Client(api_key=api_key, http_options={"base_url": GEMINI_API_BASE_URL})
+    return genai.Client(api_key=api_key)
 
 
-def get_youtube_videos(queries: List[str], tavily_key: str, max_videos: int = 3) -> List[str]:
-    if not tavily_key:
-        return []
-    client = TavilyClient(api_key=tavily_key)
-    urls: List[str] = []
-    seen = set()
-    for q in queries:
-        if not q.strip():
-            continue
-        try:
-            resp = client.search(query=f"{q} site:youtube.com", max_results=2)
-            results = resp.get("results", []) or []
-            for r in results:
-                u = (r.get("url") or "").strip()
-                if not u or u in seen:
-                    continue
-                seen.add(u)
-                urls.append(u)
-                if len(urls) >= max_videos:
-                    return urls
-        except Exception:
-            continue
-    return urls[:max_videos]
+@st.cache_resource(show_spinner=False)
+def get_chat_model(api_key: str, model: str, temperature: float) -> ChatGoogleGenerativeAI:
+    """
+    (API 키, 모델, temperature)별 LangChain 채팅 모델 공유.
+    429/503 재시도는 RateGate가 맡으므로 SDK 자체 재시도는 끔 (max_retries=1 → 시도 1번).
+    """
+    if GEMINI_API_BASE_URL:
+        return ChatGoogleGenerativeAI(
+            model=model, google_api_key=api_key, temperature=temperature, max_retries=1, base_url=GEMINI_API_BASE_URL
+        )
+    return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=temperature, max_retries=1)
 
 
 # =========================
-# 4) 모델/번역 (선택사항)
+# 2-2) 검색 결과 캐시 (SQLite 파일 / 메모리)
 # =========================
-@st.cache_data(show_spinner=False, ttl=60 * 60)
-def _list_gemini_models(api_key: str) -> List[str]:
-    if not genai or not api_key:
-        return []
-    try:
-        client = genai.Client(api_key=api_key)
-        names: List[str] = []
-        for m in client.models.list():
-            name = getattr(m, "name", "") or ""
-            if name:
-                names.append(name.replace("models/", ""))
-        return names
-    except Exception:
-        return []
+# SEARCH_CACHE_BACKEND: sqlite(기본) | memory | off
+SEARCH_CACHE_BACKEND = os.environ.get("SEARCH_CACHE_BACKEND", "sqlite").strip().lower()
+SEARCH_CACHE_PATH = os.environ.get(
+    "SEARCH_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "search_cache.sqlite3"),
+)
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MARKET_DATA_TTL = int(os.environ.get("MARKET_DATA_TTL", str(60 * 20)))
+MARKET_AUTOPSY_TTL = int(os.environ.get("MARKET_AUTOPSY_TTL", str(60 * 30)))
 
 
-def resolve_gemini_model(model_name: str, api_key: str) -> str:
-    requested = (model_name or "").strip() or "gemini-1.5-flash"
-    normalized = requested.replace("models/", "")
-    alias = {
-        "gemini": "gemini-2.0-flash",
-        "gemini-2.0": "gemini-2.0-flash",
-        "gemini-1.5-pro-latest": "gemini-1.5-pro",
-        "gemini-1.5-flash-latest": "gemini-1.5-flash",
-    }
-    normalized = alias.get(normalized, normalized)
+# 정규화된 검색어끼리 n-gram 유사도가 이 값 이상이면 같은 검색으로 취급 (0이면 끔)
+QUERY_SIMILARITY_THRESHOLD = float(os.environ.get("QUERY_SIMILARITY_THRESHOLD", "0.8"))
+# 유사 검색어 비교 대상으로 기억해 둘 최근 검색어 수 (namespace/파라미터별)
+QUERY_INDEX_SIZE = 256
 
-    models = _list_gemini_models(api_key)
-    if models:
-        if normalized in models:
-            return normalized
-        for cand in ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro"]:
-            if cand in models:
-                return cand
-    return normalized
+_QUERY_PUNCT_RE = re.compile(r"[\W_]+")
 
 
-def translate_text(text: str, api_key: str, model_name: str, target_language: str) -> str:
-    if not text or not api_key or not genai:
-        return text
-    model = resolve_gemini_model(model_name, api_key)
-    client = genai.Client(api_key=api_key)
+def canonicalize_query(query: str) -> str:
+    """
+    NFKC → 소문자 → 구두점/기호를 공백으로 → 토큰 정렬.
+    "자동 핸드워시 디스펜서"와 "핸드워시, 자동  디스펜서!"가 같은 문자열이 됨.
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    return " ".join(sorted(_QUERY_PUNCT_RE.sub(" ", text).split()))
 
-    prompt = f"""
-Translate the following Korean text into {target_language}.
-Keep names, numbers, and product terms intact.
-Return plain text only.
 
-Korean Text:
-{text}
-""".strip()
-    try:
-        resp = client.models.generate_content(model=model, contents=prompt)
-        out = getattr(resp, "text", "") or ""
-        return out.strip() or text
-    except Exception:
-        return text
+def _char_ngrams(tokens: List[str], n: int = 2) -> set:
+    return {t[i : i + n] for t in tokens for i in range(max(1, len(t) - n + 1))}
 
 
-# =========================
-# 5) MCTS(몬테카를로) 시뮬레이션
-# =========================
-@dataclass
-class SimulationResult:
-    survival_rate: float
-    death_counts: Dict[str, int]
-    bottleneck_stage: str
+# 편집거리(오타) 보정은 한글로만 된 토큰 하나끼리, 이 글자 수 이상일 때만
+QUERY_TYPO_MIN_CHARS = 3
+_QUERY_VARIANT_RE = re.compile(r"[^0-9a-z]")
 
 
-class StartupMCTS:
-    def __init__(self, iterations: int = 1000) -> None:
-        self.iterations = iterations
-        # 니즈 점수 consumer_needs: 초기 단계에서 특히 크게 반영
-        self.stage_weights = {
-            "Seed": {"product": 0.10, "team": 0.35, "strategy": 0.10, "marketing": 0.10, "consumer_needs": 0.35},
-            "MVP": {"product": 0.20, "team": 0.25, "strategy": 0.10, "marketing": 0.10, "consumer_needs": 0.35},
-            "PMF": {"product": 0.20, "team": 0.10, "strategy": 0.20, "marketing": 0.20, "consumer_needs": 0.30},
-            "Scale-up": {"product": 0.20, "team": 0.20, "strategy": 0.30, "marketing": 0.25, "consumer_needs": 0.05},
-            "Unicorn": {"product": 0.20, "team": 0.10, "strategy": 0.30, "marketing": 0.35, "consumer_needs": 0.05},
-        }
-        self.stage_difficulty = {"Seed": 0.70, "MVP": 0.60, "PMF": 0.50, "Scale-up": 0.40, "Unicorn": 0.30}
+def _is_hangul(token: str) -> bool:
+    return all("\uac00" <= ch <= "\ud7a3" for ch in token)
 
-    def _stage_survival_prob(self, stats: Dict[str, int], stage: str) -> float:
-        weights = self.stage_weights[stage]
-        score = sum((stats.get(k, 0) or 0) * w for k, w in weights.items()) / sum(weights.values())
-        base = score / 100.0
-        return max(0.0, min(1.0, base * self.stage_difficulty[stage]))
 
-    def _rollout(self, stats: Dict[str, int]) -> Optional[str]:
-        for stage in STAGES:
-            if random.random() > self._stage_survival_prob(stats, stage):
-                return stage
-        return None
+def _edit_similarity(a: str, b: str) -> float:
+    """
+    한글은 자모로 풀어서(NFD) 레벤슈타인 거리 → 1 - 거리/긴 쪽 길이.
+    "디스펜서"/"디스팬서"는 자모 1개 차이(0.89), "갤럭시폰"/"갤럭시탭"은 3개 차이(0.73).
+    """
+    a, b = unicodedata.normalize("NFD", a), unicodedata.normalize("NFD", b)
+    if not a or not b:
+        return 0.0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return 1.0 - prev[-1] / max(len(a), len(b))
 
-    def run(self, stats: Dict[str, int]) -> SimulationResult:
-        death_counts = {s: 0 for s in STAGES}
-        survivors = 0
-        for _ in range(self.iterations):
-            d = self._rollout(stats)
-            if d is None:
-                survivors += 1
+
+def query_similarity(a: str, b: str) -> float:
+    """
+    정규화된 두 검색어의 유사도(0~1).
+    공통 토큰은 빼고 '다른 토큰들'끼리만 문자 bigram Dice로 비교.
+    (검색어 뒤에 붙는 고정 문구 때문에 다른 제품끼리 유사하다고 나오는 걸 막음)
+    - 다른 토큰들의 숫자/영문이 하나라도 다르면 0: 모델명·변형(비타민C/D, 오메가3/6, iphone15/16)
+    - 한글로만 된 토큰 하나끼리(QUERY_TYPO_MIN_CHARS자 이상)는 자모 편집거리도 봄: 짧은 한글 토큰은
+      오타 한 글자에도 bigram이 거의 안 겹침 (디스펜서/디스팬서)
+    """
+    ta, tb = set(a.split()), set(b.split())
+    da, db = sorted(ta - tb), sorted(tb - ta)
+    if not da and not db:
+        return 1.0
+    if not da or not db:
+        return 0.0
+    if _QUERY_VARIANT_RE.sub("", "".join(da)) != _QUERY_VARIANT_RE.sub("", "".join(db)):
+        return 0.0
+    ga, gb = _char_ngrams(da), _char_ngrams(db)
+    score = 2.0 * len(ga & gb) / (len(ga) + len(gb))
+    if (
+        len(da) == len(db) == 1
+        and min(len(da[0]), len(db[0])) >= QUERY_TYPO_MIN_CHARS
+        and _is_hangul(da[0])
+        and _is_hangul(db[0])
+    ):
+        score = max(score, _edit_similarity(da[0], db[0]))
+    return score
+
+
+def make_cache_key(namespace: str, query: str, **params: object) -> str:
+    """정규화된 검색어 + 파라미터 해시."""
+    raw = json.dumps([namespace, canonicalize_query(query), sorted(params.items())], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """
+    get/set 인터페이스만 맞추면 교체 가능한 캐시.
+    값은 JSON 직렬화 가능한 것(str, list[dict] 등)만 저장하고, hit/miss/eviction을 센다.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
             else:
-                death_counts[d] += 1
-        bottleneck = max(death_counts, key=death_counts.get)
-        survival = (survivors / self.iterations) * 100.0
-        return SimulationResult(survival_rate=survival, death_counts=death_counts, bottleneck_stage=bottleneck)
+                self.misses += 1
 
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
 
-# =========================
-# 6) LangChain 체인 (스탯+부검+좌담)
-# =========================
-def analyze_stats_chain(
-    api_key: str,
-    model_name: str,
-    seller_info: str,
-    buyer_info: str,
-    product_info: str,
-    market_data: str,
-) -> Dict[str, int]:
-    parser = JsonOutputParser()
-    prompt = PromptTemplate(
-        template=(
-            "너는 냉소적인 스타트업 검증관이다.\n"
-            "입력 정보와 시장 데이터를 보고 5대 스탯을 0~100 정수로 계산해라.\n"
-            "consumer_needs는 '요즘 소비자의 결핍'과 '이 아이템의 해결 일치율'이다.\n"
-            "반드시 한국어로 사고하되, 출력은 JSON 스키마만 따른다.\n"
-            "{format_instructions}\n"
-            "JSON 필드: product, team, strategy, marketing, consumer_needs\n"
-            "판매자: {seller_info}\n"
-            "타겟: {buyer_info}\n"
-            "아이템: {product_info}\n"
-            "시장 데이터:\n{market_data}\n"
-        ),
-        input_variables=["seller_info", "buyer_info", "product_info", "market_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-    llm = ChatGoogleGenerativeAI(
-        model=resolve_gemini_model(model_name, api_key),
-        google_api_key=api_key,
-        temperature=0.2,
-    )
-    chain = prompt | llm | parser
-    out = chain.invoke(
-        {
-            "seller_info": seller_info,
-            "buyer_info": buyer_info,
-            "product_info": product_info,
-            "market_data": market_data,
-        }
-    )
-    out.setdefault("consumer_needs", 0)
 
-    # ✅ 방어적으로 정수화
-    clean = {
-        "product": _clamp_0_100(out.get("product", 0)),
-        "team": _clamp_0_100(out.get("team", 0)),
-        "strategy": _clamp_0_100(out.get("strategy", 0)),
-        "marketing": _clamp_0_100(out.get("marketing", 0)),
-        "consumer_needs": _clamp_0_100(out.get("consumer_needs", 0)),
-    }
-    return clean
+class NullCache(CacheBackend):
+    def get(self, key: str) -> Optional[Any]:
+        self._count(False)
+        return None
 
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        return None
 
-def autopsy_report_chain(
-    api_key: str,
-    model_name: str,
-    stats: Dict[str, int],
-    bottleneck_stage: str,
-    market_data: str,
-) -> Dict[str, str]:
-    parser = JsonOutputParser()
-    prompt = PromptTemplate(
-        template=(
-            "너는 냉소적이고 현실적인 디스토피아 VC다.\n"
-            "시뮬레이션 결과와 시장 데이터를 바탕으로 아래를 작성하라.\n"
-            "반드시 한국어로 작성하고 JSON만 출력한다.\n"
-            "{format_instructions}\n"
-            "JSON 필드: death_cause, autopsy_report, action_plan, needs_analysis, youtube_queries\n"
-            "- needs_analysis: 요즘 소비자가 진짜 원하는 것 vs 이 아이템이 놓친 포인트(한 문장 팩폭)\n"
-            "- youtube_queries: 참고할 유튜브 검색어 3개(배열)\n"
-            "스탯: {stats}\n"
-            "가장 많이 죽은 단계: {bottleneck_stage}\n"
-            "시장 데이터:\n{market_data}\n"
-        ),
-        input_variables=["stats", "bottleneck_stage", "market_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-    llm = ChatGoogleGenerativeAI(
-        model=resolve_gemini_model(model_name, api_key),
-        google_api_key=api_key,
-        temperature=0.35,
-    )
-    chain = prompt | llm | parser
-    out = chain.invoke(
-        {
-            "stats": stats,
-            "bottleneck_stage": bottleneck_stage,
-            "market_data": market_data,
-        }
-    )
-    # youtube_queries 방어
-    if "youtube_queries" not in out or not isinstance(out["youtube_queries"], list):
-        out["youtube_queries"] = []
-    out["youtube_queries"] = [str(x)[:80] for x in out["youtube_queries"] if str(x).strip()][:3]
-    return out
 
+class MemoryCache(CacheBackend):
+    """프로세스 메모리 LRU. max_bytes를 넘으면 가장 오래 안 쓴 항목부터 제거."""
 
-def run_panel_debate(
-    api_key: str,
-    model_name: str,
-    stats: Dict[str, int],
-    product_info: str,
-) -> str:
-    prompt = f"""
-아래 스타트업 스탯과 정보를 보고 3명의 전문가가 독설 좌담회를 열어라.
-1) 마포구 VC (냉소적, 수치/리스크 집착)
-2) 테헤란로 창업가 (현실적, 피곤함이 기본값)
-3) 까칠한 얼리어답터 (사용자 입장, 가성비/귀찮음 혐오)
+    def __init__(self, max_bytes: int = SEARCH_CACHE_MAX_BYTES) -> None:
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
 
-아이템: {product_info}
-스탯: {stats}
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.time():
+                self._bytes -= entry[2]
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return None if entry is None else entry[0]
 
-규칙:
-- 반드시 한국어 대화체
-- 각 캐릭터 말투 구분 확실히
-- 마지막에 "결론: 한 줄"로 종합 판정
-""".strip()
-    model = ChatGoogleGenerativeAI(
-        model=resolve_gemini_model(model_name, api_key),
-        google_api_key=api_key,
-        temperature=0.45,
-    )
-    return model.invoke(prompt).content
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, time.time() + ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
 
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "entries": len(self._entries), "bytes": self._bytes}
 
-# =========================
-# 7) 메인
-# =========================
-def main() -> None:
-    st.set_page_config(page_title="Startup Hell", page_icon="💀", layout="wide")
-    apply_custom_style()
 
-    # 언어
-    if "language" not in st.session_state:
-        st.session_state.language = "ko"
+class SQLiteCache(CacheBackend):
+    """
+    SQLite 파일 캐시. 재배포/재시작 후에도 남고, 같은 볼륨을 쓰는 레플리카끼리 공유.
+    - 값은 zlib 압축 JSON
+    - accessed_at 기준 LRU로 max_bytes 유지
+    """
 
-    lang_display_to_code = {"한국어": "ko", "English": "en", "日本語": "ja"}
-    lang_code_to_display = {v: k for k, v in lang_display_to_code.items()}
+    def __init__(self, path: str = SEARCH_CACHE_PATH, max_bytes: int = SEARCH_CACHE_MAX_BYTES) -> None:
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
 
-    # 맨 위: 오른쪽 언어 선택 (회색 텍스트)
-    _, top_r = st.columns([7, 3])
-    with top_r:
-        choice = st.radio(
-            # ✅ label 빈값 금지 경고 해결: 라벨은 넣고 숨김 처리
-            label="Language",
-            options=["한국어", "English", "日本語"],
-            index=["한국어", "English", "日本語"].index(lang_code_to_display.get(st.session_state.language, "한국어")),
-            horizontal=True,
-            label_visibility="collapsed",
-            key="lang_choice",
-        )
-        st.session_state.language = lang_display_to_code[choice]
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] < now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return None if row is None else json.loads(zlib.decompress(row[0]).decode("utf-8"))
 
-    language = st.session_state.language
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM entries WHERE key != ? ORDER BY accessed_at LIMIT 1", (key,)
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
 
-    # 상단 네비 + 히어로
-    render_top(language)
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {**super().stats(), "entries": entries, "bytes": size}
+
+
+@dataclass
+class CacheLookup:
+    namespace: str
+    canonical: str
+    # 결과를 내준 캐시 항목의 정규화 검색어 (miss면 None)
+    served_by: Optional[str] = None
+    similarity: float = 0.0
+
+    @property
+    def hit(self) -> bool:
+        return self.served_by is not None
+
+
+class QueryCache:
+    """
+    Tavily 호출 앞단의 검색어 캐시.
+    1) 정규화 검색어로 정확히 조회
+    2) 없으면 최근 검색어 목록에서 유사도 similarity_threshold 이상인 항목을 대신 사용
+    어떤 정규화 키가 결과를 내줬는지는 lookups에 남김.
+    최근 검색어 목록은 백엔드가 아니라 이 객체 안에 둠 (백엔드 hit/miss 집계에 안 섞이고, 동시 set에서 유실 없음).
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        similarity_threshold: float = QUERY_SIMILARITY_THRESHOLD,
+        index_size: int = QUERY_INDEX_SIZE,
+    ) -> None:
+        self.backend = backend
+        self.similarity_threshold = similarity_threshold
+        self.index_size = index_size
+        self.lookups: Deque[CacheLookup] = deque(maxlen=200)
+        self._lock = threading.Lock()
+        # (namespace, 파라미터) → 최근 정규화 검색어 (오래된 것부터, 최대 index_size개)
+        self._index: Dict[str, "OrderedDict[str, None]"] = {}
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _index_key(namespace: str, params: Dict[str, object]) -> str:
+        return make_cache_key(f"__index__:{namespace}", "", **params)
+
+    def get(self, namespace: str, query: str, **params: object) -> Tuple[Optional[Any], CacheLookup]:
+        canonical = canonicalize_query(query)
+        lookup = CacheLookup(namespace=namespace, canonical=canonical)
+        with span(f"cache.{namespace}") as s:
+            value = self.backend.get(make_cache_key(namespace, canonical, **params))
+            if value is not None:
+                lookup.served_by, lookup.similarity = canonical, 1.0
+            elif self.similarity_threshold > 0:
+                with self._lock:
+                    candidates = list(self._index.get(self._index_key(namespace, params), ()))
+                scored = [(query_similarity(canonical, c), c) for c in candidates if c != canonical]
+                for score, cand in sorted(scored, reverse=True):
+                    if score < self.similarity_threshold:
+                        break
+                    value = self.backend.get(make_cache_key(namespace, cand, **params))
+                    if value is not None:
+                        lookup.served_by, lookup.similarity = cand, score
+                        break
+            s.set(cache__result="hit" if lookup.hit else "miss", cache__similarity=round(lookup.similarity, 3))
+
+        with self._lock:
+            if lookup.served_by == canonical:
+                self.exact_hits += 1
+            elif lookup.hit:
+                self.similar_hits += 1
+            else:
+                self.misses += 1
+            self.lookups.append(lookup)
+        return value, lookup
+
+    def set(self, namespace: str, query: str, value: Any, ttl: float, **params: object) -> None:
+        canonical = canonicalize_query(query)
+        self.backend.set(make_cache_key(namespace, canonical, **params), value, ttl)
+        if self.similarity_threshold > 0:
+            with self._lock:
+                index = self._index.setdefault(self._index_key(namespace, params), OrderedDict())
+                index.pop(canonical, None)
+                index[canonical] = None
+                while len(index) > self.index_size:
+                    index.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"exact_hits": self.exact_hits, "similar_hits": self.similar_hits, "misses": self.misses}
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_cache() -> CacheBackend:
+    """SEARCH_CACHE_BACKEND 설정에 맞는 캐시 1개를 프로세스 전체에서 공유."""
+    if SEARCH_CACHE_BACKEND == "off":
+        return NullCache()
+    if SEARCH_CACHE_BACKEND == "memory":
+        return MemoryCache()
+    try:
+        return SQLiteCache()
+    except Exception:
+        # 읽기 전용 파일시스템 등: 메모리 캐시로라도 동작
+        return MemoryCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_cache() -> QueryCache:
+    return QueryCache(get_search_cache())
+
+
+# =========================
+# 2-3) 실행 추적 (span) / 메트릭
+# =========================
+# TRACE_EXPORT_PATH: 리포트 1회분 span을 OTLP JSON 한 줄로 이어 쓸 파일 (비우면 끔)
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "").strip()
+# METRICS_PORT: 지정하면 별도 포트에서 Prometheus 텍스트(/metrics) 제공 (0이면 끔)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0") or 0)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+# 소요시간 히스토그램 버킷(초)
+SPAN_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class Span:
+    """
+    단계/외부 호출 1건의 기록.
+    attributes 관례: cache.result(hit|miss), payload.request_bytes / payload.response_bytes,
+    llm.input_tokens / llm.output_tokens
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attributes.update({k.replace("__", "."): v for k, v in attrs.items() if v is not None})
+
+    def add(self, key: str, amount: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_s(self) -> float:
+        return max(0, self.end_ns - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+class Trace:
+    """리포트 1회 실행 동안 끝난 span 모음 (워커 스레드에서도 기록)."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        # 실패했지만 빈/기본 결과로 대신한 호출 [{"source", "error"}]
+        self.degraded: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def note_degraded(self, source: str, error: str) -> None:
+        with self._lock:
+            self.degraded.append({"source": source, "error": error})
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON ExportTraceServiceRequest 1건 (otlpjsonfile 리시버가 읽는 형식)."""
+        with self._lock:
+            spans = [s.to_otlp() for s in self.spans]
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "startup-hell"}}]},
+                    "scopeSpans": [{"scope": {"name": "startup_hell.app"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """시작 시각 순으로 정렬한 (trace 시작 기준 상대 ms) 행 목록."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s.start_ns, -s.end_ns))
+        if not spans:
+            return []
+        t0 = spans[0].start_ns
+        by_id = {s.span_id: s for s in spans}
+        rows = []
+        for s in spans:
+            depth, parent = 0, by_id.get(s.parent_id or "")
+            while parent is not None:
+                depth, parent = depth + 1, by_id.get(parent.parent_id or "")
+            rows.append(
+                {
+                    "span": s.name,
+                    "depth": depth,
+                    "start_ms": round((s.start_ns - t0) / 1e6, 1),
+                    "duration_ms": round(s.duration_s * 1e3, 1),
+                    "cache": s.attributes.get("cache.result", ""),
+                    "tokens": int(s.attributes.get("llm.input_tokens", 0) + s.attributes.get("llm.output_tokens", 0)),
+                    "bytes": int(
+                        s.attributes.get("payload.request_bytes", 0) + s.attributes.get("payload.response_bytes", 0)
+                    ),
+                    "error": s.error or "",
+                }
+            )
+        return rows
+
+
+class SpanMetrics:
+    """끝난 span을 이름별로 집계해 Prometheus 텍스트로 내보냄 (프로세스 전체 누적)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = SPAN_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hist: Dict[str, List[Any]] = {}  # 이름 → [버킷별 누적 개수, 합계, 개수]
+        self._errors: Dict[str, int] = {}
+        self._cache: Dict[Tuple[str, str], int] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._bytes: Dict[Tuple[str, str], int] = {}
+        self._degraded: Dict[str, int] = {}
+
+    def count_degraded(self, source: str) -> None:
+        with self._lock:
+            self._degraded[source] = self._degraded.get(source, 0) + 1
+
+    def observe(self, span: Span) -> None:
+        dur = span.duration_s
+        attrs = span.attributes
+        with self._lock:
+            hist = self._hist.setdefault(span.name, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if dur <= bound:
+                    hist[0][i] += 1
+            hist[1] += dur
+            hist[2] += 1
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            if attrs.get("cache.result"):
+                key = (span.name, str(attrs["cache.result"]))
+                self._cache[key] = self._cache.get(key, 0) + 1
+            for direction in ("input", "output"):
+                n = int(attrs.get(f"llm.{direction}_tokens", 0) or 0)
+                if n:
+                    self._tokens[(span.name, direction)] = self._tokens.get((span.name, direction), 0) + n
+            for direction in ("request", "response"):
+                n = int(attrs.get(f"payload.{direction}_bytes", 0) or 0)
+                if n:
+                    self._bytes[(span.name, direction)] = self._bytes.get((span.name, direction), 0) + n
+
+    def prometheus_text(self) -> str:
+        def labels(**kv: str) -> str:
+            esc = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in kv.values())
+            return "{" + ",".join(f'{k}="{v}"' for k, v in zip(kv, esc)) + "}"
+
+        lines = [
+            "# HELP startup_span_duration_seconds Span duration.",
+            "# TYPE startup_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, (counts, total, n) in sorted(self._hist.items()):
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f"startup_span_duration_seconds_bucket{labels(span=name, le=repr(bound))} {c}")
+                lines.append(f"startup_span_duration_seconds_bucket{labels(span=name, le='+Inf')} {n}")
+                lines.append(f"startup_span_duration_seconds_sum{labels(span=name)} {total:.6f}")
+                lines.append(f"startup_span_duration_seconds_count{labels(span=name)} {n}")
+            lines += ["# HELP startup_span_errors_total Spans that raised.", "# TYPE startup_span_errors_total counter"]
+            lines += [f"startup_span_errors_total{labels(span=k)} {v}" for k, v in sorted(self._errors.items())]
+            lines += ["# HELP startup_cache_lookups_total Cache lookups by result.", "# TYPE startup_cache_lookups_total counter"]
+            lines += [
+                f"startup_cache_lookups_total{labels(span=k, result=r)} {v}" for (k, r), v in sorted(self._cache.items())
+            ]
+            lines += ["# HELP startup_llm_tokens_total LLM tokens.", "# TYPE startup_llm_tokens_total counter"]
+            lines += [
+                f"startup_llm_tokens_total{labels(span=k, direction=d)} {v}" for (k, d), v in sorted(self._tokens.items())
+            ]
+            lines += ["# HELP startup_payload_bytes_total Payload bytes.", "# TYPE startup_payload_bytes_total counter"]
+            lines += [
+                f"startup_payload_bytes_total{labels(span=k, direction=d)} {v}" for (k, d), v in sorted(self._bytes.items())
+            ]
+            lines += [
+                "# HELP startup_degraded_total Calls that failed and fell back to an empty/default result.",
+                "# TYPE startup_degraded_total counter",
+            ]
+            lines += [f"startup_degraded_total{labels(source=k)} {v}" for k, v in sorted(self._degraded.items())]
+        return "\n".join(lines) + "\n"
+
+
+@st.cache_resource(show_spinner=False)
+def get_span_metrics() -> SpanMetrics:
+    return SpanMetrics()
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_TRACE_EXPORT_LOCK = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    with span("tavily.search", search__max_results=5) as s: ... s.set(payload__response_bytes=n)
+    (키워드 인자의 "__"는 "."로 바뀜)
+    진행 중인 trace가 없어도 메트릭에는 집계됨.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(
+        name=name,
+        trace_id=trace.trace_id if trace else (parent.trace_id if parent else os.urandom(16).hex()),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+    )
+    s.set(**attrs)
+    t0 = time.perf_counter_ns()
+    token = _current_span.set(s)
+    try:
+        yield s
+    except Exception as exc:
+        s.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        s.end_ns = s.start_ns + (time.perf_counter_ns() - t0)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 제너레이터가 다른 컨텍스트에서 닫힌 경우
+            pass
+        if trace is not None:
+            trace.record(s)
+        get_span_metrics().observe(s)
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Trace]:
+    """리포트 1회 실행을 trace로 묶음. 끝나면 TRACE_EXPORT_PATH에 OTLP JSON 한 줄 추가."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        if TRACE_EXPORT_PATH:
+            export_trace(trace, TRACE_EXPORT_PATH)
+
+
+def note_degraded(source: str, exc: BaseException) -> None:
+    """
+    예외를 삼키고 빈/기본 결과로 대신할 때 호출. 현재 trace(→ Report.degraded)와 span, 메트릭에 남겨서
+    429가 조용히 "결과 없음"으로 보이지 않게 함.
+    """
+    error = f"{type(exc).__name__}: {exc}"[:300]
+    s = _current_span.get()
+    if s is not None:
+        s.set(degraded=source, degraded__error=error)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.note_degraded(source, error)
+    get_span_metrics().count_degraded(source)
+
+
+def export_trace(trace: Trace, path: str) -> None:
+    line = json.dumps(trace.to_otlp(), ensure_ascii=False)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _TRACE_EXPORT_LOCK, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass
+
+
+def submit_in_context(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+    """현재 contextvars(진행 중인 trace/span)를 복사해서 워커 스레드에서 실행."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+class _TokenUsageCallback(BaseCallbackHandler):
+    """LangChain 응답의 usage_metadata(토큰 수)를 span에 더함."""
+
+    def __init__(self, target: Span) -> None:
+        self.target = target
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        for generations in getattr(response, "generations", []) or []:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                self.target.add("llm.input_tokens", int(usage.get("input_tokens", 0) or 0))
+                self.target.add("llm.output_tokens", int(usage.get("output_tokens", 0) or 0))
+
+
+def traced_llm_config() -> Dict[str, Any]:
+    """체인 invoke/stream에 넘길 config. 현재 span에 토큰 수를 기록."""
+    s = _current_span.get()
+    return {"callbacks": [_TokenUsageCallback(s)]} if s is not None else {}
+
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port: int, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """GET /metrics → Prometheus 텍스트. 포트가 이미 쓰이고 있으면 조용히 포기."""
+    metrics = get_span_metrics()
+    gates = get_rate_gates()
+    flights = get_single_flight()
+    sims = get_sim_executor()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = "".join(m.prometheus_text() for m in (metrics, gates, flights, sims)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            return
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def render_trace_waterfall(trace: Trace) -> None:
+    """현재 실행의 span 워터폴 (시작 시각 기준 가로 막대)."""
+    rows = trace.waterfall()
+    if not rows:
+        return
+    for i, row in enumerate(rows):
+        row["label"] = f"{i:02d} " + "· " * row["depth"] + row["span"]
+        row["kind"] = row["span"].split(".")[0]
+    fig = px.bar(
+        rows,
+        x="duration_ms",
+        y="label",
+        base="start_ms",
+        orientation="h",
+        color="kind",
+        hover_data=["duration_ms", "cache", "tokens", "bytes", "error"],
+    )
+    fig.update_layout(
+        height=max(240, 26 * len(rows)),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font_color="white",
+        xaxis_title="ms",
+        yaxis_title=None,
+        yaxis={"autorange": "reversed"},
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(
+        [{k: v for k, v in row.items() if k not in ("label", "kind")} for row in rows],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+# =========================
+# 2-4) 외부 호출 한도 (provider/키별 속도 제한 + 적응형 동시성 + 재시도)
+# =========================
+# provider별 기본값. 환경변수로 덮어씀: TAVILY_RPS, TAVILY_BURST, TAVILY_MAX_CONCURRENCY, GEMINI_RPS ...
+RATE_DEFAULTS: Dict[str, Dict[str, float]] = {
+    "tavily": {"rps": 5.0, "burst": 10, "max_concurrency": 16},
+    "gemini": {"rps": 4.0, "burst": 8, "max_concurrency": 8},
+}
+RATE_MAX_RETRIES = int(os.environ.get("RATE_MAX_RETRIES", "4"))
+# 재시도 대기: [0, min(cap, base × 2^시도)] 균등 난수 (full jitter)
+RATE_BACKOFF_BASE = 0.5
+RATE_BACKOFF_CAP = 20.0
+# 한도 초과/일시 장애로 보고 재시도하는 HTTP 상태
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_STATUS_RE = re.compile(r"\b(RESOURCE_EXHAUSTED|UNAVAILABLE)\b")
+
+
+def _rate_setting(provider: str, name: str) -> float:
+    return float(os.environ.get(f"{provider.upper()}_{name.upper()}", RATE_DEFAULTS[provider][name]))
+
+
+class TokenBucket:
+    """초당 rate개씩 차고 최대 burst개까지 쌓이는 버킷. rate <= 0이면 제한 없음."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """토큰 1개를 예약하고 차례가 올 때까지 잠. 기다린 시간(초)을 반환."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            # 음수 = 앞에 줄 선 예약 수. 그만큼 채워질 때까지 대기
+            wait_s = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return wait_s
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 동시 실행 한도.
+    - 성공: limit += 1/limit (한도만큼 성공하면 +1)
+    - 429/503 등: limit × 0.5 (min_limit 아래로는 안 내려감)
+    """
+
+    def __init__(self, initial: float, max_limit: float, min_limit: float = 1.0) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        t0 = time.monotonic()
+        with self._cond:
+            while self.inflight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.inflight += 1
+        return time.monotonic() - t0
+
+    def release(self, throttled: bool) -> None:
+        with self._cond:
+            self.inflight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * 0.5)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+def api_key_hash(api_key: str) -> str:
+    """API 키 대신 키 단위 구분(속도 제한, single-flight, 검색/LLM 캐시 키)에 쓰는 해시."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+def _status_of(exc: Optional[BaseException]) -> Optional[int]:
+    """예외(와 원인 체인)에서 HTTP 상태 코드를 찾음. (tavily / google-genai / requests 예외 모양)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, UsageLimitExceededError):
+            return 429
+        for attr in ("status_code", "code"):
+            v = getattr(exc, attr, None)
+            if isinstance(v, int) and 100 <= v < 600:
+                return v
+        v = getattr(getattr(exc, "response", None), "status_code", None)
+        if isinstance(v, int):
+            return v
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # 래핑되면서 상태 코드가 사라진 경우 (LangChain 등): 원인 체인에서 gRPC 상태 이름만 봄
+    # (숫자 "429"/"503"은 모델명·요청 ID·프롬프트 인용에도 나와서 쓰지 않음)
+    seen = set()
+    e: Optional[BaseException] = exc
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        if _RETRYABLE_STATUS_RE.search(str(e)):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+def _retry_after(exc: BaseException) -> float:
+    hint = getattr(exc, "retry_after_seconds", None)
+    if isinstance(hint, (int, float)):
+        return float(hint)
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RateGate:
+    """provider + API 키 1개에 대한 속도 제한(TokenBucket) + 동시성(AIMD) + 재시도."""
+
+    def __init__(
+        self,
+        provider: str,
+        rate: float,
+        burst: float,
+        max_concurrency: float,
+        max_retries: int = RATE_MAX_RETRIES,
+    ) -> None:
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(min(4.0, max_concurrency), max_concurrency)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def _enter(self) -> None:
+        waited = self.bucket.acquire() + self.concurrency.acquire()
+        with self._lock:
+            self.calls += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_seconds += waited
+        s = current_span()
+        if s is not None and waited > 0.001:
+            s.add("rate.wait_ms", round(waited * 1e3, 1))
+
+    def _should_retry(self, exc: BaseException, attempt: int) -> bool:
+        throttled = is_retryable(exc)
+        if throttled:
+            with self._lock:
+                self.throttled += 1
+        return throttled and attempt < self.max_retries
+
+    def _sleep_before_retry(self, exc: BaseException, attempt: int) -> None:
+        with self._lock:
+            self.retries += 1
+        s = current_span()
+        if s is not None:
+            s.add("rate.retries", 1)
+        delay = random.uniform(0, min(RATE_BACKOFF_CAP, RATE_BACKOFF_BASE * 2**attempt))
+        time.sleep(max(delay, min(RATE_BACKOFF_CAP, _retry_after(exc))))
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        attempt = 0
+        while True:
+            self._enter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                throttled = is_retryable(exc)
+                self.concurrency.release(throttled)
+                if not self._should_retry(exc, attempt):
+                    raise
+                self._sleep_before_retry(exc, attempt)
+                attempt += 1
+                continue
+            self.concurrency.release(False)
+            return result
+
+    def stream(self, make_iter: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """스트리밍 호출. 첫 청크가 나오기 전에 난 429/503만 재시도 (이미 내보낸 청크는 되돌릴 수 없음)."""
+        attempt = 0
+        while True:
+            self._enter()
+            started = False
+            throttled = False
+            retry_exc: Optional[BaseException] = None
+            try:
+                for item in make_iter():
+                    started = True
+                    yield item
+            except Exception as exc:
+                throttled = is_retryable(exc)
+                if started or not self._should_retry(exc, attempt):
+                    raise
+                retry_exc = exc
+            finally:
+                self.concurrency.release(throttled)
+            if retry_exc is None:
+                return
+            self._sleep_before_retry(retry_exc, attempt)
+            attempt += 1
+
+
+class RateGateRegistry:
+    """(provider, API 키)별 RateGate. 키 원문은 라벨에 남기지 않고 해시 앞 8자리만 씀."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._gates: Dict[Tuple[str, str], RateGate] = {}
+        self._overrides: Dict[str, Dict[str, float]] = {}
+
+    def _settings(self, provider: str) -> Dict[str, float]:
+        base = {name: _rate_setting(provider, name) for name in RATE_DEFAULTS[provider]}
+        return {**base, **self._overrides.get(provider, {})}
+
+    def get(self, provider: str, api_key: str) -> RateGate:
+        key = (provider, api_key_hash(api_key)[:8])
+        with self._lock:
+            gate = self._gates.get(key)
+            if gate is None:
+                cfg = self._settings(provider)
+                gate = self._gates[key] = RateGate(provider, cfg["rps"], cfg["burst"], cfg["max_concurrency"])
+            return gate
+
+    def configure(self, provider: str, **settings: float) -> None:
+        """rps / burst / max_concurrency 덮어쓰기 (배치 CLI 등). 이미 만든 gate에도 반영."""
+        with self._lock:
+            self._overrides.setdefault(provider, {}).update(settings)
+            cfg = self._settings(provider)
+            for (p, _), gate in self._gates.items():
+                if p == provider:
+                    gate.bucket.rate, gate.bucket.burst = cfg["rps"], max(1.0, cfg["burst"])
+                    gate.concurrency.max_limit = max(gate.concurrency.min_limit, cfg["max_concurrency"])
+
+    def prometheus_text(self) -> str:
+        metrics = [
+            ("startup_rate_calls_total", "counter", "Calls through the rate gate.", "calls"),
+            ("startup_rate_waits_total", "counter", "Calls that waited for a token or a slot.", "waits"),
+            ("startup_rate_wait_seconds_total", "counter", "Time spent waiting for a token or a slot.", "wait_seconds"),
+            ("startup_rate_throttled_total", "counter", "Responses treated as throttling (429/5xx).", "throttled"),
+            ("startup_rate_retries_total", "counter", "Retries after throttling.", "retries"),
+        ]
+        with self._lock:
+            gates = sorted(self._gates.items())
+        lines: List[str] = []
+        for name, kind, help_text, attr in metrics:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for (provider, key), gate in gates:
+                lines.append(f'{name}{{provider="{provider}",key="{key}"}} {getattr(gate, attr)}')
+        for name, help_text, attr in [
+            ("startup_rate_concurrency_limit", "Current AIMD concurrency limit.", "limit"),
+            ("startup_rate_inflight", "Calls in flight.", "inflight"),
+        ]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for (provider, key), gate in gates:
+                lines.append(f'{name}{{provider="{provider}",key="{key}"}} {getattr(gate.concurrency, attr)}')
+        return "\n".join(lines) + "\n"
+
+
+@st.cache_resource(show_spinner=False)
+def get_rate_gates() -> RateGateRegistry:
+    return RateGateRegistry()
+
+
+def rate_gate(provider: str, api_key: str) -> RateGate:
+    return get_rate_gates().get(provider, api_key)
+
+
+def tavily_search(api_key: str, query: str, **kwargs: Any) -> Dict[str, Any]:
+    """공유 TavilyClient.search + 속도 제한/재시도 + span(요청/응답 크기, 결과 수)."""
+    client = get_tavily_client(api_key)
+    with span("tavily.search", search__max_results=kwargs.get("max_results")) as s:
+        s.set(payload__request_bytes=len(query.encode("utf-8")))
+        response = rate_gate("tavily", api_key).call(client.search, query=query, **kwargs)
+        s.set(
+            search__results=len(response.get("results", []) or []),
+            payload__response_bytes=len(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8")),
+        )
+        return response
+
+
+# =========================
+# 2-5) 동시 중복 호출 합치기 (single-flight)
+# =========================
+# 같은 검색/프롬프트가 동시에 여러 세션에서 들어오면 외부 호출은 1번만 하고 결과를 나눠 씀.
+# (캐시는 첫 호출이 끝난 뒤에야 도움이 되므로, 그 사이에 몰린 요청을 여기서 합침)
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT", "on").strip().lower() not in ("off", "0", "false")
+
+
+class _SharedStream:
+    """리더가 받은 스트림 항목을 쌓아두고, 뒤늦게 붙은 구독자도 처음부터 따라 읽게 함."""
+
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+    def publish(self, item: Any) -> None:
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.done, self.error = True, error
+            self.cond.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.items) and not self.done:
+                    self.cond.wait()
+                batch = self.items[i:]
+                done, error = self.done, self.error
+            for item in batch:
+                yield item
+            i += len(batch)
+            if done and i >= len(self.items):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    키별 진행 중 호출 1개. 같은 키로 동시에 들어온 호출은 그 결과(또는 예외)를 같이 받음.
+    - api_key: 같은 API 키끼리만 합침 (다른 세션의 401/429가 넘어오거나, 잘못된 키가 남의 키로 결과를 받지 않게)
+    - do(): 일반 호출 (Future 공유)
+    - stream(): 스트리밍 호출 (리더가 받은 청크를 구독자에게 그대로 중계)
+    끝난 호출은 바로 지움 (결과 보관은 캐시 몫).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self.leaders: Dict[str, int] = {}
+        self.shared: Dict[str, int] = {}
+
+    def _count(self, counter: Dict[str, int], namespace: str) -> None:
+        counter[namespace] = counter.get(namespace, 0) + 1
+
+    def do(self, namespace: str, key: str, fn: Callable[[], Any], api_key: str = "") -> Any:
+        if not SINGLE_FLIGHT_ENABLED:
+            return fn()
+        flight_key = f"{namespace}:{api_key_hash(api_key)}:{key}"
+        with self._lock:
+            fut = self._calls.get(flight_key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[flight_key] = Future()
+            self._count(self.leaders if leader else self.shared, namespace)
+        if not leader:
+            with span(f"singleflight.{namespace}", singleflight__shared=True):
+                return fut.result()
+        try:
+            value = fn()
+        except BaseException as exc:
+            fut.set_exception(exc)
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._calls.pop(flight_key, None)
+
+    def stream(
+        self, namespace: str, key: str, make_iter: Callable[[], Iterable[Any]], api_key: str = ""
+    ) -> Iterator[Any]:
+        if not SINGLE_FLIGHT_ENABLED:
+            yield from make_iter()
+            return
+        flight_key = f"{namespace}:{api_key_hash(api_key)}:{key}"
+        with self._lock:
+            shared = self._streams.get(flight_key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[flight_key] = _SharedStream()
+            self._count(self.leaders if leader else self.shared, namespace)
+        if not leader:
+            with span(f"singleflight.{namespace}", singleflight__shared=True):
+                yield from shared.follow()
+            return
+        error: Optional[BaseException] = None
+        try:
+            for item in make_iter():
+                shared.publish(item)
+                yield item
+        except GeneratorExit:
+            # 리더 쪽 소비자가 중간에 그만둠 → 구독자는 끝까지 못 받으니 에러로 알림
+            error = RuntimeError(f"{namespace}: shared stream abandoned by its leader")
+            raise
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            with self._lock:
+                self._streams.pop(flight_key, None)
+            shared.close(error)
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            rows = [("leader", self.leaders.copy()), ("shared", self.shared.copy())]
+        lines = [
+            "# HELP startup_singleflight_calls_total Calls by role (leader = went out, shared = joined an in-flight call).",
+            "# TYPE startup_singleflight_calls_total counter",
+        ]
+        for role, counter in rows:
+            for namespace, n in sorted(counter.items()):
+                lines.append(f'startup_singleflight_calls_total{{namespace="{namespace}",role="{role}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+@st.cache_resource(show_spinner=False)
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+# =========================
+# 3) Tavily 검색 + 결과 필터링
+# =========================
+@dataclass(frozen=True)
+class GarbageFilterConfig:
+    # 깨진 문자(U+FFFD) 개수가 이 이상이면 드롭
+    max_replacement_chars: int = 8
+    # 허용 문자(영숫자/한글/공백/기본 구두점) 밖 글자 비율이 이보다 크면 드롭
+    max_dirty_ratio: float = 0.35
+
+
+DEFAULT_GARBAGE_FILTER = GarbageFilterConfig()
+# 허용 문자 밖의 글자 하나하나에 매치 (제어문자·U+FFFD도 여기 걸림)
+_DIRTY_CHAR_RE = re.compile(r"[^A-Za-z0-9가-힣\s\.\,\-\(\)\[\]\!\?\:\/]")
+
+
+def _looks_like_binary_or_garbage(text: str, config: GarbageFilterConfig = DEFAULT_GARBAGE_FILTER) -> bool:
+    if not text:
+        return True
+    # XLS/바이너리 흔한 패턴
+    if "[XLS]" in text:
+        return True
+    # 허용 문자 밖 글자만 한 번 훑으면서 판정 (복사본 안 만듦, 기준 넘으면 바로 종료)
+    max_dirty = config.max_dirty_ratio * len(text)
+    dirty = 0
+    replacement = 0
+    for m in _DIRTY_CHAR_RE.finditer(text):
+        ch = m.group()
+        # 제어문자(\x00 포함) 하나라도 있으면 드롭
+        if ch < "\t":
+            return True
+        if ch == "\ufffd":
+            replacement += 1
+            if replacement >= config.max_replacement_chars:
+                return True
+        dirty += 1
+        # 알파뉴메릭/한글 비율이 너무 낮으면 드롭
+        if dirty > max_dirty:
+            return True
+    return False
+
+
+def get_market_snippets(query: str, tavily_key: str, max_results: int = 5) -> List[dict]:
+    """
+    시장 트렌드 검색 결과 [{"title", "url", "content", "score"}].
+    본문은 자르지 않음 (프롬프트 길이는 build_market_context가 토큰 예산으로 맞춤).
+    """
+    if not tavily_key:
+        return []
+    cache = get_query_cache()
+    # 키도 캐시 키에 넣음: 잘못된/만료된 키가 다른 키로 받아 둔 결과를 공짜로 가져가지 않게
+    params = {"max_results": max_results, "search_depth": "advanced", "key": api_key_hash(tavily_key)[:16]}
+    cached, lookup = cache.get("market_snippets", query, **params)
+    if cached is not None:
+        return cached
+
+    def fetch() -> List[dict]:
+        response = tavily_search(tavily_key, query, max_results=max_results, search_depth="advanced")
+        snippets = []
+        for r in response.get("results", []) or []:
+            content = (r.get("content") or "").strip()
+            if _looks_like_binary_or_garbage(content):
+                continue
+            snippets.append(
+                {
+                    "title": (r.get("title") or "Untitled").strip(),
+                    "url": (r.get("url") or "").strip(),
+                    "content": re.sub(r"\s+", " ", content),
+                    "score": float(r.get("score") or 0.0),
+                }
+            )
+        cache.set("market_snippets", query, snippets, ttl=MARKET_DATA_TTL, **params)
+        return snippets
+
+    try:
+        # ✅ 같은 검색어가 동시에 몰리면 Tavily 호출 1번으로 합침
+        return get_single_flight().do("market_data", make_cache_key("market_snippets", lookup.canonical, **params), fetch, tavily_key)
+    except Exception as exc:
+        # 에러는 캐시하지 않음
+        note_degraded("market", exc)
+        return []
+
+
+def get_market_data(query: str, tavily_key: str) -> str:
+    """검색 1번 → 프롬프트용 시장 데이터 문자열 (스탯 프롬프트 예산 기준)."""
+    if not tavily_key:
+        return "Market data unavailable (No API Key)."
+    return build_market_context(query, [get_market_snippets(query, tavily_key)]).render(MARKET_CONTEXT_BUDGETS["stats"])
+
+
+def get_market_autopsy(product: str, desc: str, tavily_key: str, max_results: int = 10) -> List[dict]:
+    if not tavily_key:
+        return []
+    q = f"{product} {desc} 실패 사례 망한 이유 경쟁사 리뷰 불만 후기"
+    cache = get_query_cache()
+    params = {"max_results": max_results, "search_depth": "advanced", "key": api_key_hash(tavily_key)[:16]}
+    cached, lookup = cache.get("market_autopsy", q, **params)
+    if cached is not None:
+        return cached
+
+    def fetch() -> List[dict]:
+        response = tavily_search(tavily_key, q, max_results=max_results, search_depth="advanced")
+        raw = response.get("results", []) or []
+
+        cleaned = []
+        for r in raw:
+            title = (r.get("title") or "").strip()
+            url = (r.get("url") or "").strip()
+            content = (r.get("content") or "").strip()
+            if not title or not url or _looks_like_binary_or_garbage(content):
+                continue
+            content = re.sub(r"\s+", " ", content)
+            cleaned.append({"title": title, "url": url, "content": content, "score": float(r.get("score") or 0.0)})
+
+        # 중복 URL 제거
+        seen = set()
+        uniq = []
+        for x in cleaned:
+            if x["url"] in seen:
+                continue
+            seen.add(x["url"])
+            uniq.append(x)
+        cache.set("market_autopsy", q, uniq, ttl=MARKET_AUTOPSY_TTL, **params)
+        return uniq
+
+    try:
+        return get_single_flight().do("market_autopsy", make_cache_key("market_autopsy", lookup.canonical, **params), fetch, tavily_key)
+    except Exception as exc:
+        # 429 등으로 실패한 걸 "사례 없음"과 구분할 수 있게 기록
+        note_degraded("cases", exc)
+        return []
+
+
+def _merge_video_urls(per_query: List[Optional[List[str]]], stop_at_pending: bool) -> List[str]:
+    """검색어 우선순위 순서대로 URL을 합치고 중복 제거. stop_at_pending이면 아직 안 끝난 검색어에서 멈춤."""
+    urls: List[str] = []
+    seen = set()
+    for found in per_query:
+        if found is None:
+            if stop_at_pending:
+                break
+            continue
+        for u in found:
+            if not u or u in seen:
+                continue
+            seen.add(u)
+            urls.append(u)
+    return urls
+
+
+# 동시에 보내는 YouTube 검색 수. 검색어 3개 중 앞 2개(검색어당 2개)로 3개가 채워지면 3번째는 안 보냄
+YOUTUBE_SEARCH_CONCURRENCY = int(os.environ.get("YOUTUBE_SEARCH_CONCURRENCY", "2"))
+
+
+def get_youtube_videos(
+    queries: List[str],
+    tavily_key: str,
+    max_videos: int = 3,
+    timeout: float = 8.0,
+) -> List[str]:
+    """
+    검색어별 YouTube 검색을 동시에 보내고, 결과는 검색어 순서(우선순위)대로 병합.
+    - 동시에 나가는 요청은 YOUTUBE_SEARCH_CONCURRENCY개까지. 하나가 끝나야 다음 검색어를 보냄
+    - 앞쪽 검색어들만으로 max_videos가 채워지면 바로 반환하고, 남은 검색어는 보내지 않음
+      (이미 나간 요청은 취소되지 않고 자체 timeout까지 돎 — 기다리지만 않음)
+    - timeout: 검색어별 제한 시간(초). 넘기면 그 검색어는 빈 결과로 취급
+    """
+    if not tavily_key:
+        return []
+    queries = [q for q in queries if q.strip()]
+    if not queries:
+        return []
+
+    def search(q: str) -> List[str]:
+        query = f"{q} site:youtube.com"
+
+        def fetch() -> List[str]:
+            resp = tavily_search(tavily_key, query, max_results=2, timeout=timeout)
+            return [(r.get("url") or "").strip() for r in resp.get("results", []) or []]
+
+        return get_single_flight().do(
+            "videos", make_cache_key("videos", canonicalize_query(query), max_results=2), fetch, tavily_key
+        )
+
+    concurrency = min(len(queries), max(1, YOUTUBE_SEARCH_CONCURRENCY))
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    futures: Dict[Future, int] = {}
+    per_query: List[Optional[List[str]]] = [None] * len(queries)
+    todo = iter(enumerate(queries))
+
+    def submit_next() -> None:
+        # 다음 검색은 결과를 확인한 뒤에 보냄 (풀 대기열에 미리 넣으면 빈 스레드가 바로 가져가 버림)
+        item = next(todo, None)
+        if item is not None:
+            futures[submit_in_context(pool, search, item[1])] = item[0]
+
+    for _ in range(concurrency):
+        submit_next()
+    deadline = time.monotonic() + timeout
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                try:
+                    per_query[futures[fut]] = fut.result()
+                except Exception as exc:
+                    note_degraded("videos", exc)
+                    per_query[futures[fut]] = []
+            urls = _merge_video_urls(per_query, stop_at_pending=True)
+            if len(urls) >= max_videos:
+                return urls[:max_videos]
+            for _ in done:
+                submit_next()
+            pending = {f for f in futures if not f.done()}
+        return _merge_video_urls(per_query, stop_at_pending=False)[:max_videos]
+    finally:
+        # 이미 나간 HTTP 요청은 취소되지 않고 자체 timeout으로 끝남 (기다리지만 않음)
+        pool.shutdown(wait=False)
+
+
+# =========================
+# 3-1) 프롬프트용 시장 컨텍스트 (중복 제거 + 관련도 순 + 토큰 예산)
+# =========================
+# 프롬프트별 시장 데이터 토큰 예산. 검색 결과는 한 번만 정리하고 체인마다 예산만큼 앞에서부터 잘라 씀
+MARKET_CONTEXT_BUDGETS: Dict[str, int] = {
+    "stats": int(os.environ.get("MARKET_CONTEXT_STATS_TOKENS", "350")),
+    "autopsy": int(os.environ.get("MARKET_CONTEXT_AUTOPSY_TOKENS", "500")),
+    "single": int(os.environ.get("MARKET_CONTEXT_SINGLE_TOKENS", "500")),
+}
+# 스니펫 1개가 예산을 독차지하지 않도록 개당 상한
+MARKET_SNIPPET_MAX_TOKENS = 160
+# 남은 예산이 이보다 작으면 잘라서라도 넣지 않고 멈춤
+MARKET_SNIPPET_MIN_TOKENS = 40
+# MinHash 추정 Jaccard가 이 값 이상이면 같은 내용으로 보고 덜 관련된 쪽을 버림
+NEAR_DUPLICATE_JACCARD = 0.6
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+# h(x) = (a·x + b) mod p. crc32(32비트) × a(31비트)가 uint64 안에서 넘치지 않는 소수
+_MINHASH_PRIME = np.uint64(4294967311)
+_minhash_rng = np.random.default_rng(20240601)
+_MINHASH_A = _minhash_rng.integers(1, 2**31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _minhash_rng.integers(0, 2**31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 대략 추정: ASCII 4자당 1토큰, 그 외(한글 등) 1.5자당 1토큰.
+    UTF-8 길이로 비ASCII 글자 수를 셈 (한글은 3바이트).
+    """
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii / 1.5)
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[: max(1, int(len(text) * max_tokens / estimate_tokens(text)))]
+    # 단어 중간에서 끊기지 않게
+    head = cut.rsplit(" ", 1)[0] if " " in cut[len(cut) // 2 :] else cut
+    return head.rstrip(" ,.") + "…"
+
+
+def _shingles(text: str) -> np.ndarray:
+    """정규화한 문자열의 글자 k-shingle을 crc32로 해시 (프로세스가 달라도 같은 값 → 프롬프트/캐시 키 안정)."""
+    norm = " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    if len(norm) <= SHINGLE_SIZE:
+        grams = {norm}
+    else:
+        grams = {norm[i : i + SHINGLE_SIZE] for i in range(len(norm) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    x = _shingles(text)
+    return ((_MINHASH_A[:, None] * x[None, :] + _MINHASH_B[:, None]) % _MINHASH_PRIME).min(axis=1)
+
+
+def _relevance(focus_grams: set, snippet: Dict[str, Any]) -> float:
+    """제품명/설명의 글자 bigram 중 스니펫에 나온 비율 + Tavily 점수 약간."""
+    if not focus_grams:
+        return float(snippet.get("score") or 0.0)
+    grams = _char_ngrams(canonicalize_query(f"{snippet.get('title', '')} {snippet.get('content', '')}").split())
+    return len(focus_grams & grams) / len(focus_grams) + 0.25 * float(snippet.get("score") or 0.0)
+
+
+@dataclass
+class MarketContext:
+    """중복 제거 + 관련도 순으로 정리된 스니펫. render(예산)은 항상 같은 순서의 앞부분이라 체인끼리 재사용됨."""
+
+    snippets: List[Dict[str, Any]]
+    candidates: int = 0
+    duplicates: int = 0
+
+    def render(self, budget_tokens: int) -> str:
+        lines: List[str] = []
+        left = budget_tokens
+        for snip in self.snippets:
+            line = f"- {snip['title']}: {_truncate_to_tokens(snip['content'], MARKET_SNIPPET_MAX_TOKENS)}"
+            cost = estimate_tokens(line) + 1
+            if cost > left:
+                if left >= MARKET_SNIPPET_MIN_TOKENS:
+                    lines.append(_truncate_to_tokens(line, left - 1))
+                break
+            lines.append(line)
+            left -= cost
+        return "\n".join(lines) if lines else "No market data found."
+
+
+def build_market_context(focus: str, sources: Iterable[List[Dict[str, Any]]]) -> MarketContext:
+    """
+    여러 검색 결과(시장 트렌드, 실패 사례 ...)를 합쳐서
+    1) 같은 URL 제거 2) 관련도 순 정렬 3) MinHash로 거의 같은 스니펫 제거 (더 관련된 쪽을 남김).
+    """
+    seen_urls = set()
+    candidates: List[Dict[str, Any]] = []
+    for results in sources:
+        for snip in results or []:
+            url = snip.get("url") or ""
+            if not snip.get("content") or (url and url in seen_urls):
+                continue
+            seen_urls.add(url)
+            candidates.append(snip)
+
+    with span("context.market", context__candidates=len(candidates)) as s:
+        focus_grams = _char_ngrams(canonicalize_query(focus).split())
+        # 정렬은 안정 정렬이라 점수가 같으면 검색 순위(원래 순서)를 따름
+        ranked = sorted(candidates, key=lambda x: -_relevance(focus_grams, x))
+        kept: List[Dict[str, Any]] = []
+        signatures: List[np.ndarray] = []
+        for snip in ranked:
+            sig = minhash_signature(f"{snip.get('title', '')} {snip['content']}")
+            if signatures and float((np.vstack(signatures) == sig).mean(axis=1).max()) >= NEAR_DUPLICATE_JACCARD:
+                continue
+            kept.append(snip)
+            signatures.append(sig)
+        s.set(context__kept=len(kept), context__duplicates=len(candidates) - len(kept))
+    return MarketContext(kept, candidates=len(candidates), duplicates=len(candidates) - len(kept))
+
+
+# =========================
+# 4) 모델/번역 (선택사항)
+# =========================
+# 모델 목록 캐시 수명. 지나면 기존 목록을 쓰면서 백그라운드에서 갱신
+MODEL_LIST_TTL = 60 * 60
+# 목록 조회가 실패(빈 목록)했을 때는 짧게만 기억하고 다시 시도
+MODEL_LIST_RETRY = 60
+
+
+def _list_gemini_models(api_key: str) -> List[str]:
+    if not genai or not api_key:
+        return []
+    try:
+        with span("llm.list_models") as s:
+            client = get_genai_client(api_key)
+            names: List[str] = []
+            for m in rate_gate("gemini", api_key).call(lambda: list(client.models.list())):
+                name = getattr(m, "name", "") or ""
+                if name:
+                    names.append(name.replace("models/", ""))
+            s.set(llm__models=len(names))
+            return names
+    except Exception as exc:
+        note_degraded("models", exc)
+        return []
+
+
+def _pick_gemini_model(model_name: str, models: List[str]) -> str:
+    requested = (model_name or "").strip() or "gemini-1.5-flash"
+    normalized = requested.replace("models/", "")
+    alias = {
+        "gemini": "gemini-2.0-flash",
+        "gemini-2.0": "gemini-2.0-flash",
+        "gemini-1.5-pro-latest": "gemini-1.5-pro",
+        "gemini-1.5-flash-latest": "gemini-1.5-flash",
+    }
+    normalized = alias.get(normalized, normalized)
+
+    if models:
+        if normalized in models:
+            return normalized
+        for cand in ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro"]:
+            if cand in models:
+                return cand
+    return normalized
+
+
+class ModelRegistry:
+    """
+    API 키별 모델 목록과 (키, 요청 모델) → 실제 모델명 해석 결과를 프로세스 전체에서 공유.
+    - 처음 한 번만 client.models.list()를 기다리고, 이후엔 dict 조회
+    - TTL이 지나면 이전 목록으로 바로 답하고 백그라운드 스레드가 갱신 (stale-while-revalidate)
+    - warm_up(): 버튼을 누르기 전에 미리 목록을 받아둠
+    """
+
+    def __init__(
+        self,
+        lister: Callable[[str], List[str]] = _list_gemini_models,
+        ttl: float = MODEL_LIST_TTL,
+        retry: float = MODEL_LIST_RETRY,
+    ) -> None:
+        self._lister = lister
+        self.ttl = ttl
+        self.retry = retry
+        self._lock = threading.Lock()
+        self._models: Dict[str, Tuple[List[str], float]] = {}
+        self._resolved: Dict[Tuple[str, str], str] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        # warm_up 스레드를 띄웠지만 아직 _fetch에 들어가기 전인 키 (rerun마다 스레드가 또 뜨지 않게)
+        self._warming: set = set()
+
+    def _fetch(self, api_key: str) -> List[str]:
+        with self._lock:
+            event = self._inflight.get(api_key)
+            owner = event is None
+            if owner:
+                event = self._inflight[api_key] = threading.Event()
+        if not owner:
+            # 같은 키를 다른 스레드가 이미 조회 중이면 그 결과를 기다림
+            event.wait(timeout=30)
+            with self._lock:
+                return self._models.get(api_key, ([], 0.0))[0]
+        try:
+            models = self._lister(api_key)
+            with self._lock:
+                self._models[api_key] = (models, time.time())
+                for k in [k for k in self._resolved if k[0] == api_key]:
+                    del self._resolved[k]
+            return models
+        finally:
+            with self._lock:
+                self._inflight.pop(api_key, None)
+            event.set()
+
+    def _refresh_in_background(self, api_key: str) -> None:
+        with self._lock:
+            if api_key in self._inflight:
+                return
+        threading.Thread(target=self._fetch, args=(api_key,), daemon=True).start()
+
+    def models(self, api_key: str) -> List[str]:
+        with self._lock:
+            entry = self._models.get(api_key)
+        if entry is None:
+            return self._fetch(api_key)
+        models, fetched_at = entry
+        if time.time() - fetched_at > (self.ttl if models else self.retry):
+            self._refresh_in_background(api_key)
+        return models
+
+    def resolve(self, model_name: str, api_key: str) -> str:
+        key = (api_key, (model_name or "").strip())
+        with self._lock:
+            resolved = self._resolved.get(key)
+        if resolved is not None:
+            self.models(api_key)  # TTL 확인만 (필요하면 백그라운드 갱신)
+            return resolved
+        resolved = _pick_gemini_model(model_name, self.models(api_key))
+        with self._lock:
+            self._resolved[key] = resolved
+        return resolved
+
+    def warm_up(self, api_key: str, model_name: str = "") -> None:
+        if not api_key:
+            return
+        with self._lock:
+            if api_key in self._models or api_key in self._inflight or api_key in self._warming:
+                return
+            self._warming.add(api_key)
+
+        def run() -> None:
+            try:
+                self.resolve(model_name, api_key)
+            finally:
+                with self._lock:
+                    self._warming.discard(api_key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+@st.cache_resource(show_spinner=False)
+def get_model_registry() -> ModelRegistry:
+    return ModelRegistry()
+
+
+def resolve_gemini_model(model_name: str, api_key: str) -> str:
+    return get_model_registry().resolve(model_name, api_key)
+
+
+# 번역 결과는 원문이 같으면 바뀔 일이 없으니 길게 보관
+TRANSLATION_TTL = 60 * 60 * 24 * 7
+LANGUAGE_NAMES = {"ko": "Korean", "en": "English", "ja": "Japanese"}
+
+
+def _translation_key(text: str, target_language: str) -> str:
+    raw = json.dumps(["translation", hashlib.sha256(text.encode("utf-8")).hexdigest(), target_language])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def translate_batch(
+    fields: Dict[str, str],
+    api_key: str,
+    model_name: str,
+    target_languages: List[str],
+    use_cache: bool = True,
+) -> Dict[str, Dict[str, str]]:
+    """
+    여러 필드 × 여러 언어를 Gemini 호출 1번으로 번역.
+    - 반환: {언어: {필드명: 번역문}}. 실패한 항목은 원문 유지
+    - (원문 해시, 언어) 단위로 캐시 → 바뀌지 않은 필드는 다시 번역하지 않음
+    - 같은 원문이 여러 필드에 있으면 한 번만 보냄
+    """
+    result = {lang: dict(fields) for lang in target_languages}
+    if not api_key or not genai:
+        return result
+    cache = _llm_cache(use_cache)
+
+    todo: Dict[str, List[str]] = {}
+    for lang in target_languages:
+        for name, text in fields.items():
+            if not (text or "").strip():
+                continue
+            cached = cache.get(_translation_key(text, lang)) if cache else None
+            if cached is not None:
+                result[lang][name] = cached
+            else:
+                todo.setdefault(lang, []).append(name)
+    if not todo:
+        return result
+
+    ids: Dict[str, str] = {}
+    for names in todo.values():
+        for name in names:
+            ids.setdefault(fields[name], f"t{len(ids)}")
+    payload = {"target_languages": list(todo), "texts": {i: text for text, i in ids.items()}}
+    prompt = f"""
+Translate every Korean text in "texts" into every language in "target_languages".
+Keep names, numbers, and product terms intact.
+Return JSON only, shaped as {{"<language>": {{"<text id>": "<translation>"}}}}.
+
+{json.dumps(payload, ensure_ascii=False)}
+""".strip()
+    try:
+        with span("llm.translate", llm__languages=len(todo), llm__texts=len(ids)) as s:
+            s.set(cache__result="miss", payload__request_bytes=len(prompt.encode("utf-8")))
+            client = get_genai_client(api_key)
+            resp = rate_gate("gemini", api_key).call(
+                client.models.generate_content,
+                model=resolve_gemini_model(model_name, api_key),
+                contents=prompt,
+                config={"response_mime_type": "application/json"},
+            )
+            text = getattr(resp, "text", "") or ""
+            usage = getattr(resp, "usage_metadata", None)
+            s.set(
+                payload__response_bytes=len(text.encode("utf-8")),
+                llm__input_tokens=getattr(usage, "prompt_token_count", None),
+                llm__output_tokens=getattr(usage, "candidates_token_count", None),
+            )
+            parsed = JsonOutputParser().parse(text)
+    except Exception as exc:
+        note_degraded("translation", exc)
+        return result
+    if not isinstance(parsed, dict):
+        return result
+
+    for lang, names in todo.items():
+        translated = parsed.get(lang) or {}
+        if not isinstance(translated, dict):
+            continue
+        for name in names:
+            out = translated.get(ids[fields[name]])
+            if isinstance(out, str) and out.strip():
+                result[lang][name] = out.strip()
+                if cache:
+                    cache.set(_translation_key(fields[name], lang), out.strip(), TRANSLATION_TTL)
+    return result
+
+
+def translate_text(text: str, api_key: str, model_name: str, target_language: str) -> str:
+    if not text or not api_key or not genai:
+        return text
+    return translate_batch({"text": text}, api_key, model_name, [target_language])[target_language]["text"]
+
+
+# =========================
+# 5) MCTS(몬테카를로) 시뮬레이션
+# =========================
+# 95% 신뢰구간 z값
+CI_Z = 1.96
+# what-if 분석에서 스탯을 몇 점씩 올리고 내려볼지
+SENSITIVITY_STEP = 10
+# what-if 격자: 스탯 변화 크기들 (화면 요약은 SENSITIVITY_STEP 기준)
+SENSITIVITY_STEPS = (5, 10, 20)
+# adaptive 모드: 첫 묶음 크기 (이후 chunk_size까지 2배씩)
+ADAPTIVE_FIRST_CHUNK = 1 << 14
+VARIANCE_REDUCTIONS = (None, "antithetic", "stratified")
+# LLM 스탯 점수의 불확실성 (표준편차, 점). LLM 샘플이 없을 때 점수 주변 정규분포에 씀
+STAT_UNCERTAINTY_SD = float(os.environ.get("STAT_UNCERTAINTY_SD", "8"))
+SURVIVAL_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class SimulationResult:
+    survival_rate: float
+    death_counts: Dict[str, int]
+    bottleneck_stage: str
+    # 단계별 정확한 사망 확률 (해석해 기준, 합 + 생존확률 = 1)
+    death_probs: Dict[str, float] = field(default_factory=dict)
+    # survival_rate(%)의 95% 신뢰구간. exact 모드는 폭 0
+    survival_ci: Optional[Tuple[float, float]] = None
+    mode: str = "sample"
+    # 실제로 굴린 롤아웃 수 (adaptive면 iterations보다 적을 수 있음, exact는 0)
+    samples: int = 0
+    # 재현용 SeedSequence entropy (StartupMCTS(seed=...)에 넣으면 같은 결과)
+    seed: Optional[int] = None
+
+
+@dataclass
+class UncertaintyResult:
+    """스탯 점수 불확실성까지 반영한 생존확률 분포 (outer: 스탯 벡터 추출 수, inner: 추출마다 롤아웃 수)."""
+
+    outer: int
+    inner: int
+    # 생존확률(%) 분포 백분위 {5: ..., 50: ..., 95: ...}
+    survival_percentiles: Dict[int, float]
+    survival_mean: float
+    # outer 추출마다 가장 많이 죽은 단계의 빈도 (합 1)
+    bottleneck_frequency: Dict[str, float]
+    # "normal": 점수 주변 정규분포 / "llm_samples": LLM 샘플들의 평균·공분산
+    source: str = "normal"
+    seed: Optional[int] = None
+
+
+@dataclass
+class SensitivityResult:
+    """스탯을 ±step(여러 크기) 바꿨을 때 생존확률 변화 (전부 해석해, 단위 %p). dict의 첫 키는 step."""
+
+    steps: List[int]
+    base_survival: float
+    # step → stat → (-step일 때 변화, +step일 때 변화)
+    single: Dict[int, Dict[str, Tuple[float, float]]]
+    # step → stat → stage → +step일 때 그 단계 사망확률 변화 (음수 = 덜 죽음)
+    stage_effects: Dict[int, Dict[str, Dict[str, float]]]
+    # step → "product+team" → (두 스탯을 같이 -step, 같이 +step 했을 때 변화)
+    pairwise: Dict[int, Dict[str, Tuple[float, float]]]
+    scenarios: int
+
+    @property
+    def step(self) -> int:
+        """요약에 쓰는 기본 step (SENSITIVITY_STEP이 격자에 없으면 가운데 값)."""
+        return SENSITIVITY_STEP if SENSITIVITY_STEP in self.steps else self.steps[len(self.steps) // 2]
+
+    def best_stat(self, step: Optional[int] = None) -> str:
+        single = self.single[step or self.step]
+        return max(single, key=lambda k: single[k][1])
+
+    def best_pair(self, step: Optional[int] = None) -> str:
+        pairwise = self.pairwise[step or self.step]
+        return max(pairwise, key=lambda k: pairwise[k][1])
+
+
+class StartupMCTS:
+    """
+    스테이지별 독립 베르누이 시행으로 생존/사망 단계를 계산.
+    - mode="sample": 몬테카를로 롤아웃 iterations회 (독립이 아닌 동역학이 붙을 때 필요)
+    - mode="adaptive": 생존확률 CI 폭과 1·2위 사망 단계 차이가 충분히 확실해지면 멈춤 (최대 iterations회)
+    - mode="exact": 누적곱으로 생존확률/기대 사망수를 바로 계산 (마이크로초 단위)
+    seed가 같으면 결과도 같음. 묶음마다 SeedSequence에서 독립 스트림을 하나씩 떼어 씀.
+    variance_reduction: "antithetic"(U와 1-U 짝) | "stratified"(묶음마다 라틴 하이퍼큐브) | None
+    (생존 = 5단계 모두 통과라 드문 사건이 되기 쉬워서 분산 감소 폭이 작음. 기본은 가장 싼 None, bench/bench_mcts.py --variance 참고)
+    """
+
+    def __init__(
+        self,
+        iterations: int = 1000,
+        chunk_size: int = 1 << 18,
+        mode: str = "sample",
+        seed: Optional[int] = None,
+        variance_reduction: Optional[str] = None,
+        ci_tolerance: float = 0.05,
+        ci_rel_tolerance: float = 0.1,
+        margin_tolerance: float = 0.5,
+    ) -> None:
+        if mode not in ("sample", "adaptive", "exact"):
+            raise ValueError(f"Unknown simulation mode: {mode}")
+        if variance_reduction not in VARIANCE_REDUCTIONS:
+            raise ValueError(f"Unknown variance reduction: {variance_reduction}")
+        if iterations <= 0:
+            raise ValueError(f"iterations must be positive, got {iterations}")
+        self.iterations = iterations
+        self.mode = mode
+        # 한 번에 뽑는 난수 행 수 (iterations가 커도 메모리는 chunk_size × 5 로 고정)
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.variance_reduction = variance_reduction
+        # adaptive 멈춤 기준 (단위 %p): 생존확률 95% CI 반폭(기본값 = 화면 표시 자릿수 0.1%의 절반), 1·2위 사망 단계 차이의 CI 반폭
+        # 생존확률이 아주 낮으면 절대 기준만으로는 너무 일찍 멈춤 → 반폭이 추정치의 ci_rel_tolerance배 이하여야 함
+        self.ci_tolerance = ci_tolerance
+        self.ci_rel_tolerance = ci_rel_tolerance
+        self.margin_tolerance = margin_tolerance
+        # 니즈 점수 consumer_needs: 초기 단계에서 특히 크게 반영
+        self.stage_weights = {
+            "Seed": {"product": 0.10, "team": 0.35, "strategy": 0.10, "marketing": 0.10, "consumer_needs": 0.35},
+            "MVP": {"product": 0.20, "team": 0.25, "strategy": 0.10, "marketing": 0.10, "consumer_needs": 0.35},
+            "PMF": {"product": 0.20, "team": 0.10, "strategy": 0.20, "marketing": 0.20, "consumer_needs": 0.30},
+            "Scale-up": {"product": 0.20, "team": 0.20, "strategy": 0.30, "marketing": 0.25, "consumer_needs": 0.05},
+            "Unicorn": {"product": 0.20, "team": 0.10, "strategy": 0.30, "marketing": 0.35, "consumer_needs": 0.05},
+        }
+        self.stage_difficulty = {"Seed": 0.70, "MVP": 0.60, "PMF": 0.50, "Scale-up": 0.40, "Unicorn": 0.30}
+        self._coef: Optional[np.ndarray] = None
+
+    def _weight_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(stage × stat) 정규화 가중치 행렬과 stage별 난이도 벡터."""
+        weights = np.array([[self.stage_weights[s].get(k, 0.0) for k in STAT_KEYS] for s in STAGES], dtype=float)
+        weights /= weights.sum(axis=1, keepdims=True)
+        difficulty = np.array([self.stage_difficulty[s] for s in STAGES], dtype=float)
+        return weights, difficulty
+
+    def _stage_coef(self) -> np.ndarray:
+        """(stat × stage) 계수 = 정규화 가중치 × 난이도 / 100. 스탯 행렬에 곱하면 바로 단계별 생존확률 (처음 한 번만 계산)."""
+        if self._coef is None:
+            weights, difficulty = self._weight_matrix()
+            self._coef = weights.T * difficulty / 100.0
+        return self._coef
+
+    def _stage_survival_matrix(self, stats_list: List[Dict[str, int]]) -> np.ndarray:
+        """(아이디어 × stage) 단계별 생존확률."""
+        x = np.array([[float(stats.get(k, 0) or 0) for k in STAT_KEYS] for stats in stats_list], dtype=float)
+        return np.clip(x @ self._stage_coef(), 0.0, 1.0)
+
+    def _stage_survival_probs(self, stats: Dict[str, int]) -> np.ndarray:
+        return self._stage_survival_matrix([stats])[0]
+
+    @staticmethod
+    def _exact_death_probs(probs: np.ndarray) -> np.ndarray:
+        # 단계 i에서 죽을 확률 = (i 이전 단계 모두 통과) × (i에서 탈락). 마지막 축이 stage
+        reach = np.cumprod(probs, axis=-1)
+        reach = np.concatenate((np.ones_like(probs[..., :1]), reach[..., :-1]), axis=-1)
+        return reach * (1.0 - probs)
+
+    def run(self, stats: Dict[str, int]) -> SimulationResult:
+        probs = self._stage_survival_probs(stats)
+        death_probs = self._exact_death_probs(probs)
+        exact_survival = float(np.prod(probs))
+        if self.mode == "exact":
+            return self._run_exact(death_probs, exact_survival)
+
+        seq = np.random.SeedSequence(self.seed)
+        deaths = np.zeros(len(STAGES), dtype=np.int64)
+        total = survivors = 0
+        # antithetic 짝 평균의 합/제곱합 (분산 추정용)
+        pair_n, pair_sum, pair_sq = 0, 0.0, 0.0
+        chunk = self.chunk_size if self.mode == "sample" else min(self.chunk_size, ADAPTIVE_FIRST_CHUNK)
+        while total < self.iterations:
+            n = min(chunk, self.iterations - total)
+            rng = np.random.default_rng(seq.spawn(1)[0])
+            # 행 = 1회 롤아웃, 열 = 스테이지. 난수가 생존확률보다 크면 그 단계에서 사망
+            died = self._uniforms(rng, n) > probs
+            dead = died.any(axis=1)
+            deaths += np.bincount(died.argmax(axis=1)[dead], minlength=len(STAGES))
+            survivors += n - int(dead.sum())
+            total += n
+            if self.variance_reduction == "antithetic":
+                half_n = (n + 1) // 2
+                alive = ~dead
+                m = (alive[: n // 2].astype(float) + alive[half_n : half_n + n // 2]) / 2.0
+                pair_n, pair_sum, pair_sq = pair_n + len(m), pair_sum + m.sum(), pair_sq + (m * m).sum()
+            half = self._survival_half_width(total, survivors, pair_n, pair_sum, pair_sq)
+            if self.mode == "adaptive" and self._settled(deaths[None, :], np.array([total]), np.array([half]))[0]:
+                break
+            chunk = min(chunk * 2, self.chunk_size)
+
+        return self._sampled_result(deaths, total, half, death_probs, seq.entropy)
+
+    def _uniforms(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """(n × stage) 균등난수. antithetic: 앞 절반 U, 뒤 절반 1-U / stratified: 열마다 n등분 층에서 1개씩."""
+        width = len(STAGES)
+        if self.variance_reduction == "antithetic":
+            u = rng.random(((n + 1) // 2, width))
+            return np.concatenate((u, 1.0 - u))[:n]
+        if self.variance_reduction == "stratified":
+            strata = rng.permuted(np.tile(np.arange(n), (width, 1)), axis=1).T
+            return (strata + rng.random((n, width))) / n
+        return rng.random((n, width))
+
+    @staticmethod
+    def _survival_half_width(total: Any, survivors: Any, pair_n: int = 0, pair_sum: float = 0.0, pair_sq: float = 0.0) -> Any:
+        """
+        생존확률(%) 95% CI 반폭.
+        - antithetic: 짝 평균들의 표본분산 (음의 상관만큼 좁아짐)
+        - 그 외: Agresti-Coull 보정 이항분산. 생존 지표는 각 난수에 단조라 층화 표본에서도 보수적인 값
+        """
+        if pair_n > 1 and 0 < survivors < total:
+            var = max(0.0, (pair_sq - pair_sum**2 / pair_n) / (pair_n - 1)) / pair_n
+        else:
+            p = (np.asarray(survivors) + 2.0) / (np.asarray(total) + 4.0)
+            var = p * (1.0 - p) / np.asarray(total)
+        return CI_Z * np.sqrt(var) * 100.0
+
+    def _settled(self, deaths: np.ndarray, totals: np.ndarray, half: np.ndarray) -> np.ndarray:
+        """
+        (아이디어별) adaptive 멈춤 여부: 생존 CI 반폭 <= ci_tolerance, <= 추정 생존확률 × ci_rel_tolerance 이고
+        1·2위 사망 단계 차이가 CI상 0이 아니거나(순위 확정), 차이의 CI 반폭 자체가 margin_tolerance 이하(사실상 동률).
+        """
+        survival = (totals - deaths.sum(axis=1)) / totals * 100.0
+        top = np.sort(deaths, axis=1)[:, -2:] / totals[:, None]
+        p2, p1 = top[:, 0], top[:, 1]
+        # 다항분포에서 p1 - p2의 표준오차
+        margin_half = CI_Z * np.sqrt(np.maximum(p1 + p2 - (p1 - p2) ** 2, 0.0) / totals)
+        clear = (p1 - p2 > margin_half) | (margin_half * 100.0 <= self.margin_tolerance)
+        return (half <= self.ci_tolerance) & (half <= self.ci_rel_tolerance * survival) & clear
+
+    def run_many(self, stats_list: List[Dict[str, int]]) -> List[SimulationResult]:
+        """
+        여러 아이디어를 (아이디어 × stage) 행렬로 한 번에 계산. 결과 순서는 입력 순서.
+        sample/adaptive 모드는 stage마다 남은 인원에서 이항분포로 사망 수를 뽑음
+        (롤아웃을 하나씩 굴리는 것과 같은 분포이고, 비용은 iterations가 아니라 아이디어 수에 비례).
+        adaptive는 아직 안 멈춘 아이디어만 묶음을 더 뽑음. 이항 추출이라 variance_reduction은 쓰지 않음.
+        """
+        if not stats_list:
+            return []
+        probs = self._stage_survival_matrix(stats_list)
+        death_probs = self._exact_death_probs(probs)
+        exact_survival = probs.prod(axis=1)
+        if self.mode == "exact":
+            return [self._run_exact(dp, float(sv)) for dp, sv in zip(death_probs, exact_survival)]
+
+        seq = np.random.SeedSequence(self.seed)
+        rng = np.random.default_rng(seq)
+        totals = np.zeros(len(probs), dtype=np.int64)
+        deaths = np.zeros(probs.shape, dtype=np.int64)
+        active = np.ones(len(probs), dtype=bool)
+        chunk = self.iterations if self.mode == "sample" else min(self.chunk_size, ADAPTIVE_FIRST_CHUNK)
+        while active.any():
+            alive = np.where(active, np.minimum(chunk, self.iterations - totals), 0)
+            totals += alive
+            for i in range(len(STAGES)):
+                died = rng.binomial(alive, 1.0 - probs[:, i])
+                deaths[:, i] += died
+                alive -= died
+            half = self._survival_half_width(totals, totals - deaths.sum(axis=1))
+            active &= totals < self.iterations
+            if self.mode == "adaptive":
+                active &= ~self._settled(deaths, totals, half)
+            chunk = min(chunk * 2, self.chunk_size)
+        return [
+            self._sampled_result(d, int(n), float(h), dp, seq.entropy)
+            for d, n, h, dp in zip(deaths, totals, half, death_probs)
+        ]
+
+    def run_nested(
+        self,
+        stats: Dict[str, int],
+        outer: int = 1000,
+        inner: int = 10_000,
+        stat_samples: Optional[List[Dict[str, int]]] = None,
+        spread: float = STAT_UNCERTAINTY_SD,
+    ) -> UncertaintyResult:
+        """
+        2단 시뮬: (1) 스탯 벡터를 outer개 뽑고 (2) 각각 inner회 롤아웃.
+        - stat_samples(같은 입력으로 LLM을 여러 번 돌린 결과)가 2개 이상이면 stats와 합쳐 평균·공분산으로 다변량 정규,
+          아니면 stats 주변 독립 정규(표준편차 spread). 점수는 0~100으로 자름
+        - inner 롤아웃은 해석해 단계별 사망확률로 다항분포 1번 (outer × 6칸) → 롤아웃을 실제로 굴리지 않아도 분포가 같음
+        1e3 × 1e4 기준 수 ms.
+        """
+        seq = np.random.SeedSequence(self.seed)
+        rng = np.random.default_rng(seq)
+        center = np.array([float(stats.get(k, 0) or 0) for k in STAT_KEYS], dtype=float)
+        if stat_samples and len(stat_samples) >= 2:
+            pts = np.array([center] + [[float(x.get(k, 0) or 0) for k in STAT_KEYS] for x in stat_samples], dtype=float)
+            # 샘플 몇 개로 만든 공분산은 특이행렬이 되기 쉬워서 대각에 최소 분산을 더함
+            cov = np.cov(pts, rowvar=False) + np.eye(len(STAT_KEYS)) * (spread / 2.0) ** 2
+            draws = rng.multivariate_normal(pts.mean(axis=0), cov, size=outer, method="cholesky")
+            source = "llm_samples"
+        else:
+            draws = center + rng.normal(0.0, spread, size=(outer, len(STAT_KEYS)))
+            source = "normal"
+        probs = np.clip(np.clip(draws, 0.0, 100.0) @ self._stage_coef(), 0.0, 1.0)
+        # 칸 = 단계별 사망 5개 + 생존 1개
+        cells = np.concatenate((self._exact_death_probs(probs), probs.prod(axis=1, keepdims=True)), axis=1)
+        cells = np.clip(cells, 0.0, None)
+        cells /= cells.sum(axis=1, keepdims=True)
+        counts = rng.multinomial(inner, cells)
+        survival = counts[:, -1] / inner * 100.0
+        bottleneck = np.bincount(counts[:, :-1].argmax(axis=1), minlength=len(STAGES)) / outer
+        return UncertaintyResult(
+            outer=outer,
+            inner=inner,
+            survival_percentiles={q: float(v) for q, v in zip(SURVIVAL_PERCENTILES, np.percentile(survival, SURVIVAL_PERCENTILES))},
+            survival_mean=float(survival.mean()),
+            bottleneck_frequency={s: float(f) for s, f in zip(STAGES, bottleneck)},
+            source=source,
+            seed=seq.entropy,
+        )
+
+    def evaluate_scenarios(self, stats: Dict[str, int], deltas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (시나리오 × stat) 점수 변화 행렬 → (시나리오별 생존확률, 시나리오 × stage 사망확률).
+        점수는 0~100으로 자름. 행렬곱 1번 + 누적곱이라 시나리오 수천 개도 밀리초 단위.
+        """
+        base = np.array([float(stats.get(k, 0) or 0) for k in STAT_KEYS], dtype=float)
+        x = np.clip(base + np.atleast_2d(deltas), 0.0, 100.0)
+        probs = np.clip(x @ self._stage_coef(), 0.0, 1.0)
+        return probs.prod(axis=1), self._exact_death_probs(probs)
+
+    def sensitivity(self, stats: Dict[str, int], steps: Iterable[int] = SENSITIVITY_STEPS) -> SensitivityResult:
+        """
+        "어느 스탯부터 고쳐야 하나": step마다 스탯별 ±step, 두 스탯 동시 ±step 격자를 행렬 하나로 한 번에 계산.
+        샘플링 노이즈가 ±step 효과보다 클 수 있어서 mode와 상관없이 해석해로 계산.
+        """
+        steps = sorted({int(x) for x in steps})
+        if not steps or steps[0] <= 0:
+            raise ValueError(f"Sensitivity steps must be positive: {steps}")
+        n = len(STAT_KEYS)
+        pairs = list(combinations(range(n), 2))
+        pair_rows = np.zeros((len(pairs), n))
+        for row, (a, b) in enumerate(pairs):
+            pair_rows[row, [a, b]] = 1.0
+        # step마다 블록: [스탯별 -step, 스탯별 +step, 두 스탯 -step, 두 스탯 +step], 맨 앞에 기준 1행
+        unit = np.vstack([-np.eye(n), np.eye(n), -pair_rows, pair_rows])
+        deltas = np.vstack([np.zeros((1, n))] + [step * unit for step in steps])
+        survival, death_probs = self.evaluate_scenarios(stats, deltas)
+        gain = ((survival[1:] - survival[0]) * 100.0).reshape(len(steps), len(unit))
+        stage_delta = ((death_probs[1:] - death_probs[0]) * 100.0).reshape(len(steps), len(unit), len(STAGES))
+        p = len(pairs)
+        single, stage_effects, pairwise = {}, {}, {}
+        for j, step in enumerate(steps):
+            g = gain[j]
+            single[step] = {k: (float(g[i]), float(g[n + i])) for i, k in enumerate(STAT_KEYS)}
+            stage_effects[step] = {
+                k: {s: float(v) for s, v in zip(STAGES, stage_delta[j, n + i])} for i, k in enumerate(STAT_KEYS)
+            }
+            pairwise[step] = {
+                f"{STAT_KEYS[a]}+{STAT_KEYS[b]}": (float(g[2 * n + r]), float(g[2 * n + p + r]))
+                for r, (a, b) in enumerate(pairs)
+            }
+        return SensitivityResult(
+            steps=steps,
+            base_survival=float(survival[0] * 100.0),
+            single=single,
+            stage_effects=stage_effects,
+            pairwise=pairwise,
+            scenarios=len(deltas),
+        )
+
+    def _sampled_result(
+        self, deaths: np.ndarray, samples: int, half: float, death_probs: np.ndarray, seed: Optional[int]
+    ) -> SimulationResult:
+        death_counts = {s: int(c) for s, c in zip(STAGES, deaths)}
+        bottleneck = max(death_counts, key=death_counts.get)
+        survival = (samples - int(deaths.sum())) / samples * 100.0
+        return SimulationResult(
+            survival_rate=survival,
+            death_counts=death_counts,
+            bottleneck_stage=bottleneck,
+            death_probs={s: float(q) for s, q in zip(STAGES, death_probs)},
+            survival_ci=(max(0.0, survival - float(half)), min(100.0, survival + float(half))),
+            mode=self.mode,
+            samples=samples,
+            seed=seed,
+        )
+
+    def _run_exact(self, death_probs: np.ndarray, survival: float) -> SimulationResult:
+        # death_counts는 iterations회 돌렸을 때의 기대값 (차트/기존 호출부 호환용)
+        death_counts = {s: int(round(q * self.iterations)) for s, q in zip(STAGES, death_probs)}
+        rate = survival * 100.0
+        return SimulationResult(
+            survival_rate=rate,
+            death_counts=death_counts,
+            bottleneck_stage=STAGES[int(np.argmax(death_probs))],
+            death_probs={s: float(q) for s, q in zip(STAGES, death_probs)},
+            survival_ci=(rate, rate),
+            mode="exact",
+        )
+
+
+# =========================
+# 5-1) LLM 응답 캐시
+# =========================
+# 같은 프롬프트/모델/temperature면 Gemini를 다시 부르지 않음 (LLM_CACHE=off 로 전역 해제)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "on").strip().lower() not in ("off", "0", "false")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(60 * 60 * 6)))
+
+
+def llm_cache_key(namespace: str, prompt: str, model: str, temperature: float, api_key: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    # 키 해시 포함: 다른 키로 받아 둔 응답을 잘못된 키에 내주지 않음
+    raw = json.dumps(["llm", namespace, prompt_hash, model, temperature, api_key_hash(api_key)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _llm_cache(use_cache: bool) -> Optional[CacheBackend]:
+    return get_search_cache() if use_cache and LLM_CACHE_ENABLED else None
+
+
+def cached_llm_call(
+    namespace: str,
+    prompt: str,
+    model: str,
+    temperature: float,
+    compute: Callable[[], Any],
+    use_cache: bool = True,
+    ttl: float = LLM_CACHE_TTL,
+    api_key: str = "",
+) -> Any:
+    """
+    렌더링된 프롬프트 해시 + 해석된 모델명 + temperature + API 키 해시 기준으로 결과를 캐시.
+    compute()는 후처리(정수화 등)까지 끝난 JSON 직렬화 가능한 값을 돌려줘야 함.
+    예외는 캐시하지 않음. 동시에 들어온 같은 호출은 (같은 api_key끼리) single-flight로 합침.
+    """
+    cache = _llm_cache(use_cache)
+    key = llm_cache_key(namespace, prompt, model, temperature, api_key)
+    with span(f"llm.{namespace}", llm__model=model, llm__temperature=temperature) as s:
+        s.set(payload__request_bytes=len(prompt.encode("utf-8")))
+        if cache is not None:
+            cached = cache.get(key)
+            s.set(cache__result="hit" if cached is not None else "miss")
+            if cached is not None:
+                return cached
+
+        def run() -> Any:
+            value = compute()
+            if cache is not None:
+                cache.set(key, value, ttl)
+            return value
+
+        # ✅ 같은 프롬프트가 동시에 들어오면 Gemini 호출 1번으로 합침
+        return get_single_flight().do(f"llm.{namespace}", key, run, api_key)
+
+
+# =========================
+# 5-2) 월별 런웨이/현금 시뮬레이션
+# =========================
+@dataclass
+class RunwayResult:
+    paths: int
+    months: int
+    # 기간 끝까지 살아남았거나 Unicorn까지 통과한 비율 (%)
+    survival_rate: float
+    death_counts: Dict[str, int]
+    # {"stage": 단계 탈락, "runway": 현금 소진}
+    death_causes: Dict[str, int]
+    # 죽은 경로의 사망 시점(개월) 백분위
+    time_to_death: Dict[int, float]
+    # 월별 생존 비율 (길이 months + 1, 0개월 = 1.0)
+    survival_curve: List[float]
+    # Unicorn 단계까지 통과한 경로 수
+    graduated: int
+    seed: Optional[int] = None
+
+
+class RunwaySimulator:
+    """
+    경로(회사) × 월 단위로 현금/번레이트/매출/단계를 굴리는 시뮬. 돈 단위는 '초기 월 번레이트 = 1'.
+    - 단계 전환: 매달 경쟁 위험 — 통과 h·p, 탈락 h·(1-p) (h = 1/단계 평균 개월, p = StartupMCTS의 단계 생존확률)
+      → 현금이 무한하면 단계별 통과 확률이 StartupMCTS 퍼널과 같음
+    - 매출: MVP부터 시작해 매달 로그정규 성장 (marketing, consumer_needs가 높을수록 빠름)
+    - 단계를 올라갈 때: 확률적으로 투자 유치(그때 번레이트 × raise_months), 채용으로 번레이트 증가(team이 높을수록 덜 늘어남)
+    - 현금 < 0 이면 사망(runway). 경로 축은 전부 벡터 연산, 월 축만 루프 (1e5 경로 × 120개월 ≈ 0.1~0.2초)
+    """
+
+    def __init__(self, paths: int = 100_000, months: int = 120, initial_runway: float = 12.0, seed: Optional[int] = None) -> None:
+        self.paths = paths
+        self.months = months
+        # 시작 현금 = 초기 번레이트 몇 달치
+        self.initial_runway = initial_runway
+        self.seed = seed
+        self.stage_months = {"Seed": 9, "MVP": 12, "PMF": 18, "Scale-up": 24, "Unicorn": 36}
+        # 투자 유치 시 들어오는 현금 = 그 시점 번레이트 × raise_months
+        self.raise_months = 18.0
+        self.revenue_volatility = 0.08
+
+    def run(self, stats: Dict[str, int]) -> RunwayResult:
+        x = {k: _clamp_0_100(stats.get(k, 0)) / 100.0 for k in STAT_KEYS}
+        p = StartupMCTS()._stage_survival_probs(stats)
+        h = 1.0 / np.array([self.stage_months[s] for s in STAGES], dtype=float)
+        advance, fail = h * p, h * (1.0 - p)
+        growth = 0.01 + 0.08 * (x["marketing"] + x["consumer_needs"]) / 2.0 - 0.5 * self.revenue_volatility**2
+        burn_step = 1.8 - 0.6 * x["team"]
+        raise_prob = 0.3 + 0.6 * x["strategy"]
+        first_revenue = 0.02 + 0.08 * x["product"]
+
+        seq = np.random.SeedSequence(self.seed)
+        rng = np.random.default_rng(seq)
+        n, last = self.paths, len(STAGES)
+        # 아직 굴리는 경로만 압축해서 들고 감 (죽거나 졸업하면 빠짐 → 뒤로 갈수록 월 루프가 가벼워짐)
+        ids = np.arange(n)
+        stage = np.zeros(n, dtype=np.int64)
+        cash = np.full(n, self.initial_runway)
+        burn = np.ones(n)
+        revenue = np.zeros(n)
+        death_month = np.zeros(n, dtype=np.int64)
+        death_stage = np.full(n, -1, dtype=np.int64)
+        causes = {"stage": 0, "runway": 0}
+        graduated = 0
+        curve = np.ones(self.months + 1)
+
+        for month in range(1, self.months + 1):
+            if not len(ids):
+                curve[month:] = graduated / n
+                break
+            u = rng.random(len(ids))
+            failed = u < fail[stage]
+            advanced = ~failed & (u < fail[stage] + advance[stage])
+
+            selling = stage > 0
+            revenue[selling] *= np.exp(growth + self.revenue_volatility * rng.standard_normal(int(selling.sum())))
+            cash += revenue - burn
+
+            revenue[advanced & ~selling] = first_revenue
+            raised = advanced & (rng.random(len(ids)) < raise_prob)
+            cash[raised] += self.raise_months * burn[raised]
+            burn[advanced] *= burn_step
+            death_stage[ids[failed]] = stage[failed]
+            stage[advanced] += 1
+
+            broke = ~failed & (cash < 0) & (stage < last)
+            death_stage[ids[broke]] = stage[broke]
+            dead = failed | broke
+            death_month[ids[dead]] = month
+            causes["stage"] += int(failed.sum())
+            causes["runway"] += int(broke.sum())
+            # Unicorn까지 통과한 경로는 졸업 — 더 굴리지 않고 생존으로 셈
+            done = ~dead & (stage >= last)
+            graduated += int(done.sum())
+            keep = ~(dead | done)
+            ids, stage, cash, burn, revenue = ids[keep], stage[keep], cash[keep], burn[keep], revenue[keep]
+            curve[month] = (len(ids) + graduated) / n
+
+        died = death_stage >= 0
+        ttd = death_month[died]
+        return RunwayResult(
+            paths=n,
+            months=self.months,
+            survival_rate=float(curve[-1] * 100.0),
+            death_counts={s: int(c) for s, c in zip(STAGES, np.bincount(death_stage[died], minlength=last))},
+            death_causes=causes,
+            time_to_death=(
+                {q: float(v) for q, v in zip(SURVIVAL_PERCENTILES, np.percentile(ttd, SURVIVAL_PERCENTILES))}
+                if len(ttd)
+                else {}
+            ),
+            survival_curve=[round(float(v), 5) for v in curve],
+            graduated=graduated,
+            seed=seq.entropy,
+        )
+
+
+# =========================
+# 5-3) 시뮬 프로세스 풀 (무거운 시뮬이 다른 세션의 GIL을 뺏지 않게)
+# =========================
+def stats_matrix(rows: List[Dict[str, int]]) -> np.ndarray:
+    """스탯 dict 목록 → (행 × STAT_KEYS) int16 행렬 (워커로 보내는 형식)."""
+    return np.array([[_clamp_0_100(r.get(k, 0)) for k in STAT_KEYS] for r in rows], dtype=np.int16)
+
+
+@st.cache_resource(show_spinner=False)
+def get_sim_executor() -> sim_pool.SimulationExecutor:
+    # ✅ 프로세스 전체에서 풀 하나. 워커 수/대기열은 SIM_POOL_WORKERS / SIM_POOL_QUEUE
+    # main()에서 화면을 그릴 때 바로 불러서 데우기 시작 (데워지기 전 작업은 이 프로세스에서 실행)
+    # 모듈은 작업마다 다시 찾음: 캐시된 풀이 첫 실행의 모듈(옛 클래스)을 붙잡고 있지 않게
+    executor = sim_pool.SimulationExecutor(lambda: sys.modules[__name__])
+    executor.warm()
+    return executor
+
+
+# =========================
+# 6) LangChain 체인 (스탯+부검+좌담)
+# =========================
+def _clean_stats(out: Dict[str, Any]) -> Dict[str, int]:
+    out.setdefault("consumer_needs", 0)
+
+    # ✅ 방어적으로 정수화
+    clean = {
+        "product": _clamp_0_100(out.get("product", 0)),
+        "team": _clamp_0_100(out.get("team", 0)),
+        "strategy": _clamp_0_100(out.get("strategy", 0)),
+        "marketing": _clamp_0_100(out.get("marketing", 0)),
+        "consumer_needs": _clamp_0_100(out.get("consumer_needs", 0)),
+    }
+    return clean
+
+
+def _stats_prompt(parser: JsonOutputParser) -> PromptTemplate:
+    return PromptTemplate(
+        template=(
+            "너는 냉소적인 스타트업 검증관이다.\n"
+            "입력 정보와 시장 데이터를 보고 5대 스탯을 0~100 정수로 계산해라.\n"
+            "consumer_needs는 '요즘 소비자의 결핍'과 '이 아이템의 해결 일치율'이다.\n"
+            "반드시 한국어로 사고하되, 출력은 JSON 스키마만 따른다.\n"
+            "{format_instructions}\n"
+            "JSON 필드: product, team, strategy, marketing, consumer_needs\n"
+            "판매자: {seller_info}\n"
+            "타겟: {buyer_info}\n"
+            "아이템: {product_info}\n"
+            "시장 데이터:\n{market_data}\n"
+        ),
+        input_variables=["seller_info", "buyer_info", "product_info", "market_data"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+
+def analyze_stats_chain(
+    api_key: str,
+    model_name: str,
+    seller_info: str,
+    buyer_info: str,
+    product_info: str,
+    market_data: str,
+    use_cache: bool = True,
+) -> Dict[str, int]:
+    parser = JsonOutputParser()
+    model = resolve_gemini_model(model_name, api_key)
+    rendered = _stats_prompt(parser).format(
+        seller_info=seller_info,
+        buyer_info=buyer_info,
+        product_info=product_info,
+        market_data=market_data,
+    )
+
+    def compute() -> Dict[str, int]:
+        chain = get_chat_model(api_key, model, 0.2) | parser
+        out = rate_gate("gemini", api_key).call(chain.invoke, rendered, config=traced_llm_config())
+        return _clean_stats(out)
+
+    return cached_llm_call("stats", rendered, model, 0.2, compute, use_cache=use_cache, api_key=api_key)
+
+
+def sample_stats_chain(
+    api_key: str,
+    model_name: str,
+    seller_info: str,
+    buyer_info: str,
+    product_info: str,
+    market_data: str,
+    k: int,
+    temperature: float = 0.7,
+    use_cache: bool = True,
+) -> List[Dict[str, int]]:
+    """
+    스탯 점수를 temperature를 올려 k번 따로 뽑음 (불확실성 추정용, 동시에 호출).
+    샘플 번호를 캐시/single-flight 키에 넣어서 k개가 서로 다른 응답으로 남음. 실패한 샘플은 빼고 돌려줌.
+    """
+    parser = JsonOutputParser()
+    model = resolve_gemini_model(model_name, api_key)
+    rendered = _stats_prompt(parser).format(
+        seller_info=seller_info,
+        buyer_info=buyer_info,
+        product_info=product_info,
+        market_data=market_data,
+    )
+
+    def one(i: int) -> Dict[str, int]:
+        def compute() -> Dict[str, int]:
+            chain = get_chat_model(api_key, model, temperature) | parser
+            out = rate_gate("gemini", api_key).call(chain.invoke, rendered, config=traced_llm_config())
+            return _clean_stats(out)
+
+        return cached_llm_call(
+            f"stats_sample{i}", rendered, model, temperature, compute, use_cache=use_cache, api_key=api_key
+        )
+
+    pool = ThreadPoolExecutor(max_workers=max(1, k))
+    try:
+        futures = [submit_in_context(pool, one, i) for i in range(k)]
+        samples = []
+        for fut in futures:
+            try:
+                samples.append(fut.result())
+            except Exception as exc:
+                note_degraded("stat_samples", exc)
+        return samples
+    finally:
+        pool.shutdown(wait=False)
+
+
+def _autopsy_prompt(parser: JsonOutputParser) -> PromptTemplate:
+    return PromptTemplate(
+        template=(
+            "너는 냉소적이고 현실적인 디스토피아 VC다.\n"
+            "시뮬레이션 결과와 시장 데이터를 바탕으로 아래를 작성하라.\n"
+            "반드시 한국어로 작성하고 JSON만 출력한다.\n"
+            "{format_instructions}\n"
+            "JSON 필드: death_cause, autopsy_report, action_plan, needs_analysis, youtube_queries\n"
+            "- needs_analysis: 요즘 소비자가 진짜 원하는 것 vs 이 아이템이 놓친 포인트(한 문장 팩폭)\n"
+            "- youtube_queries: 참고할 유튜브 검색어 3개(배열)\n"
+            "스탯: {stats}\n"
+            "가장 많이 죽은 단계: {bottleneck_stage}\n"
+            "시장 데이터:\n{market_data}\n"
+        ),
+        input_variables=["stats", "bottleneck_stage", "market_data"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+
+# 부검 결과 중 화면에 그대로 보여주는(번역 대상) 텍스트 필드
+AUTOPSY_TEXT_FIELDS = ["death_cause", "autopsy_report", "action_plan", "needs_analysis"]
+
+
+def _clean_autopsy(out: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(out)
+    # youtube_queries 방어
+    if "youtube_queries" not in out or not isinstance(out["youtube_queries"], list):
+        out["youtube_queries"] = []
+    out["youtube_queries"] = [str(x)[:80] for x in out["youtube_queries"] if str(x).strip()][:3]
+    return out
+
+
+def stream_autopsy_report(
+    api_key: str,
+    model_name: str,
+    stats: Dict[str, int],
+    bottleneck_stage: str,
+    market_data: str,
+    use_cache: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    부검 JSON을 토큰이 들어오는 대로 부분 파싱해서 dict로 계속 내보냄.
+    (death_cause가 action_plan 생성이 끝나기 전에 먼저 보임)
+    마지막으로 내보내는 값이 방어 처리까지 끝난 최종 결과.
+    """
+    parser = JsonOutputParser()
+    model = resolve_gemini_model(model_name, api_key)
+    rendered = _autopsy_prompt(parser).format(stats=stats, bottleneck_stage=bottleneck_stage, market_data=market_data)
+    cache = _llm_cache(use_cache)
+    key = llm_cache_key("autopsy", rendered, model, 0.35, api_key)
+    with span("llm.autopsy", llm__model=model, llm__temperature=0.35) as s:
+        s.set(payload__request_bytes=len(rendered.encode("utf-8")))
+        cached = cache.get(key) if cache else None
+        if cache:
+            s.set(cache__result="hit" if cached is not None else "miss")
+        if cached is not None:
+            yield cached
+            return
+
+        def produce() -> Iterator[Dict[str, Any]]:
+            out: Dict[str, Any] = {}
+            t0 = time.perf_counter()
+            chain = get_chat_model(api_key, model, 0.35) | parser
+            for partial in rate_gate("gemini", api_key).stream(lambda: chain.stream(rendered, config=traced_llm_config())):
+                if isinstance(partial, dict):
+                    if not out:
+                        s.set(llm__first_token_ms=round((time.perf_counter() - t0) * 1e3, 1))
+                    out = partial
+                    yield out
+            if not out:
+                raise ValueError("Autopsy report is not valid JSON")
+            out = _clean_autopsy(out)
+            s.set(payload__response_bytes=len(json.dumps(out, ensure_ascii=False).encode("utf-8")))
+            if cache:
+                cache.set(key, out, LLM_CACHE_TTL)
+            yield out
+
+        # 같은 부검이 동시에 요청되면 먼저 온 스트림을 같이 구독
+        yield from get_single_flight().stream("llm.autopsy", key, produce, api_key)
+
+
+def autopsy_report_chain(
+    api_key: str,
+    model_name: str,
+    stats: Dict[str, int],
+    bottleneck_stage: str,
+    market_data: str,
+    use_cache: bool = True,
+) -> Dict[str, str]:
+    out: Dict[str, Any] = {}
+    for out in stream_autopsy_report(api_key, model_name, stats, bottleneck_stage, market_data, use_cache=use_cache):
+        pass
+    return out
+
+
+def _panel_debate_prompt(stats: Dict[str, int], product_info: str) -> str:
+    return f"""
+아래 스타트업 스탯과 정보를 보고 3명의 전문가가 독설 좌담회를 열어라.
+1) 마포구 VC (냉소적, 수치/리스크 집착)
+2) 테헤란로 창업가 (현실적, 피곤함이 기본값)
+3) 까칠한 얼리어답터 (사용자 입장, 가성비/귀찮음 혐오)
+
+아이템: {product_info}
+스탯: {stats}
+
+규칙:
+- 반드시 한국어 대화체
+- 각 캐릭터 말투 구분 확실히
+- 마지막에 "결론: 한 줄"로 종합 판정
+""".strip()
+
+
+def _chunk_text(content: object) -> str:
+    # Gemini 청크는 문자열 또는 [{"type": "text", "text": ...}] 형태
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(x if isinstance(x, str) else str(x.get("text", "")) for x in content if isinstance(x, (str, dict)))
+    return ""
+
+
+def stream_panel_debate(
+    api_key: str,
+    model_name: str,
+    stats: Dict[str, int],
+    product_info: str,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """좌담회 텍스트를 토큰(청크) 단위로 내보냄. st.write_stream에 바로 넘길 수 있음."""
+    prompt = _panel_debate_prompt(stats, product_info)
+    model = resolve_gemini_model(model_name, api_key)
+    cache = _llm_cache(use_cache)
+    key = llm_cache_key("debate", prompt, model, 0.45, api_key)
+    with span("llm.debate", llm__model=model, llm__temperature=0.45) as s:
+        s.set(payload__request_bytes=len(prompt.encode("utf-8")))
+        cached = cache.get(key) if cache else None
+        if cache:
+            s.set(cache__result="hit" if cached is not None else "miss")
+        if cached is not None:
+            yield cached
+            return
+
+        def produce() -> Iterator[str]:
+            chunks: List[str] = []
+            t0 = time.perf_counter()
+            chat = get_chat_model(api_key, model, 0.45)
+            for chunk in rate_gate("gemini", api_key).stream(lambda: chat.stream(prompt, config=traced_llm_config())):
+                text = _chunk_text(chunk.content)
+                if text:
+                    if not chunks:
+                        s.set(llm__first_token_ms=round((time.perf_counter() - t0) * 1e3, 1))
+                    chunks.append(text)
+                    yield text
+            s.set(payload__response_bytes=len("".join(chunks).encode("utf-8")))
+            if cache:
+                cache.set(key, "".join(chunks), LLM_CACHE_TTL)
+
+        yield from get_single_flight().stream("llm.debate", key, produce, api_key)
+
+
+def run_panel_debate(
+    api_key: str,
+    model_name: str,
+    stats: Dict[str, int],
+    product_info: str,
+    use_cache: bool = True,
+) -> str:
+    return "".join(stream_panel_debate(api_key, model_name, stats, product_info, use_cache=use_cache))
+
+
+def analyze_all_chain(
+    api_key: str,
+    model_name: str,
+    seller_info: str,
+    buyer_info: str,
+    product_info: str,
+    market_data: str,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    단일 호출 모드: 스탯 + 부검 + 유튜브 검색어 + 좌담회를 JSON 하나로 받음.
+    3번 왕복하며 같은 맥락(스탯/아이템/시장 데이터)을 다시 보내던 걸 1번으로 줄임.
+    병목 단계는 시뮬레이션 전이라 모르므로 모델이 스탯으로 추정하게 하고,
+    실제 시뮬레이션은 돌려받은 스탯으로 나중에 계산.
+    반환: {"stats": {...}, "autopsy": {...}, "debate": "..."}
+    """
+    parser = JsonOutputParser()
+    prompt = PromptTemplate(
+        template=(
+            "너는 냉소적인 스타트업 검증관이자 디스토피아 VC다.\n"
+            "입력 정보와 시장 데이터를 보고 아래를 한 번에 작성하라.\n"
+            "반드시 한국어로 작성하고 JSON만 출력한다.\n"
+            "{format_instructions}\n"
+            "JSON 필드: product, team, strategy, marketing, consumer_needs, "
+            "death_cause, autopsy_report, action_plan, needs_analysis, youtube_queries, debate\n"
+            "- product, team, strategy, marketing, consumer_needs: 0~100 정수\n"
+            "- consumer_needs는 '요즘 소비자의 결핍'과 '이 아이템의 해결 일치율'이다.\n"
+            "- 단계는 Seed → MVP → PMF → Scale-up → Unicorn. 초기엔 team/consumer_needs, "
+            "후기엔 strategy/marketing 비중이 크다. 가장 많이 죽을 단계를 스탯으로 추정해 부검에 반영하라.\n"
+            "- needs_analysis: 요즘 소비자가 진짜 원하는 것 vs 이 아이템이 놓친 포인트(한 문장 팩폭)\n"
+            "- youtube_queries: 참고할 유튜브 검색어 3개(배열)\n"
+            "- debate: 마포구 VC(냉소적, 수치/리스크 집착), 테헤란로 창업가(현실적, 피곤함이 기본값), "
+            "까칠한 얼리어답터(가성비/귀찮음 혐오)의 독설 좌담회. 한국어 대화체, 말투 구분 확실히, "
+            "마지막에 \"결론: 한 줄\"로 종합 판정\n"
+            "판매자: {seller_info}\n"
+            "타겟: {buyer_info}\n"
+            "아이템: {product_info}\n"
+            "시장 데이터:\n{market_data}\n"
+        ),
+        input_variables=["seller_info", "buyer_info", "product_info", "market_data"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+    model = resolve_gemini_model(model_name, api_key)
+    rendered = prompt.format(
+        seller_info=seller_info,
+        buyer_info=buyer_info,
+        product_info=product_info,
+        market_data=market_data,
+    )
+
+    def compute() -> Dict[str, Any]:
+        chain = get_chat_model(api_key, model, 0.35) | parser
+        out = rate_gate("gemini", api_key).call(chain.invoke, rendered, config=traced_llm_config())
+        autopsy_keys = ["death_cause", "autopsy_report", "action_plan", "needs_analysis", "youtube_queries"]
+        return {
+            "stats": _clean_stats(out),
+            "autopsy": _clean_autopsy({k: out[k] for k in autopsy_keys if k in out}),
+            "debate": str(out.get("debate", "") or ""),
+        }
+
+    return cached_llm_call("single_pass", rendered, model, 0.35, compute, use_cache=use_cache, api_key=api_key)
+
+
+# =========================
+# 6-1) 파이프라인 실행기 (의존성 기반 병렬)
+# =========================
+@dataclass
+class PipelineStage:
+    name: str
+    # 의존 단계 결과({이름: 결과})를 받아 이 단계 결과를 반환
+    fn: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    spinner: str = ""
+
+
+class PipelineError(Exception):
+    """어떤 단계에서 예외가 났는지 함께 전달."""
+
+    def __init__(self, stage: str, error: BaseException) -> None:
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+def _attach_script_ctx(ctx: object) -> None:
+    # 워커 스레드에서도 st.cache_data 등이 현재 세션 컨텍스트를 보도록 연결
+    if ctx is not None and add_script_run_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+
+class StreamRelay:
+    """워커 스레드가 밀어 넣은 최신 스트리밍 값을 스크립트(메인) 스레드가 꺼내 가는 자리."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._version = 0
+        self._seen = 0
+
+    def push(self, value: Any) -> None:
+        with self._lock:
+            self._value = value
+            self._version += 1
+
+    def poll(self) -> Tuple[bool, Any]:
+        """(마지막 poll 이후 바뀌었는지, 최신 값)"""
+        with self._lock:
+            changed = self._version != self._seen
+            self._seen = self._version
+            return changed, self._value
+
+
+def relay_stream(items: Iterable[Any], relay: Optional[StreamRelay], join_text: bool = False) -> Any:
+    """
+    스트림을 끝까지 소비하면서 relay에 최신 값을 밀어 넣고 최종 값을 반환.
+    join_text=True면 텍스트 청크를 이어 붙인 누적 문자열을 밀어 넣음.
+    """
+    last: Any = "" if join_text else None
+    for item in items:
+        last = last + item if join_text else item
+        if relay is not None:
+            relay.push(last)
+    return last
+
+
+def _run_stage(stage: PipelineStage, deps: Dict[str, Any]) -> Any:
+    with span(f"stage.{stage.name}", stage__deps=",".join(stage.deps)):
+        return stage.fn(deps)
+
+
+def run_pipeline(
+    stages: List[PipelineStage],
+    max_workers: int = 4,
+    spinner_slots: Optional[Dict[str, Any]] = None,
+    on_done: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    on_tick: Optional[Callable[[], None]] = None,
+    tick_interval: float = 0.1,
+) -> Dict[str, Any]:
+    """
+    의존성이 충족된 단계부터 스레드풀에 올려 병렬 실행.
+    - 전체 소요시간 ≈ 임계 경로(critical path)
+    - spinner_slots: 단계별 st.container() 자리. 실행 중인 단계마다 스피너를 띄움
+    - on_done(단계명, 지금까지 결과) / on_tick(): 호출한 스레드에서 실행되므로 st.* 사용 가능
+    - 한 단계라도 실패하면 대기 중인 단계는 취소하고 PipelineError
+    - 단계마다 span("stage.<이름>")을 남기고, 워커 스레드에도 현재 trace 컨텍스트를 넘김
+    """
+    names = [s.name for s in stages]
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in names]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    ctx = get_script_run_ctx() if get_script_run_ctx is not None else None
+    pool = ThreadPoolExecutor(max_workers=max_workers, initializer=_attach_script_ctx, initargs=(ctx,))
+    slots = spinner_slots or {}
+    spinners: Dict[str, ExitStack] = {}
+    results: Dict[str, Any] = {}
+    pending = {s.name: s for s in stages}
+    running: Dict[Future, PipelineStage] = {}
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(d in results for d in stage.deps):
+                    del pending[name]
+                    if stage.spinner and name in slots:
+                        spinners[name] = ExitStack()
+                        spinners[name].enter_context(slots[name].spinner(stage.spinner))
+                    deps = {d: results[d] for d in stage.deps}
+                    running[submit_in_context(pool, _run_stage, stage, deps)] = stage
+            if not running:
+                raise ValueError(f"Pipeline has a dependency cycle: {sorted(pending)}")
+
+            done, _ = wait(running, timeout=tick_interval if on_tick else None, return_when=FIRST_COMPLETED)
+            if on_tick is not None:
+                on_tick()
+            for fut in done:
+                stage = running.pop(fut)
+                if stage.name in spinners:
+                    spinners.pop(stage.name).close()
+                try:
+                    results[stage.name] = fut.result()
+                except Exception as exc:
+                    raise PipelineError(stage.name, exc) from exc
+                if on_done is not None:
+                    on_done(stage.name, results)
+        return results
+    finally:
+        for stack in spinners.values():
+            stack.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# =========================
+# 6-2) 헤드리스 분석 API (Streamlit 없이 호출 가능)
+# =========================
+@dataclass
+class Product:
+    name: str
+    desc: str = ""
+    price: str = ""
+
+    @property
+    def info(self) -> str:
+        return f"{self.name}, {self.desc}, {self.price}"
+
+
+@dataclass
+class AnalysisRequest:
+    seller: str
+    buyer: str
+    product: Product
+    gemini_api_key: str
+    tavily_api_key: str
+    model_name: str = "gemini-1.5-flash"
+    # ko가 아니면 부검/좌담회를 이 언어로 번역하는 단계가 추가됨
+    language: str = "ko"
+    single_pass: bool = False
+    use_cache: bool = True
+    iterations: int = 1_000_000
+    # 스탯을 LLM으로 몇 번 더 뽑아 불확실성 분포에 쓸지 (0이면 점수 주변 정규분포, 호출 추가 없음)
+    stat_samples: int = 0
+    # 불확실성 시뮬 (스탯 벡터 추출 수 × 추출마다 롤아웃 수)
+    uncertainty_outer: int = 1000
+    uncertainty_inner: int = 10_000
+    # 월별 런웨이 시뮬 (경로 수 × 개월 수)
+    runway_paths: int = 100_000
+    runway_months: int = 120
+
+
+@dataclass
+class AnalysisHooks:
+    """
+    렌더러(Streamlit 등)가 진행 상황을 받아 가는 자리. 전부 선택.
+    - on_stage(단계명, 지금까지 결과) / on_tick(): analyze를 호출한 스레드에서 실행
+    - autopsy_relay / debate_relay: 부검(부분 dict) / 좌담회(누적 텍스트) 스트리밍 값
+    - spinner_labels / spinner_slots: 단계별 스피너 문구와 그릴 자리
+    """
+
+    on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    on_tick: Optional[Callable[[], None]] = None
+    autopsy_relay: Optional[StreamRelay] = None
+    debate_relay: Optional[StreamRelay] = None
+    spinner_labels: Dict[str, str] = field(default_factory=dict)
+    spinner_slots: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Report:
+    stats: Dict[str, int]
+    simulation: SimulationResult
+    autopsy: Dict[str, Any]
+    debate: str
+    # 부검 프롬프트에 들어간 시장 컨텍스트 (중복 제거 + 토큰 예산 적용 후)
+    market_data: str
+    cases: List[dict]
+    videos: List[str]
+    youtube_queries: List[str]
+    model: str
+    language: str = "ko"
+    # language != "ko"일 때 번역된 부검 필드 + "debate"
+    translation: Dict[str, str] = field(default_factory=dict)
+    sensitivity: Optional[SensitivityResult] = None
+    uncertainty: Optional[UncertaintyResult] = None
+    runway: Optional[RunwayResult] = None
+    # 실패해서 빈/기본 결과로 대신한 부분 [{"source": "cases", "error": "..."}]. 비어 있어야 정상 리포트
+    degraded: List[Dict[str, str]] = field(default_factory=list)
+    trace: Optional[Trace] = None
+
+    @property
+    def display_autopsy(self) -> Dict[str, Any]:
+        return {**self.autopsy, **{k: v for k, v in self.translation.items() if k != "debate"}}
+
+    @property
+    def display_debate(self) -> str:
+        return self.translation.get("debate", self.debate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 직렬화 가능한 dict (HTTP 응답/배치 출력용)."""
+        out = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "trace"}
+        out["simulation"] = asdict(self.simulation)
+        out["sensitivity"] = asdict(self.sensitivity) if self.sensitivity else None
+        out["uncertainty"] = asdict(self.uncertainty) if self.uncertainty else None
+        out["runway"] = asdict(self.runway) if self.runway else None
+        out["trace_id"] = self.trace.trace_id if self.trace else None
+        return out
+
+
+def youtube_queries_for(autopsy: Dict[str, Any], product_name: str) -> List[str]:
+    queries = autopsy.get("youtube_queries", []) or []
+    if not queries:
+        queries = [f"{product_name} 시장 분석", f"{product_name} 창업 실패 사례", "PMF 찾는 법"]
+    return queries
+
+
+def build_analysis_stages(request: AnalysisRequest, hooks: Optional[AnalysisHooks] = None) -> List[PipelineStage]:
+    """
+    분석 단계 그래프.
+    model ──────────────┐
+    market ─┬─ context ─ stats ─┬─ simulation ─ autopsy ─ videos
+    cases ──┘                   └─ debate
+    (context: 두 검색 결과를 중복 제거/관련도 순으로 한 번 정리하고, 체인마다 토큰 예산만큼 씀)
+    (single_pass면 stats/autopsy/debate 대신 single 한 단계, 번역은 autopsy/debate 뒤)
+    """
+    hooks = hooks or AnalysisHooks()
+    labels = hooks.spinner_labels
+    req, product = request, request.product
+    gemini_key, tavily_key = req.gemini_api_key, req.tavily_api_key
+
+    stages = [
+        # 0) 모델명 해석은 한 번만 (검색과 병렬로) 하고 체인들에는 결과를 넘김
+        PipelineStage("model", lambda r: resolve_gemini_model(req.model_name, gemini_key)),
+        # 1) 시장 트렌드 / 흑역사
+        PipelineStage(
+            "market",
+            lambda r: get_market_snippets(f"{product.name} 시장 트렌드 소비자 불만 니즈", tavily_key),
+            spinner=labels.get("market", ""),
+        ),
+        PipelineStage(
+            "cases",
+            lambda r: get_market_autopsy(product.name, product.desc, tavily_key, max_results=12),
+            spinner=labels.get("cases", ""),
+        ),
+        PipelineStage(
+            "context",
+            lambda r: build_market_context(f"{product.name} {product.desc}", [r["market"], r["cases"]]),
+            deps=("market", "cases"),
+        ),
+        # 2) 스탯
+        PipelineStage(
+            "stats",
+            lambda r: analyze_stats_chain(
+                gemini_key,
+                r["model"],
+                req.seller,
+                req.buyer,
+                product.info,
+                r["context"].render(MARKET_CONTEXT_BUDGETS["stats"]),
+                use_cache=req.use_cache,
+            ),
+            deps=("model", "context"),
+            spinner=labels.get("stats", ""),
+        ),
+        # 3) 시뮬
+        PipelineStage(
+            "simulation",
+            lambda r: StartupMCTS(iterations=req.iterations, mode="exact").run(r["stats"]),
+            deps=("stats",),
+            spinner=labels.get("simulation", ""),
+        ),
+        # 3-1) what-if: 스탯별 ±N점이면 생존확률이 얼마나 바뀌나 (LLM 호출 없음)
+        PipelineStage(
+            "sensitivity",
+            lambda r: StartupMCTS(mode="exact").sensitivity(r["stats"]),
+            deps=("stats",),
+        ),
+        # 3-2) 스탯 점수 불확실성 → 생존확률 분포 / 병목 단계 빈도
+        PipelineStage(
+            "uncertainty",
+            lambda r: get_sim_executor().run(
+                "nested",
+                stats_matrix([r["stats"], *(r.get("stat_samples") or [])]),
+                outer=req.uncertainty_outer,
+                inner=req.uncertainty_inner,
+            ),
+            deps=("stats", "stat_samples") if req.stat_samples > 0 else ("stats",),
+        ),
+        # 3-3) 월별 현금/번레이트/투자 → 언제, 왜(단계 탈락 vs 현금 소진) 죽나
+        PipelineStage(
+            "runway",
+            lambda r: get_sim_executor().run(
+                "runway", stats_matrix([r["stats"]]), paths=req.runway_paths, months=req.runway_months
+            ),
+            deps=("stats",),
+        ),
+        # 4) 부검 리포트 + 니즈분석 + 유튜브 검색어 3개
+        PipelineStage(
+            "autopsy",
+            lambda r: relay_stream(
+                stream_autopsy_report(
+                    gemini_key,
+                    r["model"],
+                    r["stats"],
+                    r["simulation"].bottleneck_stage,
+                    r["context"].render(MARKET_CONTEXT_BUDGETS["autopsy"]),
+                    use_cache=req.use_cache,
+                ),
+                hooks.autopsy_relay,
+            ),
+            deps=("model", "stats", "simulation", "context"),
+            spinner=labels.get("autopsy", ""),
+        ),
+        # 5) 좌담회 (스탯만 있으면 됨)
+        PipelineStage(
+            "debate",
+            lambda r: relay_stream(
+                stream_panel_debate(gemini_key, r["model"], r["stats"], product.info, use_cache=req.use_cache),
+                hooks.debate_relay,
+                join_text=True,
+            ),
+            deps=("model", "stats"),
+            spinner=labels.get("debate", ""),
+        ),
+        # 6) 유튜브 2~3개
+        PipelineStage(
+            "videos",
+            lambda r: get_youtube_videos(youtube_queries_for(r["autopsy"], product.name), tavily_key, max_videos=3),
+            deps=("autopsy",),
+        ),
+    ]
+
+    if req.single_pass:
+        # ✅ 단일 호출 모드: 스탯/부검/좌담회를 한 번에 받고, 시뮬은 받은 스탯으로 나중에 계산
+        # model/context ─ single ─┬─ stats ─ simulation ─ autopsy ─ videos
+        #                         └─ debate
+        stages = [s for s in stages if s.name not in ("stats", "autopsy", "debate")] + [
+            PipelineStage(
+                "single",
+                lambda r: analyze_all_chain(
+                    gemini_key,
+                    r["model"],
+                    req.seller,
+                    req.buyer,
+                    product.info,
+                    r["context"].render(MARKET_CONTEXT_BUDGETS["single"]),
+                    use_cache=req.use_cache,
+                ),
+                deps=("model", "context"),
+                spinner=labels.get("single", ""),
+            ),
+            PipelineStage("stats", lambda r: r["single"]["stats"], deps=("single",)),
+            # 화면 자리(요약 카드)가 깔린 뒤에 채워지도록 시뮬/스탯 이후로
+            PipelineStage("autopsy", lambda r: r["single"]["autopsy"], deps=("single", "simulation")),
+            PipelineStage("debate", lambda r: r["single"]["debate"], deps=("single", "stats")),
+        ]
+
+    if req.stat_samples > 0:
+        # 2-1) 같은 프롬프트로 스탯을 k번 더 (temperature↑, 동시에) → 불확실성 분포의 평균·공분산
+        stages.append(
+            PipelineStage(
+                "stat_samples",
+                lambda r: sample_stats_chain(
+                    gemini_key,
+                    r["model"],
+                    req.seller,
+                    req.buyer,
+                    product.info,
+                    r["context"].render(MARKET_CONTEXT_BUDGETS["stats"]),
+                    req.stat_samples,
+                    use_cache=req.use_cache,
+                ),
+                deps=("model", "context"),
+            )
+        )
+
+    if req.language != "ko":
+        # 7) 한국어로 생성된 부검/좌담회를 화면 언어로 번역 (필드 전부 호출 1번)
+        target_language = LANGUAGE_NAMES[req.language]
+        stages.append(
+            PipelineStage(
+                "translation",
+                lambda r: translate_batch(
+                    {
+                        **{k: str(r["autopsy"].get(k, "") or "") for k in AUTOPSY_TEXT_FIELDS},
+                        "debate": r["debate"],
+                    },
+                    gemini_key,
+                    r["model"],
+                    [target_language],
+                    use_cache=req.use_cache,
+                )[target_language],
+                deps=("model", "autopsy", "debate"),
+                spinner=labels.get("translation", ""),
+            )
+        )
+    return stages
+
+
+def run_analysis(request: AnalysisRequest, hooks: Optional[AnalysisHooks] = None) -> Report:
+    """단계 그래프를 실행해 Report로 묶음. 실패하면 PipelineError(어느 단계인지 포함)."""
+    hooks = hooks or AnalysisHooks()
+    with start_trace("report") as trace:
+        results = run_pipeline(
+            build_analysis_stages(request, hooks),
+            spinner_slots=hooks.spinner_slots,
+            on_done=hooks.on_stage,
+            on_tick=hooks.on_tick,
+        )
+    return Report(
+        stats=results["stats"],
+        simulation=results["simulation"],
+        autopsy=results["autopsy"],
+        debate=results["debate"],
+        market_data=results["context"].render(MARKET_CONTEXT_BUDGETS["autopsy"]),
+        cases=results["cases"],
+        videos=results["videos"],
+        youtube_queries=youtube_queries_for(results["autopsy"], request.product.name),
+        model=results["model"],
+        language=request.language,
+        translation=results.get("translation", {}),
+        sensitivity=results.get("sensitivity"),
+        uncertainty=results.get("uncertainty"),
+        runway=results.get("runway"),
+        degraded=list(trace.degraded),
+        trace=trace,
+    )
+
+
+def analyze(
+    seller: str,
+    buyer: str,
+    product: Product,
+    gemini_api_key: str = "",
+    tavily_api_key: str = "",
+    hooks: Optional[AnalysisHooks] = None,
+    **options: Any,
+) -> Report:
+    """
+    헤드리스 진입점. 키를 비우면 env/secrets에서 찾음.
+    options: AnalysisRequest의 나머지 필드 (model_name, language, single_pass, use_cache, iterations, stat_samples ...)
+
+        report = analyze("30대, 개발자 출신", "20대 직장인", Product("자동 디스펜서", "센서형", "39,000원"))
+    """
+    gemini_api_key, tavily_api_key = resolve_api_keys(gemini_api_key, tavily_api_key)
+    if not gemini_api_key or not tavily_api_key:
+        raise ValueError("Gemini / Tavily API keys are required")
+    request = AnalysisRequest(seller, buyer, product, gemini_api_key, tavily_api_key, **options)
+    return run_analysis(request, hooks)
+
+
+async def analyze_async(
+    seller: str,
+    buyer: str,
+    product: Product,
+    gemini_api_key: str = "",
+    tavily_api_key: str = "",
+    **options: Any,
+) -> Report:
+    """analyze()를 워커 스레드에서 실행 (이벤트 루프를 막지 않음). 외부 SDK 호출이 동기라서 스레드로 넘김."""
+    return await asyncio.to_thread(analyze, seller, buyer, product, gemini_api_key, tavily_api_key, **options)
+
+
+# =========================
+# 7) 메인
+# =========================
+def main() -> None:
+    st.set_page_config(page_title="Startup Hell", page_icon="💀", layout="wide")
+    apply_custom_style()
+
+    # 언어
+    if "language" not in st.session_state:
+        st.session_state.language = "ko"
+
+    lang_display_to_code = {"한국어": "ko", "English": "en", "日本語": "ja"}
+    lang_code_to_display = {v: k for k, v in lang_display_to_code.items()}
+
+    # 맨 위: 오른쪽 언어 선택 (회색 텍스트)
+    _, top_r = st.columns([7, 3])
+    with top_r:
+        choice = st.radio(
+            # ✅ label 빈값 금지 경고 해결: 라벨은 넣고 숨김 처리
+            label="Language",
+            options=["한국어", "English", "日本語"],
+            index=["한국어", "English", "日本語"].index(lang_code_to_display.get(st.session_state.language, "한국어")),
+            horizontal=True,
+            label_visibility="collapsed",
+            key="lang_choice",
+        )
+        st.session_state.language = lang_display_to_code[choice]
+
+    language = st.session_state.language
+
+    # 상단 네비 + 히어로
+    render_top(language)
 
     # 번역 테이블(라벨)
     t = {
@@ -811,11 +3701,29 @@ def main() -> None:
             "action_plan": "🩸 최후의 발악",
             "bottleneck": "가장 많이 죽은 구간",
             "funnel_title": "☠️ 죽음의 깔때기",
+            "whatif_title": "🧮 뭐부터 고쳐야 덜 죽나 (스탯 ±{step}점)",
+            "uncertainty_title": "🎲 AI 점수가 좀 틀렸다면? (생존 확률 분포)",
+            "bottleneck_freq": "가장 많이 죽는 단계가 될 확률",
+            "uncertainty_caption": "스탯 조합 {outer:,}개 × 각 {inner:,}번 굴림",
+            "runway_title": "💸 통장 잔고로 본 생존 곡선",
+            "runway_median": "절반이 죽는 시점",
+            "runway_broke": "돈이 떨어져 죽은 비율",
+            "runway_months": "{m:.0f}개월",
+            "runway_caption": "회사 {paths:,}개 × {months}개월, 시작 현금 = 월 번레이트 12개월치",
+            "whatif_best": "먼저 고칠 스탯",
+            "whatif_pair": "같이 고치면 제일 좋은 조합",
             "cases_title": "🔗 참고할 과거 흑역사",
             "debate_title": "💬 지옥의 좌담회",
             "videos_title": "📺 참고 영상(2~3개)",
             "no_video": "적절한 영상을 못 찾았습니다.",
             "parse_fail": "분석이 꼬였습니다. 다시 돌려보세요.",
+            "llm_cache": "♻️ 같은 입력이면 이전 AI 결과 재사용",
+            "single_pass": "⚡ 한 번에 분석 (AI 호출 1회)",
+            "single_spinner": "🧪 스탯·부검·좌담회 한 번에 뽑는 중...",
+            "translate_spinner": "🌐 번역 중...",
+            "show_timings": "⏱️ 단계별 소요시간 보기",
+            "timings_title": "⏱️ 이번 분석 소요시간 (워터폴)",
+            "degraded": "⚠️ 외부 API 한도 초과/오류로 일부 결과가 비어 있거나 불완전합니다",
         },
         "en": {
             "api_keys": "🔑 API Keys",
@@ -850,11 +3758,29 @@ def main() -> None:
             "action_plan": "🩸 Last-Ditch Plan",
             "bottleneck": "Biggest Bottleneck",
             "funnel_title": "☠️ Death Funnel",
+            "whatif_title": "🧮 What to fix first (stats ±{step} pts)",
+            "uncertainty_title": "🎲 What if the AI scores are off? (survival distribution)",
+            "bottleneck_freq": "Chance of being the deadliest stage",
+            "uncertainty_caption": "{outer:,} stat draws × {inner:,} rollouts each",
+            "runway_title": "💸 Survival curve by cash runway",
+            "runway_median": "Half dead by",
+            "runway_broke": "Died broke",
+            "runway_months": "{m:.0f} months",
+            "runway_caption": "{paths:,} companies × {months} months, starting cash = 12 months of burn",
+            "whatif_best": "Fix first",
+            "whatif_pair": "Best pair to fix together",
             "cases_title": "🔗 Failure case links",
             "debate_title": "💬 Hell Panel Debate",
             "videos_title": "📺 Reference Videos (2–3)",
             "no_video": "No suitable video found.",
             "parse_fail": "Analysis failed. Try again.",
+            "llm_cache": "♻️ Reuse previous AI results for identical input",
+            "single_pass": "⚡ Single-pass analysis (one AI call)",
+            "single_spinner": "🧪 Scoring, autopsy and panel in one go...",
+            "translate_spinner": "🌐 Translating report...",
+            "show_timings": "⏱️ Show stage timings",
+            "timings_title": "⏱️ Timings for this run (waterfall)",
+            "degraded": "⚠️ Some sections are empty or incomplete because an external API was rate-limited or failed",
         },
         "ja": {
             "api_keys": "🔑 APIキー",
@@ -889,11 +3815,29 @@ def main() -> None:
             "action_plan": "🩸 最後の悪あがき",
             "bottleneck": "最も死んだ区間",
             "funnel_title": "☠️ 死のファネル",
+            "whatif_title": "🧮 どこから直せば死なないか（ステータス ±{step}点）",
+            "uncertainty_title": "🎲 AIの点数がずれていたら？（生存確率の分布）",
+            "bottleneck_freq": "最も死ぬ段階になる確率",
+            "uncertainty_caption": "ステータス {outer:,}通り × 各 {inner:,}回",
+            "runway_title": "💸 資金残高で見る生存曲線",
+            "runway_median": "半分が死ぬ時期",
+            "runway_broke": "資金切れで死んだ割合",
+            "runway_months": "{m:.0f}ヶ月",
+            "runway_caption": "会社 {paths:,}社 × {months}ヶ月、初期資金 = 月間バーン12ヶ月分",
+            "whatif_best": "最初に直すステータス",
+            "whatif_pair": "一緒に直すと最も効く組み合わせ",
             "cases_title": "🔗 失敗事例リンク",
             "debate_title": "💬 地獄の座談会",
             "videos_title": "📺 参考動画（2〜3本）",
             "no_video": "適切な動画が見つかりませんでした。",
             "parse_fail": "分析に失敗しました。もう一度お試しください。",
+            "llm_cache": "♻️ 同じ入力なら前回のAI結果を再利用",
+            "single_pass": "⚡ 一括分析（AI呼び出し1回）",
+            "single_spinner": "🧪 スコア・検死・座談会を一括生成中...",
+            "translate_spinner": "🌐 翻訳中...",
+            "show_timings": "⏱️ 段階別の所要時間を表示",
+            "timings_title": "⏱️ 今回の分析の所要時間（ウォーターフォール）",
+            "degraded": "⚠️ 外部APIの制限超過/エラーにより、一部の結果が空または不完全です",
         },
     }[language]
 
@@ -905,8 +3849,18 @@ def main() -> None:
         # ✅ '키 입력이 귀찮으시면...' 문구는 UI에서 안 보이게 처리 (요청)
         # st.caption(t["api_hint"])
         model_name = st.text_input(t["model_label"], value="gemini-1.5-flash")
+        use_llm_cache = st.checkbox(t["llm_cache"], value=True)
+        single_pass = st.checkbox(t["single_pass"], value=False)
+        show_timings = st.checkbox(t["show_timings"], value=False)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
 
     google_api_key, tavily_api_key = resolve_api_keys(google_input, tavily_input)
+    # 버튼 누르기 전에 모델 목록을 미리 받아둠 (첫 리포트 지연 감소)
+    get_model_registry().warm_up(google_api_key, model_name)
+    # 시뮬 워커도 미리 띄움 (다 데워지기 전 시뮬은 이 프로세스에서 바로 실행)
+    get_sim_executor()
 
     # 입력 섹션 앵커
     st.markdown('<div id="input"></div>', unsafe_allow_html=True)
@@ -955,57 +3909,37 @@ def main() -> None:
 
         seller_info = f"{seller_age}, {seller_style}"
         buyer_info = f"{buyer_age}, {buyer_traits}"
-        product_info = f"{product_name}, {product_desc}, {product_price}"
-
-        # 1) 시장 트렌드 / 흑역사
-        with st.spinner(t["market_spinner"]):
-            market_data = get_market_data(f"{product_name} 시장 트렌드 소비자 불만 니즈", tavily_api_key)
-        with st.spinner(t["case_spinner"]):
-            past_cases = get_market_autopsy(product_name, product_desc, tavily_api_key, max_results=12)
-
-        # 2) 스탯
-        try:
-            with st.spinner(t["stat_spinner"]):
-                stats = analyze_stats_chain(
-                    google_api_key,
-                    model_name,
-                    seller_info,
-                    buyer_info,
-                    product_info,
-                    market_data,
-                )
-        except Exception:
-            st.error(t["parse_fail"])
-            st.stop()
-
-        # 3) 시뮬
-        with st.spinner(t["sim_spinner"]):
-            mcts = StartupMCTS(iterations=1200)
-            simulation = mcts.run(stats)
-
-        # 4) 부검 리포트 + 니즈분석 + 유튜브 검색어 3개
-        try:
-            with st.spinner(t["autopsy_spinner"]):
-                autopsy = autopsy_report_chain(
-                    google_api_key,
-                    model_name,
-                    stats,
-                    simulation.bottleneck_stage,
-                    market_data,
-                )
-        except Exception:
-            st.error(t["parse_fail"])
-            st.stop()
-
-        # 5) 좌담회
-        with st.spinner(t["debate_spinner"]):
-            debate = run_panel_debate(google_api_key, model_name, stats, product_info)
 
-        # 6) 유튜브 2~3개
-        youtube_queries = autopsy.get("youtube_queries", []) or []
-        if not youtube_queries:
-            youtube_queries = [f"{product_name} 시장 분석", f"{product_name} 창업 실패 사례", "PMF 찾는 법"]
-        video_urls = get_youtube_videos(youtube_queries, tavily_api_key, max_videos=3)
+        # ✅ 단계 실행은 run_analysis(헤드리스 API)가 하고, 여기서는 진행 상황을 받아 그리기만 함
+        request = AnalysisRequest(
+            seller=seller_info,
+            buyer=buyer_info,
+            product=Product(product_name, product_desc, product_price),
+            gemini_api_key=google_api_key,
+            tavily_api_key=tavily_api_key,
+            model_name=model_name,
+            language=language,
+            single_pass=single_pass,
+            use_cache=use_llm_cache,
+        )
+        # 부검/좌담회는 토큰 단위로 흘려받아 화면에 바로 그림
+        autopsy_relay = StreamRelay()
+        debate_relay = StreamRelay()
+        hooks = AnalysisHooks(
+            autopsy_relay=autopsy_relay,
+            debate_relay=debate_relay,
+            spinner_labels={
+                "market": t["market_spinner"],
+                "cases": t["case_spinner"],
+                "stats": t["stat_spinner"],
+                "single": t["single_spinner"],
+                "simulation": t["sim_spinner"],
+                "autopsy": t["autopsy_spinner"],
+                "debate": t["debate_spinner"],
+                "translation": t["translate_spinner"],
+            },
+        )
+        hooks.spinner_slots = {s.name: st.container() for s in build_analysis_stages(request, hooks) if s.spinner}
 
         # 결과 앵커
         st.markdown('<div id="report"></div>', unsafe_allow_html=True)
@@ -1013,107 +3947,230 @@ def main() -> None:
 
         st.header(t["report_title"])
 
-        # ✅ 상단 요약: 4개 카드 그리드
         stage_labels = {
             "ko": {"Seed": "시드", "MVP": "MVP", "PMF": "PMF", "Scale-up": "스케일업", "Unicorn": "유니콘"},
             "en": {"Seed": "Seed", "MVP": "MVP", "PMF": "PMF", "Scale-up": "Scale-up", "Unicorn": "Unicorn"},
             "ja": {"Seed": "シード", "MVP": "MVP", "PMF": "PMF", "Scale-up": "スケールアップ", "Unicorn": "ユニコーン"},
         }[language]
-        bottleneck_label = stage_labels.get(simulation.bottleneck_stage, simulation.bottleneck_stage)
-
-        needs_score = _clamp_0_100(stats.get("consumer_needs", 0))
-
-        r1 = st.columns(4)
-        with r1[0]:
-            card_open(t["survival_rate"])
-            st.metric(t["survival_rate"], f"{simulation.survival_rate:.1f}%")
-            card_close()
-        with r1[1]:
-            card_open("Needs")
-            st.metric("Needs", f"{needs_score}/100")
-            card_close()
-        with r1[2]:
-            card_open(t["bottleneck"])
-            st.metric(t["bottleneck"], bottleneck_label)
-            card_close()
-        with r1[3]:
-            card_open(t["death_cause"])
-            st.write(f"**{t['death_cause']}:** {autopsy.get('death_cause', 'N/A')}")
-            card_close()
-
-        # ✅ 4대 스탯: 한 줄 4개 카드
-        srow = st.columns(4)
-        for i, key in enumerate(["product", "team", "strategy", "marketing"]):
-            with srow[i]:
-                card_open(key.capitalize())
-                st.metric(key.capitalize(), f"{_clamp_0_100(stats.get(key, 0))}/100")
+
+        # ✅ 레이아웃 자리부터 깔고, 단계가 끝나는(또는 토큰이 들어오는) 대로 채움
+        slots = {
+            name: st.container()
+            for name in ["summary", "stats", "needs", "body", "debate", "funnel", "uncertainty", "runway", "whatif", "cases", "videos"]
+        }
+        # 스트리밍으로 갱신되는 텍스트 자리 (부검 필드 / 좌담회)
+        live: Dict[str, Any] = {}
+
+        def render_autopsy_fields(autopsy: Dict[str, Any]) -> None:
+            if "death_cause" in live:
+                live["death_cause"].write(f"**{t['death_cause']}:** {autopsy.get('death_cause', 'N/A')}")
+            if "needs_analysis" in live:
+                live["needs_analysis"].write(f"**{t['needs_ai']}:** {autopsy.get('needs_analysis', 'N/A')}")
+            for field_name in ("autopsy_report", "action_plan"):
+                if field_name in live:
+                    live[field_name].write(autopsy.get(field_name, "N/A"))
+
+        def render_stats(stats: Dict[str, int]) -> None:
+            # ✅ 4대 스탯: 한 줄 4개 카드
+            with slots["stats"]:
+                srow = st.columns(4)
+                for i, key in enumerate(["product", "team", "strategy", "marketing"]):
+                    with srow[i]:
+                        card_open(key.capitalize())
+                        st.metric(key.capitalize(), f"{_clamp_0_100(stats.get(key, 0))}/100")
+                        card_close()
+
+            # ✅ 니즈 섹션도 카드화(내용 동일)
+            with slots["needs"]:
+                card_open(t["needs_title"])
+                st.progress(_clamp_0_100(stats.get("consumer_needs", 0)) / 100.0)
+                live["needs_analysis"] = st.empty()
                 card_close()
 
-        # ✅ 니즈 섹션도 카드화(내용 동일)
-        card_open(t["needs_title"])
-        st.progress(needs_score / 100.0)
-        st.write(f"**{t['needs_ai']}:** {autopsy.get('needs_analysis', 'N/A')}")
-        card_close()
+            # ✅ 본문 리포트: 2열 그리드 카드 (부검/액션)
+            with slots["body"]:
+                body_cols = st.columns(2)
+                with body_cols[0]:
+                    card_open(t["autopsy"])
+                    live["autopsy_report"] = st.empty()
+                    card_close()
+                with body_cols[1]:
+                    card_open(t["action_plan"])
+                    live["action_plan"] = st.empty()
+                    card_close()
 
-        # ✅ 본문 리포트: 2열 그리드 카드 (부검/액션)
-        body_cols = st.columns(2)
-        with body_cols[0]:
-            card_open(t["autopsy"])
-            st.write(autopsy.get("autopsy_report", "N/A"))
-            card_close()
-        with body_cols[1]:
-            card_open(t["action_plan"])
-            st.write(autopsy.get("action_plan", "N/A"))
-            card_close()
-
-        # ✅ 좌담회/차트도 카드형
-        card_open(t["debate_title"])
-
-        # ✅ 여기 추가: 좌담회 직전에 스탯이 "점유율 채우듯" 보이게
-        render_stat_fill_bars(stats, language)
-        st.markdown("---")
-        st.write(debate)
+            # ✅ 좌담회/차트도 카드형
+            with slots["debate"]:
+                card_open(t["debate_title"])
 
-        card_close()
+                # ✅ 여기 추가: 좌담회 직전에 스탯이 "점유율 채우듯" 보이게
+                render_stat_fill_bars(stats, language)
+                st.markdown("---")
+                live["debate"] = st.empty()
 
-        card_open(t["funnel_title"])
-        funnel_data = {
-            "Stage": [stage_labels.get(s, s) for s in simulation.death_counts.keys()],
-            "Deaths": list(simulation.death_counts.values()),
-        }
-        fig = px.bar(
-            funnel_data,
-            x="Deaths",
-            y="Stage",
-            orientation="h",
-            title="단계별로 얼마나 잘 죽는지(높을수록 잘 죽음) 🪦",
-        )
-        fig.update_layout(
-            height=380,
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            font_color="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
-        card_close()
+                card_close()
+
+        def render_simulation(simulation: SimulationResult, stats: Dict[str, int]) -> None:
+            # ✅ 상단 요약: 4개 카드 그리드
+            bottleneck_label = stage_labels.get(simulation.bottleneck_stage, simulation.bottleneck_stage)
+            needs_score = _clamp_0_100(stats.get("consumer_needs", 0))
+            with slots["summary"]:
+                r1 = st.columns(4)
+                with r1[0]:
+                    card_open(t["survival_rate"])
+                    st.metric(t["survival_rate"], f"{simulation.survival_rate:.1f}%")
+                    card_close()
+                with r1[1]:
+                    card_open("Needs")
+                    st.metric("Needs", f"{needs_score}/100")
+                    card_close()
+                with r1[2]:
+                    card_open(t["bottleneck"])
+                    st.metric(t["bottleneck"], bottleneck_label)
+                    card_close()
+                with r1[3]:
+                    card_open(t["death_cause"])
+                    live["death_cause"] = st.empty()
+                    card_close()
 
-        # ✅ 참고 사례: 그리드 카드 (한 줄 3~4개)
-        st.markdown('<div id="cases"></div>', unsafe_allow_html=True)
-        st.subheader(t["cases_title"])
+            with slots["funnel"]:
+                card_open(t["funnel_title"])
+                funnel_data = {
+                    "Stage": [stage_labels.get(s, s) for s in simulation.death_counts.keys()],
+                    "Deaths": list(simulation.death_counts.values()),
+                }
+                fig = px.bar(
+                    funnel_data,
+                    x="Deaths",
+                    y="Stage",
+                    orientation="h",
+                    title="단계별로 얼마나 잘 죽는지(높을수록 잘 죽음) 🪦",
+                )
+                fig.update_layout(
+                    height=380,
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font_color="white",
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                card_close()
 
-        if past_cases:
-            # 12개까지 그리드로 보여주기 (4열)
-            max_show = min(12, len(past_cases))
-            cols_per_row = 4
-            rows = (max_show + cols_per_row - 1) // cols_per_row
+        def render_uncertainty(result: UncertaintyResult) -> None:
+            # ✅ 스탯 점수가 흔들릴 때 생존확률 분포 (5/50/95 백분위) + 병목 단계가 될 확률
+            pct = result.survival_percentiles
+            with slots["uncertainty"]:
+                card_open(t["uncertainty_title"])
+                cols = st.columns(3)
+                for col, q in zip(cols, (5, 50, 95)):
+                    with col:
+                        st.metric(f"P{q}", f"{pct[q]:.2f}%")
+                fig = px.bar(
+                    {
+                        "Stage": [stage_labels.get(s, s) for s in result.bottleneck_frequency],
+                        "Share": [f * 100.0 for f in result.bottleneck_frequency.values()],
+                    },
+                    x="Share",
+                    y="Stage",
+                    orientation="h",
+                    labels={"Share": f"{t['bottleneck_freq']} (%)", "Stage": ""},
+                )
+                fig.update_layout(
+                    height=260,
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font_color="white",
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(t["uncertainty_caption"].format(outer=result.outer, inner=result.inner))
+                card_close()
+
+        def render_runway(result: RunwayResult) -> None:
+            # ✅ 월별 생존 곡선 + 절반이 죽는 시점 / 현금 소진 사망 비율
+            with slots["runway"]:
+                card_open(t["runway_title"])
+                dead = sum(result.death_causes.values())
+                cols = st.columns(2)
+                with cols[0]:
+                    median = result.time_to_death.get(50)
+                    st.metric(t["runway_median"], t["runway_months"].format(m=median) if median is not None else "-")
+                with cols[1]:
+                    st.metric(t["runway_broke"], f"{result.death_causes['runway'] / dead * 100:.1f}%" if dead else "-")
+                fig = px.line(
+                    {"Month": list(range(len(result.survival_curve))), "Alive": [v * 100.0 for v in result.survival_curve]},
+                    x="Month",
+                    y="Alive",
+                    labels={"Alive": f"{t['survival_rate']} (%)", "Month": ""},
+                )
+                fig.update_layout(
+                    height=260,
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font_color="white",
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(t["runway_caption"].format(paths=result.paths, months=result.months))
+                card_close()
+
+        def render_sensitivity(result: SensitivityResult) -> None:
+            # ✅ 토네이도 차트: 스탯별 -N점/+N점(여러 크기 겹쳐서)일 때 생존확률 변화. 영향 큰 스탯이 위로
+            names = {k: ("Needs" if k == "consumer_needs" else k.capitalize()) for k in STAT_KEYS}
+            step = result.step
+            single = result.single[step]
+            order = sorted(STAT_KEYS, key=lambda k: single[k][1] - single[k][0])
+            base = result.base_survival
+            # 생존확률 자체가 작아서 %p보다 '기준 대비 몇 %'가 읽기 쉬움 (기준이 0이면 %p 그대로)
+            scale, unit = (100.0 / base, "%") if base > 0 else (1.0, "%p")
+            # 큰 step 막대를 먼저 그려야 겹쳤을 때 작은 step 막대가 위에 보임
+            steps = sorted(result.steps, reverse=True)
+            rows = [
+                {"stat": names[k], "change": f"{sign}{x}", "delta": result.single[x][k][i] * scale}
+                for x in steps
+                for k in order
+                for i, sign in ((0, "-"), (1, "+"))
+            ]
+            # step이 클수록 진한 색
+            reds, greens = ["#ffb3b3", "#ff4b4b", "#a61b1b"], ["#a8e6b8", "#21c354", "#0d7a2e"]
+            shade = {x: min(2, round(i * 2 / max(1, len(steps) - 1))) for i, x in enumerate(sorted(result.steps))}
+            colors = {**{f"-{x}": reds[shade[x]] for x in steps}, **{f"+{x}": greens[shade[x]] for x in steps}}
+            with slots["whatif"]:
+                card_open(t["whatif_title"].format(step="/".join(map(str, result.steps))))
+                fig = px.bar(
+                    rows,
+                    x="delta",
+                    y="stat",
+                    color="change",
+                    orientation="h",
+                    barmode="overlay",
+                    opacity=1.0,
+                    labels={"delta": f"{t['survival_rate']} Δ ({unit})", "stat": "", "change": ""},
+                    color_discrete_map=colors,
+                )
+                fig.update_layout(
+                    height=320,
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font_color="white",
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                best, best_pair = result.best_stat(), result.best_pair()
+                pair = " + ".join(names[k] for k in best_pair.split("+"))
+                st.caption(
+                    f"{t['whatif_best']}: **{names[best]}** "
+                    f"(+{step} → {single[best][1] * scale:+.1f}{unit}) · "
+                    f"{t['whatif_pair']}: **{pair}** (+{step} → {result.pairwise[step][best_pair][1] * scale:+.1f}{unit})"
+                )
+                card_close()
 
+        def render_case_grid(cases: List[dict]) -> None:
+            cols_per_row = 4
+            rows = (len(cases) + cols_per_row - 1) // cols_per_row
             idx = 0
             for _ in range(rows):
                 cols = st.columns(cols_per_row)
                 for c in cols:
-                    if idx >= max_show:
+                    if idx >= len(cases):
                         break
-                    case = past_cases[idx]
+                    case = cases[idx]
                     title = case.get("title", "Untitled")
                     url = case.get("url", "#")
                     content = (case.get("content", "") or "").strip()
@@ -1126,45 +4183,88 @@ def main() -> None:
                         card_close()
                     idx += 1
 
-            # 더 있으면 expander 안에서 그리드(4열)
-            if len(past_cases) > max_show:
-                with st.expander(f"흑역사 더 보기… ({len(past_cases) - max_show}개)"):
-                    rest = past_cases[max_show:]
-                    cols_per_row = 4
-                    rows = (len(rest) + cols_per_row - 1) // cols_per_row
-                    idx2 = 0
-                    for _ in range(rows):
-                        cols = st.columns(cols_per_row)
-                        for c in cols:
-                            if idx2 >= len(rest):
-                                break
-                            case = rest[idx2]
-                            title = case.get("title", "Untitled")
-                            url = case.get("url", "#")
-                            content = (case.get("content", "") or "").strip()
-                            content = content[:160] + ("..." if len(content) > 160 else "")
-                            with c:
-                                card_open("🔗")
-                                st.markdown(f"[{title}]({url})")
-                                st.markdown(f"<div class='card-sub'>{content}</div>", unsafe_allow_html=True)
-                                card_close()
-                            idx2 += 1
-        else:
-            st.caption("관련 사례를 찾지 못했습니다. (또는 깨진/XLS 같은 결과는 자동으로 버렸습니다 😇)")
-
-        # ✅ 영상: 그리드 카드 (2열)
-        st.markdown('<div id="videos"></div>', unsafe_allow_html=True)
-        st.subheader(t["videos_title"])
-        if video_urls:
-            vcols = st.columns(2)
-            for i, u in enumerate(video_urls):
-                with vcols[i % 2]:
-                    card_open("📺")
-                    st.video(u)
-                    card_close()
-            st.caption("검색어: " + " / ".join(youtube_queries[:3]))
-        else:
-            st.warning(t["no_video"])
+        def render_cases(past_cases: List[dict]) -> None:
+            # ✅ 참고 사례: 그리드 카드 (한 줄 3~4개)
+            with slots["cases"]:
+                st.markdown('<div id="cases"></div>', unsafe_allow_html=True)
+                st.subheader(t["cases_title"])
+
+                if past_cases:
+                    # 12개까지 그리드로 보여주기 (4열)
+                    max_show = min(12, len(past_cases))
+                    render_case_grid(past_cases[:max_show])
+
+                    # 더 있으면 expander 안에서 그리드(4열)
+                    if len(past_cases) > max_show:
+                        with st.expander(f"흑역사 더 보기… ({len(past_cases) - max_show}개)"):
+                            render_case_grid(past_cases[max_show:])
+                else:
+                    st.caption("관련 사례를 찾지 못했습니다. (또는 깨진/XLS 같은 결과는 자동으로 버렸습니다 😇)")
+
+        def render_videos(video_urls: List[str], youtube_queries: List[str]) -> None:
+            # ✅ 영상: 그리드 카드 (2열)
+            with slots["videos"]:
+                st.markdown('<div id="videos"></div>', unsafe_allow_html=True)
+                st.subheader(t["videos_title"])
+                if video_urls:
+                    vcols = st.columns(2)
+                    for i, u in enumerate(video_urls):
+                        with vcols[i % 2]:
+                            card_open("📺")
+                            st.video(u)
+                            card_close()
+                    st.caption("검색어: " + " / ".join(youtube_queries[:3]))
+                else:
+                    st.warning(t["no_video"])
+
+        def on_stage_done(name: str, results: Dict[str, Any]) -> None:
+            if name == "stats":
+                render_stats(results["stats"])
+            elif name == "simulation":
+                render_simulation(results["simulation"], results["stats"])
+            elif name == "autopsy":
+                render_autopsy_fields(results["autopsy"])
+            elif name == "debate":
+                live["debate"].write(results["debate"])
+            elif name == "uncertainty":
+                render_uncertainty(results["uncertainty"])
+            elif name == "runway":
+                render_runway(results["runway"])
+            elif name == "sensitivity":
+                render_sensitivity(results["sensitivity"])
+            elif name == "cases":
+                render_cases(results["cases"])
+            elif name == "videos":
+                render_videos(results["videos"], youtube_queries_for(results["autopsy"], product_name))
+            elif name == "translation":
+                render_autopsy_fields(results["translation"])
+                live["debate"].write(results["translation"]["debate"])
+
+        def on_tick() -> None:
+            changed, partial = autopsy_relay.poll()
+            if changed and isinstance(partial, dict):
+                render_autopsy_fields(partial)
+            changed, text = debate_relay.poll()
+            if changed and "debate" in live:
+                live["debate"].write(text)
+
+        hooks.on_stage = on_stage_done
+        hooks.on_tick = on_tick
+        try:
+            report = run_analysis(request, hooks)
+        except PipelineError as exc:
+            if exc.stage in ("stats", "autopsy", "single"):
+                st.error(t["parse_fail"])
+                st.stop()
+            raise exc.error
+
+        if report.degraded:
+            sources = sorted({d["source"] for d in report.degraded})
+            st.warning(f"{t['degraded']}: {', '.join(sources)}")
+
+        if show_timings:
+            with st.expander(t["timings_title"]):
+                render_trace_waterfall(report.trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+"""
+아이디어 여러 개를 한 번에 채점하는 배치 모드 (Streamlit 없이).
+
+입력: CSV 또는 JSONL. 한 행 = 아이디어 1개
+    id(선택), seller, buyer, product_name, product_desc, product_price
+출력: JSONL. 아이디어 하나가 끝날 때마다 한 줄씩 바로 기록
+    {"id", "status": "ok"|"error", "input", "stats", "simulation", "autopsy"?, "degraded"?, "error"?, "elapsed_s"}
+
+    python batch.py ideas.csv -o results.jsonl
+    python batch.py ideas.jsonl -o results.jsonl --concurrency 8 --gemini-rps 2 --tavily-rps 5 --autopsy
+
+출력 파일이 곧 체크포인트: 다시 실행하면 이미 status=ok로 기록된 id는 건너뜀
+(--retry-failed면 error였던 것도 다시). 중간에 끊겨도 LLM/검색 캐시 덕에 재실행 비용은 작음.
+
+흐름: [검색 → 스탯] 을 동시에 concurrency개씩 → 스탯이 나온 아이디어를 sim_batch개씩 모아
+StartupMCTS.run_many로 한 번에 시뮬 → (--autopsy면 부검 후) 기록
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import app
+
+INPUT_FIELDS = ["seller", "buyer", "product_name", "product_desc", "product_price"]
+
+
+@dataclass
+class Idea:
+    id: str
+    seller: str
+    buyer: str
+    product: app.Product
+    started: float = field(default_factory=time.perf_counter)
+    stats: Dict[str, int] = field(default_factory=dict)
+    simulation: Optional[app.SimulationResult] = None
+    degraded: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def input(self) -> Dict[str, str]:
+        return {
+            "seller": self.seller,
+            "buyer": self.buyer,
+            "product_name": self.product.name,
+            "product_desc": self.product.desc,
+            "product_price": self.product.price,
+        }
+
+
+def _idea_id(row: Dict[str, Any]) -> str:
+    raw = json.dumps([str(row.get(k, "") or "") for k in INPUT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def read_ideas(path: str) -> Iterator[Idea]:
+    """CSV(헤더 필수) 또는 JSONL. product_name이 없으면 product 컬럼을 씀. id가 없으면 내용 해시."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows: Iterator[Dict[str, Any]] = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            row = {k: (v or "").strip() if isinstance(v, str) else v for k, v in row.items() if k}
+            row.setdefault("product_name", row.get("product", ""))
+            if not row.get("product_name"):
+                continue
+            yield Idea(
+                id=str(row.get("id") or _idea_id(row)),
+                seller=str(row.get("seller", "")),
+                buyer=str(row.get("buyer", "")),
+                product=app.Product(str(row["product_name"]), str(row.get("product_desc", "")), str(row.get("product_price", ""))),
+            )
+
+
+def load_checkpoint(path: str, retry_failed: bool) -> Set[str]:
+    """이미 끝난 id (출력 JSONL 기준). 마지막 줄이 잘려 있으면 무시."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get("status") == "ok" or not retry_failed:
+                done.add(str(rec.get("id")))
+    return done
+
+
+class ResultWriter:
+    """JSONL 한 줄씩 append + flush (중간에 죽어도 이미 쓴 줄은 남음)."""
+
+    def __init__(self, path: str) -> None:
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.ok = 0
+        self.failed = 0
+
+    def write(self, idea: Idea, status: str, **payload: Any) -> None:
+        rec = {
+            "id": idea.id,
+            "status": status,
+            "input": idea.input,
+            **payload,
+            "elapsed_s": round(time.perf_counter() - idea.started, 3),
+        }
+        with self._lock:
+            self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._f.flush()
+            if status == "ok":
+                self.ok += 1
+            else:
+                self.failed += 1
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class BatchRunner:
+    def __init__(self, args: argparse.Namespace, gemini_key: str, tavily_key: str, writer: ResultWriter) -> None:
+        self.args = args
+        self.gemini_key = gemini_key
+        self.tavily_key = tavily_key
+        self.writer = writer
+        # 속도 제한/429 재시도는 app의 공유 RateGate가 맡음 (Streamlit 화면과 같은 로직)
+        gates = app.get_rate_gates()
+        gates.configure("tavily", rps=args.tavily_rps, burst=max(1.0, args.tavily_rps))
+        gates.configure("gemini", rps=args.gemini_rps, burst=max(1.0, args.gemini_rps))
+        self.mcts = app.StartupMCTS(iterations=args.iterations, mode=args.sim_mode, seed=args.seed)
+        self.model = app.resolve_gemini_model(args.model, gemini_key)
+
+    def score(self, idea: Idea) -> Dict[str, Any]:
+        """검색 → 스탯 (아이디어별, 워커 스레드)."""
+        with app.start_trace("batch.score") as trace:
+            # ✅ 화면 파이프라인(build_analysis_stages)과 같은 두 검색 → 같은 컨텍스트
+            product = idea.product
+            snippets = app.get_market_snippets(f"{product.name} 시장 트렌드 소비자 불만 니즈", self.tavily_key)
+            cases = app.get_market_autopsy(product.name, product.desc, self.tavily_key, max_results=12)
+            market = app.build_market_context(f"{product.name} {product.desc}", [snippets, cases])
+            idea.stats = app.analyze_stats_chain(
+                self.gemini_key,
+                self.model,
+                idea.seller,
+                idea.buyer,
+                idea.product.info,
+                market.render(app.MARKET_CONTEXT_BUDGETS["stats"]),
+                use_cache=not self.args.no_cache,
+            )
+        idea.degraded += trace.degraded
+        return {"market": market}
+
+    def autopsy(self, idea: Idea, market: app.MarketContext) -> Dict[str, Any]:
+        assert idea.simulation is not None
+        with app.start_trace("batch.autopsy") as trace:
+            out = app.autopsy_report_chain(
+                self.gemini_key,
+                self.model,
+                idea.stats,
+                idea.simulation.bottleneck_stage,
+                market.render(app.MARKET_CONTEXT_BUDGETS["autopsy"]),
+                use_cache=not self.args.no_cache,
+            )
+        idea.degraded += trace.degraded
+        return out
+
+    def finish(self, idea: Idea, autopsy: Optional[Dict[str, Any]] = None) -> None:
+        payload: Dict[str, Any] = {"stats": idea.stats, "simulation": asdict(idea.simulation)}
+        if autopsy is not None:
+            payload["autopsy"] = autopsy
+        if idea.degraded:
+            payload["degraded"] = idea.degraded
+        self.writer.write(idea, "ok", **payload)
+
+    def run(self, ideas: List[Idea]) -> None:
+        pool = ThreadPoolExecutor(max_workers=self.args.concurrency)
+        todo = iter(ideas)
+        scoring: Dict[Future, Idea] = {}
+        autopsies: Dict[Future, Idea] = {}
+        buffer: List[Idea] = []
+        markets: Dict[str, app.MarketContext] = {}
+
+        def fill() -> None:
+            # 동시에 떠 있는 작업 수를 concurrency로 묶음 (입력 전체를 한꺼번에 큐에 넣지 않음)
+            while len(scoring) + len(autopsies) < self.args.concurrency:
+                idea = next(todo, None)
+                if idea is None:
+                    return
+                idea.started = time.perf_counter()
+                scoring[pool.submit(self.score, idea)] = idea
+
+        def simulate(batch: List[Idea]) -> None:
+            # ✅ 스탯이 나온 아이디어를 모아서 한 번에 시뮬 (아이디어 × stage 행렬)
+            try:
+                sims = self.mcts.run_many([i.stats for i in batch])
+            except Exception as exc:
+                # 시뮬이 터지면 이 묶음만 error 행으로 남기고 배치는 계속
+                for idea in batch:
+                    markets.pop(idea.id, None)
+                    self.writer.write(idea, "error", stage="simulation", error=f"{type(exc).__name__}: {exc}")
+                return
+            for idea, sim in zip(batch, sims):
+                idea.simulation = sim
+                if self.args.autopsy:
+                    autopsies[pool.submit(self.autopsy, idea, markets.pop(idea.id))] = idea
+                else:
+                    markets.pop(idea.id, None)
+                    self.finish(idea)
+
+        try:
+            fill()
+            while scoring or autopsies or buffer:
+                if scoring or autopsies:
+                    done, _ = wait(list(scoring) + list(autopsies), return_when=FIRST_COMPLETED)
+                else:
+                    done = set()
+                for fut in done:
+                    if fut in scoring:
+                        idea = scoring.pop(fut)
+                        try:
+                            markets[idea.id] = fut.result()["market"]
+                            buffer.append(idea)
+                        except Exception as exc:
+                            self.writer.write(idea, "error", stage="stats", error=f"{type(exc).__name__}: {exc}")
+                    else:
+                        idea = autopsies.pop(fut)
+                        try:
+                            self.finish(idea, fut.result())
+                        except Exception as exc:
+                            self.writer.write(idea, "error", stage="autopsy", error=f"{type(exc).__name__}: {exc}")
+                fill()
+                if buffer and (len(buffer) >= self.args.sim_batch or not scoring):
+                    batch, buffer = buffer, []
+                    simulate(batch)
+                self.progress()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.progress(final=True)
+
+    def progress(self, final: bool = False) -> None:
+        if self.args.quiet:
+            return
+        end = "\n" if final else "\r"
+        print(f"ok={self.writer.ok} failed={self.writer.failed}", end=end, file=sys.stderr, flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV 또는 JSONL")
+    parser.add_argument("-o", "--output", required=True, help="결과 JSONL (체크포인트 겸용)")
+    parser.add_argument("--model", default="gemini-1.5-flash")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 아이디어 수")
+    parser.add_argument("--tavily-rps", type=float, default=4.0, help="Tavily 초당 요청 수 (0이면 무제한)")
+    parser.add_argument("--gemini-rps", type=float, default=1.0, help="Gemini 초당 요청 수 (0이면 무제한)")
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    parser.add_argument("--sim-mode", choices=["exact", "sample", "adaptive"], default="exact")
+    parser.add_argument("--seed", type=int, default=None, help="sample/adaptive 시뮬 난수 시드 (재현용)")
+    parser.add_argument("--sim-batch", type=int, default=64, help="몇 개씩 모아서 한 번에 시뮬할지")
+    parser.add_argument("--autopsy", action="store_true", help="부검 리포트까지 생성 (Gemini 호출 +1)")
+    parser.add_argument("--retry-failed", action="store_true", help="이전에 error였던 id도 다시 실행")
+    parser.add_argument("--no-cache", action="store_true", help="LLM 응답 캐시 사용 안 함")
+    parser.add_argument("--limit", type=int, default=0, help="앞에서부터 N개만 (0이면 전부)")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    if args.iterations <= 0:
+        parser.error("--iterations는 1 이상이어야 합니다.")
+
+    gemini_key, tavily_key = app.resolve_api_keys("", "")
+    if not gemini_key or not tavily_key:
+        parser.error("GEMINI_API_KEY / TAVILY_API_KEY 환경변수가 필요합니다.")
+
+    done = load_checkpoint(args.output, args.retry_failed)
+    ideas: List[Idea] = []
+    seen: Set[str] = set()
+    for idea in read_ideas(args.input):
+        if idea.id in done or idea.id in seen:
+            continue
+        seen.add(idea.id)
+        ideas.append(idea)
+        if args.limit and len(ideas) >= args.limit:
+            break
+    if not args.quiet:
+        print(f"{len(ideas)} ideas to run ({len(done)} already done)", file=sys.stderr)
+
+    writer = ResultWriter(args.output)
+    try:
+        BatchRunner(args, gemini_key, tavily_key, writer).run(ideas)
+    finally:
+        writer.close()
+    if writer.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+_looks_like_binary_or_garbage 마이크로 벤치마크.
+
+Tavily 검색 응답(JSONL, 한 줄 = search() 응답 하나)의 results[].content 전부를
+필터에 통과시켜 스니펫당 시간을 잰다. 비교용으로 예전(다중 패스 + re.sub) 구현도 같이 잰다.
+
+    python bench/bench_garbage_filter.py
+    python bench/bench_garbage_filter.py --corpus my_payloads.jsonl --repeat 500 --scale 10
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tavily_results.jsonl")
+
+
+def legacy_filter(text: str) -> bool:
+    """
+    예전 구현 (문자열을 여러 번 훑고, 매번 패턴 컴파일 + 복사본 생성).
+    원래 count 대상이 U+FFFD가 공백으로 깨진 채 들어가 있었는데, 의도대로 U+FFFD로 비교.
+    """
+    if not text:
+        return True
+    if "[XLS]" in text or "\x00" in text:
+        return True
+    bad = text.count("\ufffd")
+    if bad >= 8:
+        return True
+    controls = sum(1 for ch in text if ord(ch) < 9)
+    if controls > 0:
+        return True
+    clean = re.sub(r"[A-Za-z0-9가-힣\s\.\,\-\(\)\[\]\!\?\:\/]", "", text)
+    if len(clean) / max(1, len(text)) > 0.35:
+        return True
+    return False
+
+
+def load_snippets(path: str, scale: int) -> List[str]:
+    snippets: List[str] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                snippets.extend((r.get("content") or "") for r in json.loads(line).get("results", []))
+    return snippets * scale
+
+
+def run(corpus: str = DEFAULT_CORPUS, repeat: int = 200, scale: int = 1) -> Dict[str, Any]:
+    snippets = load_snippets(corpus, scale)
+    mismatches = sum(app._looks_like_binary_or_garbage(s) != legacy_filter(s) for s in snippets)
+    dropped = sum(app._looks_like_binary_or_garbage(s) for s in snippets)
+
+    report: Dict[str, Any] = {
+        "benchmark": "garbage_filter",
+        "snippets": len(snippets),
+        "chars": sum(map(len, snippets)),
+        "dropped": dropped,
+        "mismatches": mismatches,
+    }
+    for name, fn in [("current", app._looks_like_binary_or_garbage), ("legacy", legacy_filter)]:
+        best = min(timeit.repeat(lambda: [fn(s) for s in snippets], number=repeat, repeat=5))
+        report[f"{name}_us_per_snippet"] = round(best / repeat / len(snippets) * 1e6, 3)
+    report["speedup"] = round(report["legacy_us_per_snippet"] / report["current_us_per_snippet"], 2)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=1, help="코퍼스를 몇 배로 불릴지 (max_results 증가 흉내)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON 한 줄로 출력")
+    args = parser.parse_args()
+
+    report = run(args.corpus, args.repeat, args.scale)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for k, v in report.items():
+            print(f"{k:>24}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+StartupMCTS.run 마이크로 벤치마크.
+
+반복 수 10^3 ~ 10^7 에서 sample(청크 단위 numpy 샘플링) / adaptive(CI가 충분히 좁아지면 멈춤) /
+exact(닫힌 해) 모드의 실행 시간, 실제 롤아웃 수, tracemalloc 최대 할당량을 잰다.
+--variance면 분산 감소 방식(None / antithetic / stratified)별로 시드를 바꿔 가며 생존확률 표준편차를 비교.
+--runway면 RunwaySimulator(경로 × 개월) 실행 시간과 할당량.
+--pool이면 동시 요청 N개를 스레드에서 바로 돌릴 때 vs sim_pool 프로세스 풀로 보낼 때의 처리량(jobs/s)과
+그동안 다른 스레드(= 다른 Streamlit 세션)의 순수 파이썬 작업이 얼마나 밀리는지(p99 ms).
+
+    python bench/bench_mcts.py
+    python bench/bench_mcts.py --max-exp 6 --repeat 5 --json
+    python bench/bench_mcts.py --variance
+    python bench/bench_mcts.py --runway
+    SIM_POOL_WORKERS=4 python bench/bench_mcts.py --pool
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+import sim_pool  # noqa: E402
+
+SAMPLE_STATS = {"product": 62, "team": 48, "strategy": 41, "marketing": 37, "consumer_needs": 71}
+
+
+def _best_of(fn: Any, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(
+    min_exp: int = 3, max_exp: int = 7, repeat: int = 3, modes: tuple = ("sample", "adaptive", "exact")
+) -> Dict[str, Any]:
+    rows: List[Dict[str, Any]] = []
+    for mode in modes:
+        for exp in range(min_exp, max_exp + 1):
+            sim = app.StartupMCTS(iterations=10**exp, mode=mode, seed=exp)
+            best = _best_of(lambda: sim.run(SAMPLE_STATS), repeat)
+
+            tracemalloc.start()
+            result = sim.run(SAMPLE_STATS)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            rows.append(
+                {
+                    "mode": mode,
+                    "iterations": 10**exp,
+                    "best_s": round(best, 6),
+                    "ns_per_iteration": round(best / 10**exp * 1e9, 3),
+                    "alloc_peak_kb": round(peak / 1024, 1),
+                    "samples": result.samples,
+                    "survival_pct": round(result.survival_rate, 4),
+                    "bottleneck_stage": result.bottleneck_stage,
+                }
+            )
+    return {"benchmark": "mcts", "stats": SAMPLE_STATS, "repeat": repeat, "results": rows}
+
+
+def variance(iterations: int = 20_000, seeds: int = 200) -> Dict[str, Any]:
+    """분산 감소 방식별 생존확률(%) 표본 표준편차와 95% CI의 실제 포함률 (같은 iterations, 시드만 바꿈)."""
+    exact = app.StartupMCTS(mode="exact").run(SAMPLE_STATS).survival_rate
+    rows = []
+    for vr in app.VARIANCE_REDUCTIONS:
+        results = [app.StartupMCTS(iterations, seed=i, variance_reduction=vr).run(SAMPLE_STATS) for i in range(seeds)]
+        values = np.array([r.survival_rate for r in results])
+        rows.append(
+            {
+                "variance_reduction": vr or "none",
+                "std_pct": round(float(values.std()), 5),
+                "bias_pct": round(float(values.mean() - exact), 5),
+                "ci_coverage": round(float(np.mean([r.survival_ci[0] <= exact <= r.survival_ci[1] for r in results])), 3),
+            }
+        )
+    return {"benchmark": "mcts_variance", "iterations": iterations, "seeds": seeds, "exact_pct": exact, "results": rows}
+
+
+def runway(repeat: int = 3, paths: tuple = (10_000, 100_000, 1_000_000), months: tuple = (60, 120)) -> Dict[str, Any]:
+    rows = []
+    for n in paths:
+        for m in months:
+            sim = app.RunwaySimulator(n, m, seed=0)
+            best = _best_of(lambda: sim.run(SAMPLE_STATS), repeat)
+            tracemalloc.start()
+            result = sim.run(SAMPLE_STATS)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append(
+                {
+                    "paths": n,
+                    "months": m,
+                    "best_s": round(best, 6),
+                    "alloc_peak_kb": round(peak / 1024, 1),
+                    "survival_pct": round(result.survival_rate, 4),
+                    "median_death_month": result.time_to_death.get(50),
+                }
+            )
+    return {"benchmark": "runway", "stats": SAMPLE_STATS, "repeat": repeat, "results": rows}
+
+
+def _under_load(job: Any, concurrency: int, jobs: int) -> Dict[str, float]:
+    # 동시 요청 concurrency개씩 jobs개를 처리하는 동안, 옆 스레드가 5ms마다 짧은 파이썬 작업을 돌린 시간
+    lags: List[float] = []
+    stop = threading.Event()
+
+    def probe() -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            sum(range(20_000))
+            lags.append(time.perf_counter() - t0)
+            time.sleep(0.005)
+
+    todo = iter(range(jobs))
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if next(todo, None) is None:
+                    return
+            job()
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    prober.join()
+    return {
+        "jobs_per_s": round(jobs / elapsed, 2),
+        "probe_p50_ms": round(float(np.percentile(lags, 50)) * 1e3, 2),
+        "probe_p99_ms": round(float(np.percentile(lags, 99)) * 1e3, 2),
+    }
+
+
+def pool(concurrency: int = 8, jobs: int = 32, paths: int = 100_000, months: int = 120) -> Dict[str, Any]:
+    executor = sim_pool.SimulationExecutor(app)
+    matrix = app.stats_matrix([SAMPLE_STATS])
+    # 워커를 전부 띄우고 데운 뒤 측정
+    executor.wait_ready(timeout=60)
+    rows = [
+        {"executor": "threads", **_under_load(lambda: app.RunwaySimulator(paths, months).run(SAMPLE_STATS), concurrency, jobs)},
+        {
+            "executor": f"pool({executor.workers})",
+            **_under_load(lambda: executor.run("runway", matrix, paths=paths, months=months), concurrency, jobs),
+        },
+    ]
+    executor.shutdown()
+    return {
+        "benchmark": "sim_pool",
+        "job": f"runway {paths:,} x {months}",
+        "concurrency": concurrency,
+        "jobs": jobs,
+        "cpus": os.cpu_count(),
+        "results": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-exp", type=int, default=3)
+    parser.add_argument("--max-exp", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mode", choices=["sample", "adaptive", "exact", "all"], default="all")
+    parser.add_argument("--variance", action="store_true", help="분산 감소 방식 비교")
+    parser.add_argument("--runway", action="store_true", help="월별 런웨이 시뮬 시간 측정")
+    parser.add_argument("--pool", action="store_true", help="동시 부하에서 스레드 vs 프로세스 풀")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = parser.parse_args()
+
+    if args.variance:
+        report = variance()
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+            return
+        print(f"exact survival%: {report['exact_pct']:.5f}  (iterations={report['iterations']:,}, seeds={report['seeds']})")
+        for r in report["results"]:
+            print(f"{r['variance_reduction']:>11}  std={r['std_pct']:.5f}  bias={r['bias_pct']:+.5f}  ci_coverage={r['ci_coverage']:.3f}")
+        return
+
+    if args.pool:
+        report = pool()
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+            return
+        print(f"{report['job']}, concurrency={report['concurrency']}, jobs={report['jobs']}, cpus={report['cpus']}")
+        for r in report["results"]:
+            print(f"{r['executor']:>10}  {r['jobs_per_s']:>7.2f} jobs/s  probe p50={r['probe_p50_ms']:.2f}ms p99={r['probe_p99_ms']:.2f}ms")
+        return
+
+    if args.runway:
+        report = runway(args.repeat)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+            return
+        print(f"{'paths':>10} {'months':>6} {'best_s':>9} {'peak_kb':>10} {'survival%':>9}  median_death_month")
+        for r in report["results"]:
+            print(
+                f"{r['paths']:>10,} {r['months']:>6} {r['best_s']:>9.4f} {r['alloc_peak_kb']:>10.1f} "
+                f"{r['survival_pct']:>9.4f}  {r['median_death_month']}"
+            )
+        return
+
+    modes = ("sample", "adaptive", "exact") if args.mode == "all" else (args.mode,)
+    report = run(args.min_exp, args.max_exp, args.repeat, modes)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(
+        f"{'mode':>8} {'iterations':>11} {'samples':>11} {'best_s':>10} {'ns/iter':>9} {'peak_kb':>9} {'survival%':>9}  bottleneck"
+    )
+    for r in report["results"]:
+        print(
+            f"{r['mode']:>8} {r['iterations']:>11,} {r['samples']:>11,} {r['best_s']:>10.5f} {r['ns_per_iteration']:>9.2f} "
+            f"{r['alloc_peak_kb']:>9.1f} {r['survival_pct']:>9.4f}  {r['bottleneck_stage']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
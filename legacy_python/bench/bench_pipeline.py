@@ -0,0 +1,166 @@
+"""
+분석 파이프라인 end-to-end 벤치마크 (Streamlit 없이).
+
+main()과 같은 순서로 단계를 돌리되, 외부 API 대신 로컬 가짜 Tavily/Gemini 서버
+(bench/fake_services.py, 별도 프로세스)를 붙인다. 단계별로 아래를 JSON으로 남긴다.
+- wall_s: 경과 시간 (perf_counter)
+- cpu_s: 이 프로세스 CPU 시간 (process_time, 워커 스레드 포함)
+- alloc_peak_kb / alloc_net_kb: tracemalloc 기준 최대/순증 할당량
+
+    python bench/bench_pipeline.py
+    python bench/bench_pipeline.py --gemini-latency 2 --runs 3 --cache memory --out pipeline.json
+    python bench/bench_pipeline.py --parallel   # app.analyze(의존성 그래프 병렬)로 총 시간 비교
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_services import fetch_request_counts, spawn_fake_services  # noqa: E402
+
+SAMPLE_INPUT = {
+    "seller": "30대, 개발자 출신 1인 창업",
+    "buyer": "20~30대 직장인, 사무실 위생에 예민함",
+    "product_name": "자동 손소독 디스펜서",
+    "product_desc": "사무실용 센서형 손소독제 디스펜서, 리필 구독",
+    "product_price": "39,000원",
+    "model_name": "gemini-2.0-flash",
+}
+
+
+class StageTimer:
+    """단계별 wall/CPU/할당량 측정기."""
+
+    def __init__(self, track_alloc: bool = True) -> None:
+        self.track_alloc = track_alloc
+        self.stages: List[Dict[str, Any]] = []
+
+    def __call__(self, name: str, fn: Callable[[], Any]) -> Any:
+        if self.track_alloc:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        result = fn()
+        record: Dict[str, Any] = {
+            "stage": name,
+            "wall_s": round(time.perf_counter() - wall0, 4),
+            "cpu_s": round(time.process_time() - cpu0, 4),
+        }
+        if self.track_alloc:
+            current, peak = tracemalloc.get_traced_memory()
+            record["alloc_peak_kb"] = round((peak - before) / 1024, 1)
+            record["alloc_net_kb"] = round((current - before) / 1024, 1)
+        self.stages.append(record)
+        return result
+
+
+def run_sequential(app: Any, env: Dict[str, str], inp: Dict[str, str], iterations: int, timer: StageTimer) -> None:
+    """main()의 단계를 하나씩 순서대로 실행."""
+    tavily_key, gemini_key = env["TAVILY_API_KEY"], env["GEMINI_API_KEY"]
+    product_info = f"{inp['product_name']}, {inp['product_desc']}, {inp['product_price']}"
+
+    model = timer("model", lambda: app.resolve_gemini_model(inp["model_name"], gemini_key))
+    market = timer(
+        "market", lambda: app.get_market_snippets(f"{inp['product_name']} 시장 트렌드 소비자 불만 니즈", tavily_key)
+    )
+    cases = timer(
+        "cases", lambda: app.get_market_autopsy(inp["product_name"], inp["product_desc"], tavily_key, max_results=12)
+    )
+    context = timer(
+        "context", lambda: app.build_market_context(f"{inp['product_name']} {inp['product_desc']}", [market, cases])
+    )
+    budgets = app.MARKET_CONTEXT_BUDGETS
+    stats = timer(
+        "stats",
+        lambda: app.analyze_stats_chain(
+            gemini_key, model, inp["seller"], inp["buyer"], product_info, context.render(budgets["stats"])
+        ),
+    )
+    sim = timer("simulation", lambda: app.StartupMCTS(iterations=iterations, mode="exact").run(stats))
+    autopsy = timer(
+        "autopsy",
+        lambda: app.autopsy_report_chain(
+            gemini_key, model, stats, sim.bottleneck_stage, context.render(budgets["autopsy"])
+        ),
+    )
+    timer("debate", lambda: app.run_panel_debate(gemini_key, model, stats, product_info))
+    timer("videos", lambda: app.get_youtube_videos(autopsy.get("youtube_queries") or [], tavily_key, max_videos=3))
+
+
+def run_parallel(app: Any, env: Dict[str, str], inp: Dict[str, str], iterations: int, timer: StageTimer) -> None:
+    """같은 단계를 헤드리스 API(app.analyze → run_pipeline 의존성 그래프)로 실행. 단계별 wall은 trace에서 가져옴."""
+    report = timer(
+        "pipeline",
+        lambda: app.analyze(
+            inp["seller"],
+            inp["buyer"],
+            app.Product(inp["product_name"], inp["product_desc"], inp["product_price"]),
+            env["GEMINI_API_KEY"],
+            env["TAVILY_API_KEY"],
+            model_name=inp["model_name"],
+            iterations=iterations,
+        ),
+    )
+    for row in report.trace.waterfall():
+        if row["span"].startswith("stage."):
+            timer.stages.append({"stage": row["span"][len("stage.") :], "wall_s": round(row["duration_ms"] / 1e3, 4)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tavily-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--cache", choices=["off", "memory"], default="off", help="memory면 2번째 run부터 캐시 적중")
+    parser.add_argument("--iterations", type=int, default=1_000_000, help="StartupMCTS 반복 수")
+    parser.add_argument("--parallel", action="store_true", help="app.analyze로 병렬 실행")
+    parser.add_argument("--no-alloc", action="store_true", help="tracemalloc 끄기 (오버헤드 제거)")
+    parser.add_argument("--out", help="JSON 저장 경로 (없으면 stdout)")
+    args = parser.parse_args()
+
+    with spawn_fake_services(args.tavily_latency, args.gemini_latency, args.token_latency) as env:
+        # app은 import 시점에 환경변수를 읽으므로 반드시 env 설정 후 import
+        os.environ.update(env)
+        os.environ["SEARCH_CACHE_BACKEND"] = args.cache
+        os.environ["LLM_CACHE"] = "on" if args.cache != "off" else "off"
+        import app
+
+        if not args.no_alloc:
+            tracemalloc.start()
+        runs = []
+        for i in range(args.runs):
+            timer = StageTimer(track_alloc=not args.no_alloc)
+            t0 = time.perf_counter()
+            (run_parallel if args.parallel else run_sequential)(app, env, SAMPLE_INPUT, args.iterations, timer)
+            runs.append({"run": i, "total_wall_s": round(time.perf_counter() - t0, 4), "stages": timer.stages})
+        if not args.no_alloc:
+            tracemalloc.stop()
+
+        report = {
+            "benchmark": "pipeline",
+            "mode": "parallel" if args.parallel else "sequential",
+            "python": platform.python_version(),
+            "config": {k: v for k, v in vars(args).items() if k != "out"},
+            "runs": runs,
+            "requests": fetch_request_counts(env),
+        }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+벤치마크용 로컬 가짜 Tavily / Gemini HTTP 서버.
+
+실제 SDK(tavily-python, google-genai / langchain-google-genai)가 그대로 붙도록
+각 API의 최소 엔드포인트만 흉내 내고, 응답마다 지연(latency)을 넣을 수 있다.
+app.py는 TAVILY_API_BASE_URL / GEMINI_API_BASE_URL 환경변수로 이 서버를 바라본다.
+
+    with FakeServices(tavily_latency=0.8, gemini_latency=1.5) as services:
+        os.environ.update(services.env())
+        ...
+
+서버 스레드의 CPU 시간이 측정에 섞이지 않게 별도 프로세스로도 띄울 수 있다.
+
+    python bench/fake_services.py --tavily-latency 0.8 --gemini-latency 1.5
+    (첫 줄에 env JSON 출력 후 종료 신호까지 대기)
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tavily_results.jsonl")
+FAKE_MODELS = ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro"]
+
+_STATS = {"product": 62, "team": 48, "strategy": 41, "marketing": 37, "consumer_needs": 71}
+_AUTOPSY = {
+    "death_cause": "소모품 가격과 AS 불만을 못 잡고 PMF 단계에서 재구매가 끊김",
+    "autopsy_report": "초기 수요는 있었지만 리필 단가와 배터리 수명 문제로 후기가 나빠졌고, "
+    "B2B 영업 주기를 버틸 현금이 부족했다. " * 3,
+    "action_plan": "1) 리필 구독 모델로 단가 방어 2) 사무실 관리업체 채널 제휴 3) 배터리 대신 USB-C 충전",
+    "needs_analysis": "소비자는 '안 만지는 것'보다 '신경 안 쓰는 것'을 원한다.",
+    "youtube_queries": ["자동 디스펜서 리뷰", "하드웨어 스타트업 실패", "PMF 찾는 법"],
+}
+_DEBATE = (
+    "마포구 VC: 숫자부터 봅시다. 재구매율이 안 나오면 끝이에요.\n"
+    "테헤란로 창업가: 하드웨어는 원래 다 힘들어요. 재고가 사람 잡습니다.\n"
+    "얼리어답터: 건전지 2주마다 갈면 그냥 펌프 쓰죠.\n"
+) * 4 + "결론: 리필 구독 없으면 시드에서 사망."
+
+
+def load_corpus(path: str = DEFAULT_CORPUS) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fake_completion(prompt: str) -> str:
+    """프롬프트 종류를 보고 app.py 체인들이 기대하는 모양의 응답을 만든다."""
+    if "target_languages" in prompt:
+        payload = json.loads(prompt[prompt.rindex('{"target_languages"') :])
+        return json.dumps(
+            {lang: {i: f"[{lang}] {text}" for i, text in payload["texts"].items()} for lang in payload["target_languages"]},
+            ensure_ascii=False,
+        )
+    if "debate" in prompt and "death_cause" in prompt:
+        return json.dumps({**_STATS, **_AUTOPSY, "debate": _DEBATE}, ensure_ascii=False)
+    if "death_cause" in prompt:
+        return json.dumps(_AUTOPSY, ensure_ascii=False)
+    if "좌담회" in prompt:
+        return _DEBATE
+    if "consumer_needs" in prompt:
+        return json.dumps(_STATS)
+    return _DEBATE
+
+
+def _chunks(text: str, size: int = 12) -> List[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_FakeHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+    def _send_json(self, payload: object, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path == "/_stats":
+            self._send_json(dict(self.server.requests))
+            return
+        self.server.count(self.path)
+        if re.search(r"/models/?(\?|$)", self.path):
+            time.sleep(self.server.latency)
+            self._send_json({"models": [{"name": f"models/{m}"} for m in FAKE_MODELS]})
+            return
+        self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.server.count(self.path)
+        body = self._read_json()
+        time.sleep(self.server.latency)
+        if self.server.throttle():
+            # 실제 API가 한도 초과 때 돌려주는 모양 (Tavily는 detail.error, Gemini는 error.status)
+            self.server.count("_429")
+            self._send_json(
+                {
+                    "detail": {"error": "rate limit exceeded"},
+                    "error": {"code": 429, "message": "rate limit exceeded", "status": "RESOURCE_EXHAUSTED"},
+                },
+                429,
+            )
+            return
+        if self.path.rstrip("/").endswith("/search"):
+            self._send_json(self.server.search(body.get("query", ""), int(body.get("max_results") or 5)))
+            return
+        match = re.search(r"/models/([^/:]+):(generateContent|streamGenerateContent)", self.path)
+        if not match:
+            self._send_json({"error": "not found"}, 404)
+            return
+        prompt = "".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        text = fake_completion(prompt)
+        usage = {"promptTokenCount": len(prompt) // 3, "candidatesTokenCount": len(text) // 3}
+        if match.group(2) == "generateContent":
+            self._send_json(
+                {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                    "usageMetadata": {**usage, "totalTokenCount": sum(usage.values())},
+                }
+            )
+            return
+
+        # SSE 스트리밍: 청크마다 token_latency 만큼 지연
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = _chunks(text)
+        for i, piece in enumerate(pieces):
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+            if i == len(pieces) - 1:
+                event["candidates"][0]["finishReason"] = "STOP"
+                event["usageMetadata"] = {**usage, "totalTokenCount": sum(usage.values())}
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.server.token_latency)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float,
+        token_latency: float = 0.0,
+        corpus: Optional[List[dict]] = None,
+        error_rate: float = 0.0,
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.corpus = corpus or []
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, path: str) -> None:
+        key = path.split("?")[0]
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def throttle(self) -> bool:
+        """error_rate 확률로 429를 흉내 냄 (재시도/백오프 확인용)."""
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def search(self, query: str, max_results: int) -> dict:
+        if "youtube.com" in query:
+            slug = abs(hash(query)) % 10_000
+            results = [
+                {"title": f"{query} {i}", "url": f"https://www.youtube.com/watch?v=bench{slug}{i}", "content": query}
+                for i in range(max_results)
+            ]
+        else:
+            # 검색어마다 코퍼스에서 응답 하나를 골라 돌려줌
+            payload = self.corpus[abs(hash(query)) % len(self.corpus)] if self.corpus else {"results": []}
+            results = payload.get("results", [])[:max_results]
+        return {"query": query, "results": results, "response_time": self.latency}
+
+
+class FakeServices:
+    """가짜 Tavily + Gemini 서버 한 쌍을 백그라운드 스레드로 띄움."""
+
+    def __init__(
+        self,
+        tavily_latency: float = 0.5,
+        gemini_latency: float = 1.0,
+        token_latency: float = 0.01,
+        corpus_path: str = DEFAULT_CORPUS,
+        error_rate: float = 0.0,
+    ) -> None:
+        self.tavily = _FakeHTTPServer(tavily_latency, corpus=load_corpus(corpus_path), error_rate=error_rate)
+        self.gemini = _FakeHTTPServer(gemini_latency, token_latency=token_latency, error_rate=error_rate)
+        self._threads: List[threading.Thread] = []
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "TAVILY_API_BASE_URL": self.tavily.url,
+            "GEMINI_API_BASE_URL": self.gemini.url,
+            "TAVILY_API_KEY": "bench-tavily-key",
+            "GEMINI_API_KEY": "bench-gemini-key",
+        }
+
+    def request_counts(self) -> Dict[str, Dict[str, int]]:
+        return {"tavily": dict(self.tavily.requests), "gemini": dict(self.gemini.requests)}
+
+    def __enter__(self) -> "FakeServices":
+        for server in (self.tavily, self.gemini):
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        for server in (self.tavily, self.gemini):
+            server.shutdown()
+            server.server_close()
+
+
+def fetch_request_counts(env: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+    """(별도 프로세스로 띄운 경우) 서버별 경로당 요청 수."""
+    import requests
+
+    return {
+        name: requests.get(env[var] + "/_stats", timeout=5).json()
+        for name, var in (("tavily", "TAVILY_API_BASE_URL"), ("gemini", "GEMINI_API_BASE_URL"))
+    }
+
+
+@contextlib.contextmanager
+def spawn_fake_services(
+    tavily_latency: float = 0.5,
+    gemini_latency: float = 1.0,
+    token_latency: float = 0.01,
+    corpus_path: str = DEFAULT_CORPUS,
+    error_rate: float = 0.0,
+) -> Iterator[Dict[str, str]]:
+    """FakeServices를 자식 프로세스로 띄우고 app.py용 env를 돌려줌."""
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--tavily-latency", str(tavily_latency),
+            "--gemini-latency", str(gemini_latency),
+            "--token-latency", str(token_latency),
+            "--corpus", corpus_path,
+            "--error-rate", str(error_rate),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        line = proc.stdout.readline() if proc.stdout else ""
+        if not line:
+            raise RuntimeError("fake services failed to start")
+        yield json.loads(line)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="로컬 가짜 Tavily / Gemini 서버")
+    parser.add_argument("--tavily-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.01, help="스트리밍 청크 사이 지연")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="이 확률로 429 응답 (재시도 확인용)")
+    args = parser.parse_args()
+
+    with FakeServices(
+        args.tavily_latency, args.gemini_latency, args.token_latency, args.corpus, args.error_rate
+    ) as services:
+        print(json.dumps(services.env()), flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+벤치마크 전체 실행 → JSON 하나로 저장.
+
+    python bench/run_all.py --out bench_results.json
+    python bench/run_all.py --quick        # MCTS 10^5까지, 파이프라인 지연 축소
+
+파이프라인 벤치는 app을 import 하기 전에 환경변수를 바꿔야 해서 자식 프로세스로 돌린다.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import bench_garbage_filter  # noqa: E402
+import bench_mcts  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--out", help="JSON 저장 경로 (없으면 stdout)")
+    args = parser.parse_args()
+
+    latency = ["--tavily-latency", "0.1", "--gemini-latency", "0.2"] if args.quick else []
+    pipeline = subprocess.run(
+        [sys.executable, os.path.join(BENCH_DIR, "bench_pipeline.py"), *latency],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "pipeline": json.loads(pipeline.stdout),
+        "mcts": bench_mcts.run(max_exp=5 if args.quick else 7),
+        "garbage_filter": bench_garbage_filter.run(repeat=20 if args.quick else 200),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
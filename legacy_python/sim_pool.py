@@ -0,0 +1,351 @@
+"""
+CPU를 오래 잡는 시뮬레이션을 워커 프로세스로 넘기는 실행기.
+
+Streamlit은 모든 세션을 한 프로세스의 스레드로 돌림 → 샘플링 시뮬 / 런웨이 / 중첩 불확실성이 GIL을 쥐고 있으면
+다른 사용자의 rerun까지 같이 느려짐. 여기서 프로세스 풀로 보내고 호출한 스레드는 Future만 기다림 (GIL 놓음).
+
+- 작업 = (종류, 스탯 행렬 int16 bytes, 시드 uint32 words bytes, 작은 파라미터 dict). dict 묶음을 pickle하지 않음
+- 대기열 상한(max_pending): 꽉 차면 submit이 기다림 (timeout을 주면 TimeoutError)
+- 워커는 시작할 때 app을 import하고 종류별로 한 번씩 돌려 데워 둠. app은 워커 안에서만 import
+  (Streamlit에서는 스크립트가 __main__이라 부모에서 `import app`을 하면 모듈이 두 벌 생김)
+  → 결과도 dataclass를 그대로 pickle하지 않고 dict로 받아 부모의 app 클래스로 다시 만듦
+- 워커 수 0이면 같은 API로 호출한 스레드에서 바로 실행. 워커가 다 뜨고 데워지기 전(warm() 완료 전)에 들어온 작업도
+  부모에서 바로 실행 → 첫 분석이 프로세스 시작 + import 시간을 떠안지 않음
+- 풀이 깨지면(워커가 죽음) 다음 작업에서 새로 띄우고, 그 작업은 부모에서 실행
+- run()은 SIM_POOL_TIMEOUT초 안에 결과가 없으면 TimeoutError
+- 서브인터프리터(InterpreterPoolExecutor)는 numpy가 서브인터프리터 import를 지원하지 않아 쓰지 않음
+
+    SIM_POOL_WORKERS=4 SIM_POOL_QUEUE=32 streamlit run app.py
+"""
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from dataclasses import asdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# ✅ 워커 수 (0이면 풀 없이 호출한 스레드에서 실행) / 대기열 상한 (기본 워커 × 8) / 프로세스 시작 방식
+SIM_POOL_WORKERS = int(os.environ.get("SIM_POOL_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+SIM_POOL_QUEUE = int(os.environ.get("SIM_POOL_QUEUE", "0") or 0)
+SIM_POOL_TIMEOUT = float(os.environ.get("SIM_POOL_TIMEOUT", "120"))
+# Streamlit 프로세스는 스레드가 많아서 fork 대신 forkserver (없으면 spawn)
+SIM_POOL_START = os.environ.get(
+    "SIM_POOL_START", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# 워커 시작 시 한 번씩 돌려 볼 작업 (import, numpy 첫 호출, 코드 경로 데우기)
+_WARMUP: Tuple[Tuple[str, Dict[str, Any]], ...] = (
+    ("run", {"iterations": 1000, "mode": "sample"}),
+    ("nested", {"outer": 16, "inner": 100}),
+    ("runway", {"paths": 1000, "months": 12}),
+)
+
+# 워커 프로세스 상태 (initializer가 채움)
+_WORKER: Dict[str, Any] = {}
+
+Job = Tuple[str, bytes, bytes, Dict[str, Any]]
+
+
+def seed_words(seed: int) -> np.ndarray:
+    """음이 아닌 정수 시드 → uint32 words (little-endian). SeedSequence entropy(128비트)도 그대로 들어감."""
+    if seed < 0:
+        # np.random.SeedSequence와 같은 규칙 (음수면 >>= 32가 -1에서 멈추지 않음)
+        raise ValueError(f"Seed must be non-negative: {seed}")
+    words = []
+    while True:
+        words.append(seed & 0xFFFFFFFF)
+        seed >>= 32
+        if not seed:
+            return np.array(words, dtype=np.uint32)
+
+
+def _seed_from_words(blob: bytes) -> int:
+    return sum(int(w) << (32 * i) for i, w in enumerate(np.frombuffer(blob, dtype=np.uint32)))
+
+
+def _stats_rows(app: ModuleType, blob: bytes) -> List[Dict[str, int]]:
+    matrix = np.frombuffer(blob, dtype=np.int16).reshape(-1, len(app.STAT_KEYS))
+    return [dict(zip(app.STAT_KEYS, map(int, row))) for row in matrix]
+
+
+def _run(app: ModuleType, rows: List[Dict[str, int]], seed: int, **params: Any) -> Any:
+    return app.StartupMCTS(seed=seed, **params).run(rows[0])
+
+
+def _run_many(app: ModuleType, rows: List[Dict[str, int]], seed: int, **params: Any) -> Any:
+    return app.StartupMCTS(seed=seed, **params).run_many(rows)
+
+
+def _nested(app: ModuleType, rows: List[Dict[str, int]], seed: int, **params: Any) -> Any:
+    # 0행 = 기준 스탯, 나머지 = LLM으로 여러 번 뽑은 스탯
+    return app.StartupMCTS(seed=seed).run_nested(rows[0], stat_samples=rows[1:] or None, **params)
+
+
+def _runway(app: ModuleType, rows: List[Dict[str, int]], seed: int, **params: Any) -> Any:
+    return app.RunwaySimulator(seed=seed, **params).run(rows[0])
+
+
+# 종류 → (실행 함수, app의 결과 클래스 이름)
+JOBS: Dict[str, Tuple[Callable[..., Any], str]] = {
+    "run": (_run, "SimulationResult"),
+    "run_many": (_run_many, "SimulationResult"),
+    "nested": (_nested, "UncertaintyResult"),
+    "runway": (_runway, "RunwayResult"),
+}
+
+
+def _execute(app: ModuleType, kind: str, stats: bytes, seed: bytes, params: Dict[str, Any]) -> Any:
+    return JOBS[kind][0](app, _stats_rows(app, stats), _seed_from_words(seed), **params)
+
+
+def _worker_app() -> ModuleType:
+    if "app" not in _WORKER:
+        import app
+
+        _WORKER["app"] = app
+    return _WORKER["app"]
+
+
+def _init_worker() -> None:
+    app = _worker_app()
+    stats = np.full((1, len(app.STAT_KEYS)), 50, dtype=np.int16).tobytes()
+    for kind, params in _WARMUP:
+        _execute(app, kind, stats, seed_words(0).tobytes(), params)
+
+
+def _run_job(kind: str, stats: bytes, seed: bytes, params: Dict[str, Any]) -> Any:
+    result = _execute(_worker_app(), kind, stats, seed, params)
+    return [asdict(r) for r in result] if isinstance(result, list) else asdict(result)
+
+
+def _noop() -> None:
+    return None
+
+
+class SimulationExecutor:
+    """
+    시뮬 작업용 프로세스 풀 + 상한 있는 대기열.
+    - submit(종류, 스탯 행렬, seed, **파라미터) → Future / run(...) → 결과 (기다림)
+    - 종류: "run" | "run_many" (StartupMCTS 인자) / "nested" (run_nested 인자, 1행 이후 = stat_samples) /
+      "runway" (RunwaySimulator 인자)
+    - seed가 None이면 부모에서 새 entropy를 뽑아 보냄 → 결과의 seed로 재현 가능
+    - app_module: 워커 수 0이거나 풀이 깨졌을 때 부모에서 실행하고, 워커 결과를 다시 dataclass로 만들 때 쓰는 app 모듈.
+      모듈 대신 모듈을 돌려주는 함수를 넘기면 작업마다 그때의 모듈을 씀 (Streamlit은 rerun마다 모듈을 새로 만듦)
+    """
+
+    def __init__(
+        self,
+        app_module: Union[ModuleType, Callable[[], ModuleType]],
+        workers: int = SIM_POOL_WORKERS,
+        max_pending: int = SIM_POOL_QUEUE,
+        start_method: str = SIM_POOL_START,
+    ) -> None:
+        self._app = app_module
+        self.workers = max(0, workers)
+        self.max_pending = max_pending or max(1, self.workers) * 8
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted: Counter = Counter()
+        self.completed: Counter = Counter()
+        self.failed: Counter = Counter()
+        # 워커가 죽어서 부모에서 대신 돌린 수 / 워커가 데워지기 전이라 부모에서 돌린 수
+        self.fallbacks = 0
+        self.inline = 0
+        # warm()의 데우기 작업이 다 끝나면 set. 그 전 작업은 부모에서 실행
+        self._ready = threading.Event()
+        self._warming = False
+
+    @property
+    def app(self) -> ModuleType:
+        return self._app() if callable(self._app) else self._app
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def _reset(self, pool: Optional[ProcessPoolExecutor]) -> None:
+        with self._lock:
+            if pool is not None and self._pool is pool:
+                self._pool = None
+                self._ready.clear()
+                self._warming = False
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _pack(self, kind: str, stats: np.ndarray, seed: Optional[int], params: Dict[str, Any]) -> Job:
+        if kind not in JOBS:
+            raise ValueError(f"Unknown simulation job: {kind}")
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        matrix = np.ascontiguousarray(stats, dtype=np.int16)
+        return kind, matrix.tobytes(), seed_words(int(seed)).tobytes(), params
+
+    def _local(self, job: Job) -> Future:
+        fut: Future = Future()
+        try:
+            fut.set_result(_execute(self.app, *job))
+        except Exception as exc:
+            fut.set_exception(exc)
+        return fut
+
+    def _done(self, kind: str, fut: Future, out: Future, app: ModuleType) -> None:
+        with self._lock:
+            self.pending -= 1
+            (self.failed if fut.cancelled() or fut.exception() is not None else self.completed)[kind] += 1
+        self._slots.release()
+        if fut.cancelled():
+            out.cancel()
+        elif fut.exception() is not None:
+            out.set_exception(fut.exception())
+        else:
+            # app은 submit 시점의 모듈 (rerun/리로드 뒤에도 호출한 쪽과 같은 클래스로 만듦)
+            # 워커의 app과 필드가 다르면 여기서 터짐 → 콜백 예외는 로그만 남으므로 out으로 넘김
+            try:
+                cls = getattr(app, JOBS[kind][1])
+                data = fut.result()
+                out.set_result([cls(**d) for d in data] if isinstance(data, list) else cls(**data))
+            except Exception as exc:
+                out.set_exception(exc)
+
+    def submit(
+        self, kind: str, stats: np.ndarray, seed: Optional[int] = None, timeout: Optional[float] = None, **params: Any
+    ) -> Future:
+        return self._submit(self._pack(kind, stats, seed, params), timeout)
+
+    def _submit(self, job: Job, timeout: Optional[float] = None) -> Future:
+        kind = job[0]
+        with self._lock:
+            self.submitted[kind] += 1
+        if self.workers == 0 or not self._ready.is_set():
+            if self.workers:
+                self.warm()
+            fut = self._local(job)
+            with self._lock:
+                self.inline += self.workers > 0
+                (self.completed if fut.exception() is None else self.failed)[kind] += 1
+            return fut
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.failed[kind] += 1
+            raise TimeoutError(f"Simulation queue is full ({self.max_pending} pending)")
+        with self._lock:
+            self.pending += 1
+        try:
+            pool = self._ensure_pool()
+            try:
+                fut = pool.submit(_run_job, *job)
+            except BrokenProcessPool:
+                self._reset(pool)
+                fut = self._ensure_pool().submit(_run_job, *job)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+                self.failed[kind] += 1
+            self._slots.release()
+            raise
+        out: Future = Future()
+        app = self.app
+        fut.add_done_callback(lambda f: self._done(kind, f, out, app))
+        return out
+
+    def run(
+        self,
+        kind: str,
+        stats: np.ndarray,
+        seed: Optional[int] = None,
+        timeout: Optional[float] = SIM_POOL_TIMEOUT,
+        **params: Any,
+    ) -> Any:
+        """submit 후 결과를 기다림 (대기열 + 실행 합쳐 최대 timeout초). 워커가 죽었으면 풀을 버리고 이 작업은 부모에서 실행."""
+        job = self._pack(kind, stats, seed, params)
+        try:
+            return self._submit(job, timeout).result(timeout)
+        except TimeoutError as exc:
+            raise TimeoutError(f"Simulation job '{kind}' did not finish within {timeout}s") from exc
+        except BrokenProcessPool:
+            self._reset(self._pool)
+            with self._lock:
+                self.fallbacks += 1
+            return self._local(job).result()
+
+    def warm(self) -> None:
+        """워커를 미리 띄워 둠 (app import + 데우기를 첫 요청이 떠안지 않게). 기다리지 않음. 여러 번 불러도 한 번만."""
+        with self._lock:
+            if self.workers == 0 or self._warming or self._ready.is_set():
+                return
+            self._warming = True
+        pool = self._ensure_pool()
+        left = [self.workers]
+
+        def done(fut: Future) -> None:
+            with self._lock:
+                if self._pool is not pool:
+                    return
+                if fut.cancelled() or fut.exception() is not None:
+                    self._warming = False
+                    return
+                left[0] -= 1
+                if left[0] == 0:
+                    self._warming = False
+                    self._ready.set()
+
+        try:
+            for _ in range(self.workers):
+                pool.submit(_noop).add_done_callback(done)
+        except BrokenProcessPool:
+            self._reset(pool)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """warm()이 끝날 때까지 기다림 (벤치/테스트용)."""
+        self.warm()
+        return self.workers == 0 or self._ready.wait(timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            rows = [("submitted", self.submitted.copy()), ("completed", self.completed.copy()), ("failed", self.failed.copy())]
+            pending, fallbacks, inline = self.pending, self.fallbacks, self.inline
+        lines = [
+            "# HELP startup_sim_jobs_total Simulation jobs by kind and outcome.",
+            "# TYPE startup_sim_jobs_total counter",
+        ]
+        for outcome, counter in rows:
+            for kind, n in sorted(counter.items()):
+                lines.append(f'startup_sim_jobs_total{{kind="{kind}",outcome="{outcome}"}} {n}')
+        lines += [
+            "# HELP startup_sim_pending Simulation jobs queued or running in the process pool.",
+            "# TYPE startup_sim_pending gauge",
+            f"startup_sim_pending {pending}",
+            "# HELP startup_sim_queue_limit Maximum simulation jobs queued or running at once.",
+            "# TYPE startup_sim_queue_limit gauge",
+            f"startup_sim_queue_limit {self.max_pending}",
+            "# HELP startup_sim_workers Worker processes (0 = run in the calling thread).",
+            "# TYPE startup_sim_workers gauge",
+            f"startup_sim_workers {self.workers}",
+            "# HELP startup_sim_fallbacks_total Jobs run in-process after a worker died.",
+            "# TYPE startup_sim_fallbacks_total counter",
+            f"startup_sim_fallbacks_total {fallbacks}",
+            "# HELP startup_sim_inline_total Jobs run in-process while the workers were still warming up.",
+            "# TYPE startup_sim_inline_total counter",
+            f"startup_sim_inline_total {inline}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,38 @@
+"""검색/LLM 캐시가 API 키끼리 결과를 나눠 쓰지 않는지 회귀 테스트."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def test_search_cache_is_per_api_key(monkeypatch) -> None:
+    calls = []
+
+    def fake_search(api_key, query, **kwargs):
+        calls.append(api_key)
+        return {"results": [{"title": "t", "url": "https://ex.com", "content": "시장 트렌드 본문", "score": 1.0}]}
+
+    cache = app.QueryCache(app.MemoryCache())
+    monkeypatch.setattr(app, "tavily_search", fake_search)
+    monkeypatch.setattr(app, "get_query_cache", lambda: cache)
+
+    query = "자동 핸드워시 디스펜서 시장 트렌드"
+    assert app.get_market_snippets(query, "good-key")
+    assert app.get_market_snippets(query, "good-key")
+    assert app.get_market_snippets(query, "other-key")
+    assert calls == ["good-key", "other-key"]
+
+
+def test_llm_cache_is_per_api_key(monkeypatch) -> None:
+    backend = app.MemoryCache()
+    monkeypatch.setattr(app, "_llm_cache", lambda use_cache: backend)
+    calls = []
+
+    def call(api_key: str) -> str:
+        return app.cached_llm_call("stats", "prompt", "gemini-test", 0.2, lambda: calls.append(api_key) or "out", api_key=api_key)
+
+    assert call("good-key") == call("good-key") == call("other-key") == "out"
+    assert calls == ["good-key", "other-key"]
+    assert app.llm_cache_key("stats", "p", "m", 0.2, "a") != app.llm_cache_key("stats", "p", "m", 0.2, "b")
@@ -0,0 +1,67 @@
+"""검색어 정규화 / 유사 검색어 재사용 (QueryCache) 회귀 테스트."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def similarity(a: str, b: str) -> float:
+    return app.query_similarity(app.canonicalize_query(a), app.canonicalize_query(b))
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("비타민C 세럼", "비타민D 세럼"),
+        ("오메가3", "오메가6"),
+        ("iphone15", "iphone16"),
+        ("아이폰15 케이스", "아이폰16 케이스"),
+        ("갤럭시폰 시장 트렌드", "갤럭시탭 시장 트렌드"),
+    ],
+)
+def test_different_products_are_not_merged(a: str, b: str) -> None:
+    assert similarity(a, b) < app.QUERY_SIMILARITY_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("자동 핸드워시 디스펜서 시장 트렌드", "자동 핸드워시 디스팬서 시장 트렌드"),
+        ("자동 핸드워시 디스펜서", "핸드워시, 자동  디스펜서!"),
+    ],
+)
+def test_typos_and_reordering_are_merged(a: str, b: str) -> None:
+    assert similarity(a, b) >= app.QUERY_SIMILARITY_THRESHOLD
+
+
+def test_query_cache_does_not_serve_other_variant() -> None:
+    cache = app.QueryCache(app.MemoryCache())
+    cache.set("market_snippets", "비타민C 세럼 시장 트렌드", ["c"], ttl=60, max_results=5)
+    value, lookup = cache.get("market_snippets", "비타민D 세럼 시장 트렌드", max_results=5)
+    assert value is None and not lookup.hit
+
+    value, lookup = cache.get("market_snippets", "비타민C 세럼 시장 트랜드", max_results=5)
+    assert value == ["c"] and lookup.similarity >= app.QUERY_SIMILARITY_THRESHOLD
+
+
+def test_similarity_index_does_not_touch_backend_counters() -> None:
+    backend = app.MemoryCache()
+    cache = app.QueryCache(backend)
+    cache.set("market_snippets", "자동 핸드워시 디스펜서", ["x"], ttl=60)
+    cache.get("market_snippets", "자동 핸드워시 디스펜서")
+    assert backend.stats()["hits"] == 1 and backend.stats()["misses"] == 0
+
+
+def test_concurrent_sets_keep_every_query_in_index() -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = app.QueryCache(app.MemoryCache())
+    queries = [f"제품{i:03d} 시장 트렌드" for i in range(100)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda q: cache.set("market_snippets", q, [q], ttl=60), queries))
+    index = cache._index[cache._index_key("market_snippets", {})]
+    assert set(index) == {app.canonicalize_query(q) for q in queries}